@@ -0,0 +1,75 @@
+# Measures bytes transferred per page of the web UI, as a browser accepting
+# gzip/brotli would receive them.
+#
+# Usage: python benchmarks/bench_page_bytes.py
+#        CHORES_DATABASE='file::memory:?cache=shared' python benchmarks/bench_page_bytes.py   # no disk I/O
+#
+# "First visit" counts each page plus every /static asset it links to (assets are
+# fetched once per run, as a browser cache would). "Repeat visit" counts only the
+# HTML, since versioned static assets are served with far-future cache headers.
+
+import os
+import re
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from chores import database, tasks
+
+ACCEPT_ENCODING = 'gzip, br'
+STATIC_LINK_RE = re.compile(r'(?:href|src)="(/static/[^"]+)"')
+
+
+def _seed():
+    from datetime import date
+    chore = None
+    for i in range(20):
+        chore = tasks.add_task(f"Sample chore {i}", notes="Some notes", due_date=date(2025, 1, 1),
+                               materials_needed_text="Sponge\nDish soap\nPaper towels")
+        for j in range(5):
+            tasks.add_sub_task(chore.id, f"Step {j} of chore {i}")
+    return chore.id
+
+
+def main():
+    if not os.environ.get('CHORES_DATABASE'): # Otherwise already configured from the environment
+        db_dir = tempfile.mkdtemp(prefix='chores-bench-')
+        database.configure(database_file=os.path.join(db_dir, 'bench.db'))
+    database.init_db()
+    chore_id = _seed()
+
+    import web_app
+    client = web_app.app.test_client()
+    pages = ['/', '/chores', f'/chore/{chore_id}', '/add_chore', f'/chore/{chore_id}/edit']
+
+    fetched_assets = set()
+    first_visit_total = 0
+    repeat_visit_total = 0
+    print(f"{'page':<22}{'html raw':>10}{'html wire':>11}{'encoding':>10}{'new assets':>12}")
+    for page in pages:
+        response = client.get(page, headers={'Accept-Encoding': ACCEPT_ENCODING})
+        wire_bytes = len(response.get_data())
+        encoding = response.headers.get('Content-Encoding', 'identity')
+        raw_html = client.get(page).get_data(as_text=True)
+        raw_bytes = len(raw_html.encode('utf-8'))
+
+        asset_bytes = 0
+        for asset in STATIC_LINK_RE.findall(raw_html):
+            asset = asset.replace('&amp;', '&')
+            if asset in fetched_assets:
+                continue
+            fetched_assets.add(asset)
+            asset_response = client.get(asset, headers={'Accept-Encoding': ACCEPT_ENCODING})
+            asset_bytes += len(asset_response.get_data())
+
+        first_visit_total += wire_bytes + asset_bytes
+        repeat_visit_total += wire_bytes
+        print(f"{page:<22}{raw_bytes:>10}{wire_bytes:>11}{encoding:>10}{asset_bytes:>12}")
+
+    print(f"\nFirst visit to all pages:  {first_visit_total} bytes")
+    print(f"Repeat visit to all pages: {repeat_visit_total} bytes")
+
+
+if __name__ == '__main__':
+    main()
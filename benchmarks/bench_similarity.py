@@ -0,0 +1,63 @@
+# Measures how long the suggestion similarity index takes to build and to query.
+#
+# Usage: python benchmarks/bench_similarity.py [--entries 30000] [--queries 200] [--no-numpy]
+#
+# Builds a chores.similarity.SimilarityIndex from --entries generated chore descriptions
+# drawn from a small household vocabulary (so trigrams are widely shared, a hard case), then
+# reports the build time and the mean and 95th-percentile query time. --no-numpy measures the
+# plain-Python scoring even when NumPy is installed.
+
+import argparse
+import os
+import random
+import sys
+import time
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from chores import similarity
+
+VERBS = "clean wash fix paint mow vacuum organize replace water scrub dust sweep mop polish repair check".split()
+THINGS = ("kitchen bathroom garage lawn car windows door fence roof gutters attic basement closet shelves "
+          "carpet floor sink oven fridge filter plants trash bedroom porch deck").split()
+
+
+def description(rng):
+    words = [rng.choice(VERBS), rng.choice(THINGS)]
+    if rng.random() < 0.5:
+        words.append(rng.choice(THINGS))
+    return " ".join(words) + f" {rng.randint(1, 500)}"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the suggestion similarity index.")
+    parser.add_argument('--entries', type=int, default=30000)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--no-numpy', action='store_true', help="Score in plain Python")
+    args = parser.parse_args(argv)
+
+    rng = random.Random(1)
+    index = similarity.SimilarityIndex()
+    started = time.perf_counter()
+    for entry_id in range(1, args.entries + 1):
+        index.add(entry_id, description(rng))
+    build_seconds = time.perf_counter() - started
+
+    queries = [description(rng) for _ in range(args.queries)]
+    timings = []
+    with mock.patch.object(similarity, '_load_numpy', return_value=None) if args.no_numpy else mock.MagicMock():
+        for text in queries:
+            started = time.perf_counter()
+            index.query(text)
+            timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+
+    scoring = "plain Python" if args.no_numpy or similarity._load_numpy() is None else "NumPy"
+    print(f"{args.entries} entries built in {build_seconds:.2f} s ({scoring} scoring)")
+    print(f"query: mean {sum(timings) / len(timings):.2f} ms, p95 {timings[int(len(timings) * 0.95) - 1]:.2f} ms")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
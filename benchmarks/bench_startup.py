@@ -0,0 +1,72 @@
+# Measures import time of the `chores` package and the `web_app` module using
+# `python -X importtime`, and fails if either exceeds its budget.
+#
+# Usage: python benchmarks/bench_startup.py [--runs 5] [--budget-chores-ms 50] [--budget-web-app-ms 350]
+#
+# Each module is imported in a fresh interpreter; the best of --runs is reported, since
+# the minimum is the least noisy estimate of the real cost. Exits with status 1 if a
+# budget is exceeded, so it can run in CI.
+
+import argparse
+import os
+import re
+import subprocess
+import sys
+
+REPO_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+# "import time: self [us] | cumulative | imported package"
+IMPORTTIME_LINE_RE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)\s*$')
+
+
+def parse_importtime(stderr):
+    """Returns {module: (self_us, cumulative_us)} for every import recorded in stderr."""
+    timings = {}
+    for line in stderr.splitlines():
+        match = IMPORTTIME_LINE_RE.match(line)
+        if match:
+            self_us, cumulative_us, _, module = match.groups()
+            timings[module] = (int(self_us), int(cumulative_us))
+    return timings
+
+
+def measure(module, runs):
+    """Best-of-runs cumulative import time of module (in ms) and the timings of that best run."""
+    best_ms, best_timings = None, None
+    for _ in range(runs):
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+            cwd=REPO_ROOT, capture_output=True, text=True, check=True,
+        )
+        timings = parse_importtime(result.stderr)
+        cumulative_ms = timings[module][1] / 1000
+        if best_ms is None or cumulative_ms < best_ms:
+            best_ms, best_timings = cumulative_ms, timings
+    return best_ms, best_timings
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check import time of chores and web_app against budgets.")
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--budget-chores-ms', type=float, default=50.0)
+    parser.add_argument('--budget-web-app-ms', type=float, default=350.0)
+    parser.add_argument('--top', type=int, default=8, help="Show the N slowest imports (by self time)")
+    args = parser.parse_args(argv)
+
+    over_budget = False
+    for module, budget_ms in (('chores', args.budget_chores_ms), ('web_app', args.budget_web_app_ms)):
+        cumulative_ms, timings = measure(module, args.runs)
+        status = 'ok' if cumulative_ms <= budget_ms else 'OVER BUDGET'
+        over_budget = over_budget or cumulative_ms > budget_ms
+        print(f"import {module}: {cumulative_ms:.1f} ms (budget {budget_ms:.0f} ms) {status}")
+        slowest = sorted(timings.items(), key=lambda item: item[1][0], reverse=True)[:args.top]
+        for name, (self_us, _) in slowest:
+            print(f"    {self_us / 1000:7.1f} ms  {name}")
+        if 'google.generativeai' in timings:
+            print("    note: google.generativeai was imported eagerly")
+
+    return 1 if over_budget else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,69 @@
+# Measures the whole "Suggest with AI" request path with a deterministic provider.
+#
+# Usage: python benchmarks/bench_suggestions.py [--chores 300] [--provider heuristic]
+#                                               [--provider 'replay:recorded.json,heuristic']
+#
+# Creates --chores chores in a temporary database, from a fixed list of descriptions with
+# variations, and posts each one to /chore/<id>/suggest_subtasks_ai. Each request goes through
+# similarity lookup, the provider, adding the sub-tasks and materials, and remembering them.
+# The mean and 95th-percentile request times are reported, along with how many suggestions
+# were reused from a similar chore. The default provider, 'heuristic', answers offline and
+# always the same way, so runs are comparable. A replay file recorded from Gemini measures the
+# path with real answers but without network calls.
+
+import argparse
+import contextlib
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from chores import similarity, tasks
+from web_app import create_app
+
+DESCRIPTIONS = ["Clean the kitchen", "Mow the lawn", "Fix the leaking tap", "Paint the fence", "Wash the car",
+                "Do the laundry", "Vacuum the carpets", "Take out the trash", "Declutter the garage",
+                "Clean the bathroom", "Wash the windows", "Weed the garden"]
+VARIATIONS = ["{}", "{} before the weekend", "{} properly", "{} again", "quickly {}"]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the AI suggestion request path.")
+    parser.add_argument('--chores', type=int, default=300)
+    parser.add_argument('--provider', default='heuristic', help="AI provider spec (see ai_assistant.build_provider)")
+    args = parser.parse_args(argv)
+
+    rng = random.Random(1)
+    with tempfile.TemporaryDirectory() as directory:
+        app = create_app({'TESTING': True, 'SECRET_KEY': 'bench', 'DATABASE': os.path.join(directory, 'bench.db'),
+                          'STORAGE_BACKEND': 'sqlite', 'AI_PROVIDER': args.provider})
+        similarity.forget_indexes()
+        client = app.test_client()
+        chores = [tasks.add_task(rng.choice(VARIATIONS).format(rng.choice(DESCRIPTIONS)).capitalize())
+                  for _ in range(args.chores)]
+
+        timings, reused = [], 0
+        for chore in chores:
+            with contextlib.redirect_stdout(io.StringIO()): # The modules log every suggestion
+                started = time.perf_counter()
+                response = client.post(f'/chore/{chore.id}/suggest_subtasks_ai', follow_redirects=False)
+                timings.append((time.perf_counter() - started) * 1000)
+            with client.session_transaction() as session:
+                messages = " ".join(message for _, message in session.pop('_flashes', []))
+            if response.status_code != 302:
+                print(f"Chore {chore.id}: unexpected status {response.status_code}")
+                return 1
+            reused += "Reused suggestions" in messages
+
+    timings.sort()
+    print(f"{args.chores} suggestion requests with provider '{args.provider}'; {reused} reused from a similar chore")
+    print(f"request: mean {sum(timings) / len(timings):.2f} ms, p95 {timings[int(len(timings) * 0.95) - 1]:.2f} ms")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,8 +1,21 @@
 # This file makes the 'chores' directory a Python package.
+# Submodules are imported on first attribute access (PEP 562), so `import chores`
+# stays cheap and heavy dependencies load only when the feature using them does.
 
-from . import tasks
-from . import planning
-from . import ai_assistant
-from . import database
+import importlib
 
-__all__ = ['tasks', 'planning', 'ai_assistant', 'database']
+__all__ = ['tasks', 'planning', 'ai_assistant', 'database', 'cache', 'archive', 'maintenance', 'storage',
+           'chore_templates', 'change_bus', 'change_feed', 'analytics', 'prefetch',
+           'similarity']
+
+
+def __getattr__(name):
+    if name in __all__:
+        module = importlib.import_module(f".{name}", __name__)
+        globals()[name] = module # Later lookups bypass __getattr__
+        return module
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -1,34 +1,225 @@
 # This module houses the logic for interacting with an AI service (Google Gemini)
-# to get suggestions, such as breaking down chores into sub-tasks.
+# to get suggestions, such as breaking down chores into sub-tasks. Suggestions come from a
+# configurable provider (see Providers below): Gemini, offline keyword rules, recorded
+# responses, or a fallback chain of these.
 
+import abc
 import os
-from typing import List, Dict # Added Dict
-import google.generativeai as genai
+from contextlib import contextmanager
+from typing import Any, Callable, List, Dict, Optional # Added Dict
+import contextvars
+import json
 import re
+import threading
+import time
+
+# Number of model calls currently waiting on the upstream API. Graceful shutdown
+# waits for this to reach zero before a worker exits.
+_in_flight_calls = 0
+_in_flight_changed = threading.Condition()
+
+@contextmanager
+def _track_in_flight():
+    global _in_flight_calls
+    with _in_flight_changed:
+        _in_flight_calls += 1
+    try:
+        yield
+    finally:
+        with _in_flight_changed:
+            _in_flight_calls -= 1
+            _in_flight_changed.notify_all()
+
+def in_flight_calls() -> int:
+    """Returns how many AI calls are currently in progress in this process."""
+    return _in_flight_calls
+
+def wait_for_in_flight_calls(timeout: float) -> bool:
+    """Blocks until no AI calls are in progress. Returns False if timeout expired first."""
+    with _in_flight_changed:
+        return _in_flight_changed.wait_for(lambda: _in_flight_calls == 0, timeout=timeout)
+
+def _load_genai():
+    """Imports the Google Generative AI SDK on first use; it is slow to import and often unused."""
+    import google.generativeai as genai
+    return genai
+
+
+# --- Deadlines, concurrency limit and circuit breaker for model calls ---
+
+DEFAULT_TIMEOUT = 20.0 # Seconds a caller waits for the model before giving up on the call
+MAX_CONCURRENT = 4 # Model calls in progress at once per process
+QUEUE_TIMEOUT = 2.0 # Seconds a call waits for a free slot before failing as 'busy'
+FAILURE_THRESHOLD = 5 # Consecutive failed or timed-out calls that open the circuit
+RESET_TIMEOUT = 30.0 # Seconds the circuit stays open before one probe call is let through
+
+class AICallError(Exception):
+    """
+    A model call that was refused or did not finish. `code` is 'timeout' (the deadline passed),
+    'busy' (no free slot in time) or 'circuit_open' (recent calls failed; not tried).
+    """
+    def __init__(self, code: str, message: str):
+        super().__init__(message)
+        self.code = code
+
+
+class CircuitBreaker:
+    """
+    Fails fast while the upstream is down. After `failure_threshold` consecutive failures the
+    circuit opens and calls are refused; `reset_timeout` seconds later it is half-open and lets
+    one probe call through, whose outcome closes or re-opens it. Thread-safe.
+    """
+
+    def __init__(self, failure_threshold: int = FAILURE_THRESHOLD, reset_timeout: float = RESET_TIMEOUT,
+                 clock=time.monotonic):
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at: Optional[float] = None # None while closed
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        """'closed', 'open' or 'half_open'."""
+        with self._lock:
+            if self._opened_at is None:
+                return 'closed'
+            return 'half_open' if self._clock() >= self._opened_at + self.reset_timeout else 'open'
+
+    def retry_after(self) -> float:
+        """Seconds until the circuit lets a probe through (0 if it would now)."""
+        with self._lock:
+            if self._opened_at is None:
+                return 0.0
+            return max(0.0, self._opened_at + self.reset_timeout - self._clock())
+
+    def allow(self) -> bool:
+        """Whether a call may be made now. A True while half-open makes it the probe: report its outcome."""
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if self._probing or self._clock() < self._opened_at + self.reset_timeout:
+                return False
+            self._probing = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._probing or self._failures >= self.failure_threshold:
+                self._opened_at = self._clock() # A failed probe re-opens for another reset_timeout
+            self._probing = False
+
+    def release(self):
+        """Gives back an allowed call that was never made (e.g. no free slot), so another can probe."""
+        with self._lock:
+            self._probing = False
+
+
+class CallGuard:
+    """
+    Runs model calls with a deadline, at most `max_concurrent` at a time, behind a circuit
+    breaker. Python can't interrupt a thread, so each call runs on its own daemon thread: at the
+    deadline the caller stops waiting and gets AICallError('timeout'), while the call itself is
+    cancelled by its transport timeout (it is passed the seconds left) and keeps its slot until
+    it returns, so hung calls can't pile up beyond the limit.
+    """
+
+    def __init__(self, timeout: float = DEFAULT_TIMEOUT, max_concurrent: int = MAX_CONCURRENT,
+                 queue_timeout: float = QUEUE_TIMEOUT, breaker: Optional[CircuitBreaker] = None):
+        self.timeout = timeout
+        self.max_concurrent = max(1, max_concurrent)
+        self.queue_timeout = queue_timeout
+        self.breaker = breaker or CircuitBreaker()
+        self._slots = threading.BoundedSemaphore(self.max_concurrent)
+
+    def call(self, fn: Callable[[float], Any], timeout: Optional[float] = None) -> Any:
+        """
+        Returns fn(seconds_left). Raises AICallError if the call was refused or missed its
+        deadline; exceptions from fn are re-raised. Both count as failures for the breaker.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        if not self.breaker.allow():
+            raise AICallError('circuit_open', f"AI service unavailable after repeated errors; "
+                                              f"retrying in {self.breaker.retry_after():.0f} s.")
+        if not self._slots.acquire(timeout=min(self.queue_timeout, timeout)):
+            self.breaker.release()
+            raise AICallError('busy', "Too many AI requests in progress; please try again shortly.")
+
+        outcome = {}
+        finished = threading.Event()
+        def run():
+            try:
+                outcome['value'] = fn(max(0.0, deadline - time.monotonic()))
+            except BaseException as e:
+                outcome['error'] = e
+            finally:
+                self._slots.release()
+                finished.set()
+        # In the caller's context, so household and origin carry over to anything fn writes.
+        threading.Thread(target=contextvars.copy_context().run, args=(run,), name='chores-ai-call', daemon=True).start()
+
+        if not finished.wait(max(0.0, deadline - time.monotonic())):
+            self.breaker.record_failure()
+            raise AICallError('timeout', f"The AI service did not answer within {timeout:g} s.")
+        if 'error' in outcome:
+            self.breaker.record_failure()
+            raise outcome['error']
+        self.breaker.record_success()
+        return outcome['value']
+
+
+# The process-wide guard for calls to Gemini.
+_guard = CallGuard()
+
+def configure_guard(timeout: Optional[float] = None, max_concurrent: Optional[int] = None,
+                    failure_threshold: Optional[int] = None, reset_timeout: Optional[float] = None) -> CallGuard:
+    """Replaces the process-wide guard (settings left as None keep their defaults) and returns it."""
+    global _guard
+    _guard = CallGuard(
+        timeout=DEFAULT_TIMEOUT if timeout is None else timeout,
+        max_concurrent=MAX_CONCURRENT if max_concurrent is None else max_concurrent,
+        breaker=CircuitBreaker(FAILURE_THRESHOLD if failure_threshold is None else failure_threshold,
+                               RESET_TIMEOUT if reset_timeout is None else reset_timeout),
+    )
+    return _guard
+
+def get_guard() -> CallGuard:
+    return _guard
+
+def _error_response(code: str, message: str) -> Dict[str, Any]:
+    # The usual shape, so callers that ignore 'error' just see no suggestions.
+    return {'sub_tasks': [], 'materials': [], 'error': {'code': code, 'message': message}}
 
 # Attempt to configure API key from environment variable at module load time (optional)
 # Or configure it within the function call to ensure it's checked each time.
 # For this iteration, we'll check and configure within the function.
 
-def get_subtask_and_material_suggestions(chore_description: str, existing_subtask_descriptions: List[str] = None) -> Dict[str, List[str]]:
+def _gemini_suggestions(chore_description: str, existing_subtask_descriptions: List[str]) -> Dict[str, Any]:
     """
     Gets NEW sub-task suggestions AND material suggestions from Google Gemini API.
     Returns a dictionary: {'sub_tasks': [...], 'materials': [...]}.
-    Falls back to returning empty lists or error messages if API key is not set or an error occurs.
+    If the API key is not set or the call fails, the lists are empty and 'error' is set to
+    {'code', 'message'}; code is 'no_api_key', 'timeout', 'busy', 'circuit_open' or 'failed'.
     """
-    if existing_subtask_descriptions is None:
-        existing_subtask_descriptions = []
-
     default_response = {'sub_tasks': [], 'materials': []}
     api_key = os.environ.get("GOOGLE_API_KEY")
 
     if not api_key:
         print("[AI Assistant] GOOGLE_API_KEY not found. Skipping AI suggestions.")
-        # Return a specific structure indicating the error for the caller to handle.
-        default_response['sub_tasks'] = ["AI features disabled: GOOGLE_API_KEY not set."]
-        return default_response
+        return _error_response('no_api_key', "AI features disabled: GOOGLE_API_KEY not set.")
 
     try:
+        genai = _load_genai()
         genai.configure(api_key=api_key)
         model = genai.GenerativeModel('gemini-2.5-pro')
 
@@ -63,7 +254,11 @@ def get_subtask_and_material_suggestions(chore_description: str, existing_subtas
         """
 
         print(f"[AI Assistant] Sending prompt to Gemini for chore: '{chore_description}' (requesting sub-tasks and materials).")
-        response = model.generate_content(prompt)
+        def generate(seconds_left):
+            with _track_in_flight():
+                # The transport timeout ends the request itself once the caller has stopped waiting.
+                return model.generate_content(prompt, request_options={'timeout': max(seconds_left, 1.0)})
+        response = _guard.call(generate)
 
         if not response.text:
             print("[AI Assistant] Received empty response from Gemini.")
@@ -126,22 +321,218 @@ def get_subtask_and_material_suggestions(chore_description: str, existing_subtas
         print(f"[AI Assistant] Parsed suggestions - Sub-tasks: {suggested_sub_tasks}, Materials: {suggested_materials}")
         return {'sub_tasks': suggested_sub_tasks, 'materials': suggested_materials}
 
+    except AICallError as e:
+        print(f"[AI Assistant] Gemini call for chore '{chore_description}' not completed ({e.code}): {e}")
+        return _error_response(e.code, f"Error getting AI suggestions: {e}")
     except Exception as e:
         print(f"[AI Assistant] Error interacting with Google Gemini API: {e}")
-        default_response['sub_tasks'] = [f"Error getting AI suggestions: {type(e).__name__}"]
-        return default_response
-
-
-# Helper mock function (can be removed if not needed for fallback)
-def _get_mock_suggestions(chore_description: str) -> List[str]: # This mock is now outdated
-    """Provides basic mock suggestions if API key is not available."""
-    # This is a simplified version of the previous mock
-    suggestions = []
-    description_lower = chore_description.lower()
-    if "kitchen" in description_lower:
-        suggestions.extend(["Clear countertops", "Wash dishes", "Wipe surfaces"])
-    elif "fix" in description_lower:
-        suggestions.extend(["Identify problem", "Gather tools", "Attempt repair"])
-    else:
-        suggestions.extend(["Assess task", "Break into steps", "Execute steps"])
-    return suggestions[:3] # Return up to 3 mock suggestions
+        return _error_response('failed', f"Error getting AI suggestions: {type(e).__name__}")
+
+
+def suggestion_error(response: Dict[str, Any]) -> Optional[str]:
+    """
+    The error message of a get_subtask_and_material_suggestions() response that carries no
+    suggestions (missing API key, failed call), or None if it holds real suggestions.
+    """
+    error = response.get('error')
+    return error['message'] if error else None
+
+
+# --- Providers ---
+
+class SuggestionProvider(abc.ABC):
+    """
+    A source of suggestions. suggest(chore, existing) returns {'sub_tasks': [...], 'materials': [...]}
+    for a chore description, leaving out the existing sub-task descriptions; if it can't, the
+    lists are empty and 'error' is {'code', 'message'}. `name` is how configuration refers to it.
+    """
+    name = None
+
+    @abc.abstractmethod
+    def suggest(self, chore: str, existing: List[str]) -> Dict[str, Any]:
+        """Suggestions for the chore, without the existing sub-tasks."""
+
+
+class GeminiProvider(SuggestionProvider):
+    """Google Gemini, behind the process-wide CallGuard (deadline, concurrency limit, circuit breaker)."""
+    name = 'gemini'
+
+    def suggest(self, chore: str, existing: List[str]) -> Dict[str, Any]:
+        return _gemini_suggestions(chore, existing)
+
+
+# (keywords, sub-tasks, materials). A chore matches a rule if one of its words is a keyword;
+# the suggestions of every matching rule are combined, in this order.
+_HEURISTIC_RULES = [
+    ({'kitchen', 'dishes', 'oven', 'fridge', 'stove', 'counters'},
+     ["Clear countertops", "Wash dishes", "Wipe surfaces"], ["Dish soap", "Sponge", "All-purpose cleaner"]),
+    ({'bathroom', 'toilet', 'shower', 'tub', 'bath'},
+     ["Scrub toilet", "Clean shower and tub", "Wipe sink and mirror"], ["Toilet brush", "Bathroom cleaner", "Glass cleaner"]),
+    ({'laundry', 'clothes', 'towels', 'sheets', 'bedding'},
+     ["Sort by colour and fabric", "Wash and dry", "Fold and put away"], ["Laundry detergent", "Laundry basket"]),
+    ({'lawn', 'mow', 'grass', 'yard', 'garden', 'weeds', 'hedge', 'leaves'},
+     ["Clear debris", "Mow or trim", "Bag clippings"], ["Lawn mower", "Rake", "Garden waste bags"]),
+    ({'fix', 'repair', 'broken', 'leak', 'leaking', 'replace'},
+     ["Identify problem", "Gather tools", "Attempt repair"], ["Toolbox"]),
+    ({'paint', 'painting', 'repaint'},
+     ["Tape and cover surfaces", "Apply paint", "Clean brushes and rollers"], ["Paint", "Brushes and rollers", "Painter's tape", "Drop cloth"]),
+    ({'car', 'vehicle'},
+     ["Vacuum interior", "Wash exterior", "Clean windows"], ["Car shampoo", "Bucket", "Microfiber cloths"]),
+    ({'window', 'windows', 'mirrors'},
+     ["Dust frames and sills", "Wash glass", "Dry without streaks"], ["Glass cleaner", "Squeegee", "Microfiber cloths"]),
+    ({'vacuum', 'carpet', 'carpets', 'floor', 'floors', 'mop', 'sweep'},
+     ["Clear the floor", "Vacuum or sweep", "Mop hard floors"], ["Vacuum cleaner", "Mop and bucket", "Floor cleaner"]),
+    ({'trash', 'garbage', 'rubbish', 'recycling', 'bins'},
+     ["Collect trash from every room", "Sort recycling", "Take bins out"], ["Trash bags"]),
+    ({'organize', 'organise', 'declutter', 'tidy', 'closet', 'garage', 'attic'},
+     ["Empty the space", "Sort into keep, donate and discard", "Put items back by category"], ["Storage boxes", "Labels"]),
+]
+_HEURISTIC_FALLBACK = (["Assess task", "Break into steps", "Execute steps"], [])
+MAX_HEURISTIC_SUB_TASKS = 5
+MAX_HEURISTIC_MATERIALS = 8
+
+def _get_mock_suggestions(chore_description: str) -> Dict[str, List[str]]:
+    """Rule-based sub-tasks and materials for a chore, from the keywords in its description. Deterministic."""
+    words = set(re.findall(r"[a-z]+", chore_description.lower()))
+    matched = [(sub_tasks, materials) for keywords, sub_tasks, materials in _HEURISTIC_RULES if words & keywords]
+    sub_tasks, materials = [], []
+    for rule_sub_tasks, rule_materials in matched or [_HEURISTIC_FALLBACK]:
+        sub_tasks.extend(desc for desc in rule_sub_tasks if desc not in sub_tasks)
+        materials.extend(material for material in rule_materials if material not in materials)
+    return {'sub_tasks': sub_tasks, 'materials': materials}
+
+
+class HeuristicProvider(SuggestionProvider):
+    """Offline keyword rules (_HEURISTIC_RULES): instant, free and always answers."""
+    name = 'heuristic'
+
+    def suggest(self, chore: str, existing: List[str]) -> Dict[str, Any]:
+        suggestions = _get_mock_suggestions(chore)
+        existing_normalized = {desc.strip().lower() for desc in existing}
+        sub_tasks = [desc for desc in suggestions['sub_tasks'] if desc.lower() not in existing_normalized]
+        return {'sub_tasks': sub_tasks[:MAX_HEURISTIC_SUB_TASKS],
+                'materials': suggestions['materials'][:MAX_HEURISTIC_MATERIALS]}
+
+
+class ReplayProvider(SuggestionProvider):
+    """
+    Answers from a JSON file of recorded responses, {normalized chore description: response},
+    for reproducible tests and benchmarks. Chores not in the file get error code 'not_recorded'.
+    With `record`, those are asked of that provider instead, and its answers are added to the file.
+    """
+    name = 'replay'
+
+    def __init__(self, path: str, record: Optional[SuggestionProvider] = None):
+        self.path = path
+        self.record = record
+        self._lock = threading.Lock()
+        try:
+            with open(path, encoding='utf-8') as f:
+                self._responses: Dict[str, Dict[str, List[str]]] = json.load(f)
+        except FileNotFoundError:
+            if record is None:
+                raise
+            self._responses = {}
+
+    @staticmethod
+    def key(chore: str) -> str:
+        return " ".join(chore.lower().split())
+
+    def suggest(self, chore: str, existing: List[str]) -> Dict[str, Any]:
+        key = self.key(chore)
+        with self._lock:
+            recorded = self._responses.get(key)
+        if recorded is None and self.record is not None:
+            response = self.record.suggest(chore, existing)
+            if not response.get('error'):
+                recorded = {'sub_tasks': list(response['sub_tasks']), 'materials': list(response['materials'])}
+                with self._lock:
+                    self._responses[key] = recorded
+                    with open(self.path, 'w', encoding='utf-8') as f:
+                        json.dump(self._responses, f, indent=2, sort_keys=True)
+            return response
+        if recorded is None:
+            return _error_response('not_recorded', f"Error getting AI suggestions: no recorded response for '{chore}'.")
+        existing_normalized = {desc.strip().lower() for desc in existing}
+        return {'sub_tasks': [desc for desc in recorded['sub_tasks'] if desc.strip().lower() not in existing_normalized],
+                'materials': list(recorded['materials'])}
+
+
+class FallbackProvider(SuggestionProvider):
+    """
+    Tries each provider in turn and returns the first answer without an error. If all of them
+    fail, returns the first provider's error, which is the one worth reporting.
+    """
+
+    def __init__(self, providers: List[SuggestionProvider]):
+        if not providers:
+            raise ValueError("A fallback chain needs at least one provider.")
+        self.providers = list(providers)
+        self.name = ",".join(provider.name or type(provider).__name__ for provider in self.providers)
+
+    def suggest(self, chore: str, existing: List[str]) -> Dict[str, Any]:
+        first_error = None
+        for provider in self.providers:
+            response = provider.suggest(chore, existing)
+            if not response.get('error'):
+                return response
+            print(f"[AI Assistant] {provider.name} could not suggest for '{chore}' ({response['error']['code']}); "
+                  f"trying the next provider.")
+            first_error = first_error or response
+        return first_error
+
+
+PROVIDERS = {'gemini': GeminiProvider, 'heuristic': HeuristicProvider, 'replay': ReplayProvider}
+DEFAULT_PROVIDER = 'gemini'
+
+def build_provider(spec: str) -> SuggestionProvider:
+    """
+    A provider from a comma-separated fallback chain of provider names, e.g. 'gemini,heuristic'.
+    'replay' takes the recordings file after a colon: 'replay:recordings.json,heuristic'.
+    """
+    providers = []
+    for part in (part.strip() for part in spec.split(',')):
+        name, _, argument = part.partition(':')
+        if name not in PROVIDERS:
+            raise ValueError(f"Unknown AI provider {name!r}; expected one of {', '.join(PROVIDERS)}.")
+        if name == 'replay' and not argument:
+            raise ValueError("The replay provider needs a file: 'replay:<path>'.")
+        providers.append(PROVIDERS[name](argument) if argument else PROVIDERS[name]())
+    return providers[0] if len(providers) == 1 else FallbackProvider(providers)
+
+# The provider get_subtask_and_material_suggestions() uses; built on first use.
+_provider: Optional[SuggestionProvider] = None
+
+def configure_provider(provider=None) -> SuggestionProvider:
+    """
+    Selects the process-wide provider: a SuggestionProvider, or a spec for build_provider().
+    None selects DEFAULT_PROVIDER. Returns the provider.
+    """
+    global _provider
+    if provider is None or isinstance(provider, str):
+        provider = build_provider(provider or DEFAULT_PROVIDER)
+    _provider = provider
+    return _provider
+
+def get_provider() -> SuggestionProvider:
+    return _provider or configure_provider()
+
+@contextmanager
+def using_provider(provider):
+    """Selects a provider for the duration of a with block (process-wide; meant for tests and scripts)."""
+    global _provider
+    previous = _provider
+    try:
+        yield configure_provider(provider)
+    finally:
+        _provider = previous
+
+
+def get_subtask_and_material_suggestions(chore_description: str, existing_subtask_descriptions: List[str] = None) -> Dict[str, Any]:
+    """
+    Gets NEW sub-task suggestions AND material suggestions from the configured provider (Gemini
+    unless configure_provider() selected another). Returns a dictionary: {'sub_tasks': [...],
+    'materials': [...]}; if no suggestions could be had, the lists are empty and 'error' is
+    set to {'code', 'message'}.
+    """
+    return get_provider().suggest(chore_description, existing_subtask_descriptions or [])
@@ -0,0 +1,161 @@
+# Completion analytics over the task_events history (see database._add_task_events): lead time
+# from creation to completion, completions per week and how often chores were finished late.
+# The period's events are read with one query into integer columns and aggregated in bulk:
+# vectorized with NumPy when it is installed, otherwise in plain Python. SQLite backend only.
+
+import functools
+import statistics
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from . import database
+
+@functools.lru_cache(maxsize=None)
+def _load_numpy(): # Optional: vectorized aggregation, for long histories
+    """Imports NumPy on first use (it is slow to import); None if it isn't installed."""
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+DEFAULT_WEEKS = 12
+MAX_WEEKS = 520
+
+_DAY = 86400
+_WEEK = 7 * _DAY
+
+# Event codes in the query below
+_CREATED, _COMPLETED, _SUB_TASK_COMPLETED = 0, 1, 2
+
+# (task_id, code, t, has_due, due) per event, times as Unix seconds, ordered by chore and time.
+# Only completions in the period are read, plus the creation of the chores completed in it.
+_EVENTS_QUERY = f"""
+SELECT task_id, {_CREATED} AS code, CAST(strftime('%s', ts) AS INTEGER) AS t, 0 AS has_due, 0 AS due
+FROM task_events WHERE kind = 'created' AND task_id IN (
+    SELECT task_id FROM task_events WHERE ts >= :start AND kind = 'status' AND new_value = 'completed')
+UNION ALL
+SELECT task_id, {_COMPLETED}, CAST(strftime('%s', ts) AS INTEGER),
+       strftime('%s', due_date) IS NOT NULL, COALESCE(CAST(strftime('%s', due_date) AS INTEGER), 0)
+FROM task_events WHERE ts >= :start AND kind = 'status' AND new_value = 'completed'
+UNION ALL
+SELECT task_id, {_SUB_TASK_COMPLETED}, CAST(strftime('%s', ts) AS INTEGER), 0, 0
+FROM task_events WHERE ts >= :start AND kind = 'sub_task' AND new_value = '1'
+ORDER BY task_id, t
+"""
+
+_WEEKLY_FIELDS = ('completed', 'sub_tasks_completed', 'with_due_date', 'overdue')
+
+def _aggregate_numpy(rows: List[tuple], start: int, weeks: int) -> Tuple[Dict[str, List[int]], Any]:
+    numpy = _load_numpy()
+    data = numpy.array(rows, dtype=numpy.int64).reshape(-1, 5)
+    task_id, code, t, has_due, due = data.T
+    week = (t - start) // _WEEK
+    in_period = week < weeks # Clocks may disagree about "now"
+    completed = in_period & (code == _COMPLETED)
+    with_due = completed & (has_due == 1)
+    late = with_due & (t >= due + _DAY) # Finished after the end of the due day
+
+    weekly = {
+        'completed': numpy.bincount(week[completed], minlength=weeks),
+        'sub_tasks_completed': numpy.bincount(week[in_period & (code == _SUB_TASK_COMPLETED)], minlength=weeks),
+        'with_due_date': numpy.bincount(week[with_due], minlength=weeks),
+        'overdue': numpy.bincount(week[late], minlength=weeks),
+    }
+
+    # Rows are ordered by chore and time, so the first index of each id is its earliest event.
+    completed_ids, first_completed = numpy.unique(task_id[completed], return_index=True)
+    created = code == _CREATED
+    created_ids, first_created = numpy.unique(task_id[created], return_index=True)
+    _, in_completed, in_created = numpy.intersect1d(completed_ids, created_ids, assume_unique=True,
+                                                    return_indices=True)
+    lead = t[completed][first_completed][in_completed] - t[created][first_created][in_created]
+    return {name: counts.tolist() for name, counts in weekly.items()}, numpy.maximum(lead, 0)
+
+def _aggregate_python(rows: List[tuple], start: int, weeks: int) -> Tuple[Dict[str, List[int]], List[int]]:
+    weekly = {name: [0] * weeks for name in _WEEKLY_FIELDS}
+    created_at, first_completed = {}, {}
+    for task_id, code, t, has_due, due in rows:
+        if code == _CREATED:
+            created_at.setdefault(task_id, t)
+            continue
+        week = (t - start) // _WEEK
+        if week >= weeks:
+            continue
+        if code == _SUB_TASK_COMPLETED:
+            weekly['sub_tasks_completed'][week] += 1
+            continue
+        weekly['completed'][week] += 1
+        first_completed.setdefault(task_id, t)
+        if has_due:
+            weekly['with_due_date'][week] += 1
+            weekly['overdue'][week] += t >= due + _DAY
+    lead = [max(t - created_at[task_id], 0) for task_id, t in first_completed.items() if task_id in created_at]
+    return weekly, lead
+
+def _lead_time_hours(lead_seconds) -> Dict[str, Optional[float]]:
+    if len(lead_seconds) == 0:
+        return {'count': 0, 'mean': None, 'median': None, 'p90': None}
+    numpy = _load_numpy()
+    if numpy is not None:
+        hours = numpy.asarray(lead_seconds, dtype=numpy.float64) / 3600
+        mean, median, p90 = hours.mean(), numpy.median(hours), numpy.percentile(hours, 90)
+    else:
+        hours = [seconds / 3600 for seconds in lead_seconds]
+        mean, median = statistics.fmean(hours), statistics.median(hours)
+        # 'inclusive' interpolates like numpy.percentile's default; it needs two values.
+        p90 = statistics.quantiles(hours, n=10, method='inclusive')[-1] if len(hours) > 1 else hours[0]
+    return {'count': len(hours), 'mean': round(float(mean), 1), 'median': round(float(median), 1),
+            'p90': round(float(p90), 1)}
+
+def _rate(part: int, whole: int) -> Optional[float]:
+    return round(part / whole, 3) if whole else None
+
+
+def completion_stats(weeks: int = DEFAULT_WEEKS, now: Optional[datetime] = None) -> Dict[str, Any]:
+    """
+    Completion statistics for the last `weeks` calendar weeks (Monday to Sunday, UTC; the
+    current week included). Returns:
+      'weeks': one entry per week, oldest first: {'week_start' (YYYY-MM-DD), 'completed',
+               'sub_tasks_completed', 'with_due_date', 'overdue', 'overdue_rate'}. A chore counts
+               as completed each time its status changes to 'completed', and as overdue if that
+               happened after its due date.
+      'completed', 'overdue_rate': the same over the whole period.
+      'lead_time_hours': {'count', 'mean', 'median', 'p90'}, from creation to each chore's first
+               completion in the period (None values if there were none).
+      'open', 'open_overdue': chores not completed now, and those of them past their due date.
+    """
+    weeks = max(1, min(int(weeks), MAX_WEEKS))
+    now = now or datetime.now(timezone.utc)
+    today = now.astimezone(timezone.utc).date() if now.tzinfo else now.date()
+    first_day = today - timedelta(days=today.weekday(), weeks=weeks - 1)
+    start = int(datetime(first_day.year, first_day.month, first_day.day, tzinfo=timezone.utc).timestamp())
+
+    conn = database.get_db_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.row_factory = None # Plain tuples convert straight to an array
+        rows = cursor.execute(_EVENTS_QUERY, {'start': f"{first_day.isoformat()}T00:00:00Z"}).fetchall()
+        open_count, open_overdue = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(due_date > '' AND due_date < ?), 0) FROM tasks WHERE status != 'completed'",
+            (today.isoformat(),)
+        ).fetchone()
+    finally:
+        conn.close()
+
+    aggregate = _aggregate_numpy if rows and _load_numpy() is not None else _aggregate_python
+    weekly, lead_seconds = aggregate(rows, start, weeks)
+
+    per_week = []
+    for index in range(weeks):
+        counts = {name: weekly[name][index] for name in _WEEKLY_FIELDS}
+        counts['overdue_rate'] = _rate(counts['overdue'], counts['with_due_date'])
+        per_week.append({'week_start': (first_day + timedelta(weeks=index)).isoformat(), **counts})
+    return {
+        'weeks': per_week,
+        'completed': sum(weekly['completed']),
+        'overdue_rate': _rate(sum(weekly['overdue']), sum(weekly['with_due_date'])),
+        'lead_time_hours': _lead_time_hours(lead_seconds),
+        'open': open_count,
+        'open_overdue': open_overdue,
+    }
@@ -0,0 +1,164 @@
+# Moves completed chores out of the hot tasks/sub_tasks tables into archive tables, and back.
+
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+from . import change_bus, database
+from .storage import _TASK_COLUMNS, _SUB_TASK_COLUMNS, _id_chunks
+from .tasks import Task, _publish_task, _row_to_task, _row_to_sub_task_dict
+
+ARCHIVE_BATCH_SIZE = 200 # Chores moved per transaction, so the write lock is held only briefly
+DEFAULT_ARCHIVE_AFTER_DAYS = 30
+
+_SUB_TASK_COPY_COLUMNS = "id, task_id, description, completed, order_index, version"
+
+class ArchivedTask(Task):
+    """A chore in the archive; also knows when it was completed and archived (UTC ISO strings)."""
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.completed_at: Optional[str] = None
+        self.archived_at: Optional[str] = None
+
+def _utc_timestamp(moment: datetime) -> str:
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc)
+    return moment.strftime('%Y-%m-%dT%H:%M:%SZ')
+
+def _row_to_archived_task(row) -> Optional[ArchivedTask]:
+    task = _row_to_task(row)
+    if task is None:
+        return None
+    archived = ArchivedTask(task.description, status=task.status, notes=task.notes, due_date=task.due_date,
+                            materials_needed=task.materials_needed)
+    archived.id, archived.version = task.id, task.version
+    archived.completed_at, archived.archived_at = row['completed_at'], row['archived_at']
+    return archived
+
+
+def _archive_batch(conn, cutoff: str, batch_size: int) -> int:
+    rows = conn.execute(
+        "SELECT id FROM tasks WHERE status = 'completed' AND completed_at < ? ORDER BY completed_at LIMIT ?",
+        (cutoff, batch_size)
+    ).fetchall()
+    if not rows:
+        return 0
+    return _move_to_archive(conn, tuple(row['id'] for row in rows))
+
+def _move_to_archive(conn, ids: tuple) -> int:
+    """Copies the chores with these (existing) ids and their sub-tasks to the archive, then deletes them."""
+    placeholders = ", ".join("?" for _ in ids)
+    archived_at = _utc_timestamp(datetime.now(timezone.utc))
+    conn.execute(
+        f"INSERT INTO archived_tasks ({_TASK_COLUMNS}, completed_at, archived_at) "
+        f"SELECT {_TASK_COLUMNS}, completed_at, ? FROM tasks WHERE id IN ({placeholders})",
+        (archived_at,) + ids
+    )
+    conn.execute(
+        f"INSERT INTO archived_sub_tasks ({_SUB_TASK_COPY_COLUMNS}) "
+        f"SELECT {_SUB_TASK_COPY_COLUMNS} FROM sub_tasks WHERE task_id IN ({placeholders})", ids
+    )
+    conn.execute(f"DELETE FROM sub_tasks WHERE task_id IN ({placeholders})", ids)
+    conn.execute(f"DELETE FROM tasks WHERE id IN ({placeholders})", ids)
+    return len(ids)
+
+def archive_completed(before: Optional[datetime] = None, batch_size: int = ARCHIVE_BATCH_SIZE) -> int:
+    """
+    Moves chores completed before `before` (default: DEFAULT_ARCHIVE_AFTER_DAYS ago), with their
+    sub-tasks, into the archive tables. Each batch is its own transaction, so other writers get
+    the lock between batches. Returns the number of chores archived.
+    """
+    if before is None:
+        before = datetime.now(timezone.utc) - timedelta(days=DEFAULT_ARCHIVE_AFTER_DAYS)
+    cutoff = _utc_timestamp(before)
+    archived = 0
+    while True:
+        moved = database.run_write(lambda conn: _archive_batch(conn, cutoff, batch_size))
+        archived += moved
+        if moved < batch_size:
+            if archived:
+                change_bus.publish('task.archived', None) # Ids aren't collected; listeners resync
+            return archived
+
+def archive_tasks(task_ids: List[int]) -> Dict[int, bool]:
+    """
+    Moves the given chores (whatever their status) and their sub-tasks to the archive, in one
+    transaction. Returns {task_id: True if archived, False if no such chore}, in input order.
+    """
+    unique_ids = list(dict.fromkeys(int(task_id) for task_id in task_ids))
+
+    def move(conn) -> set:
+        archived = set()
+        for chunk in _id_chunks(unique_ids):
+            placeholders = ", ".join("?" for _ in chunk)
+            existing = tuple(row['id'] for row in conn.execute(
+                f"SELECT id FROM tasks WHERE id IN ({placeholders})", tuple(chunk)))
+            if existing:
+                _move_to_archive(conn, existing)
+                archived.update(existing)
+        return archived
+
+    archived = database.run_write(move)
+    if archived:
+        change_bus.publish('task.archived', [task_id for task_id in unique_ids if task_id in archived])
+    return {task_id: task_id in archived for task_id in unique_ids}
+
+def restore_task(task_id: int) -> Optional[Task]:
+    """
+    Moves an archived chore and its sub-tasks back to the active tables, keeping their ids.
+    Returns the restored task, or None if it isn't in the archive.
+    """
+    def restore(conn):
+        exists = conn.execute("SELECT 1 FROM archived_tasks WHERE id = ?", (task_id,)).fetchone()
+        if not exists:
+            return None
+        # completed_at is carried over, so an old chore isn't archived again only because it was restored.
+        conn.execute(
+            f"INSERT INTO tasks ({_TASK_COLUMNS}, completed_at) "
+            f"SELECT {_TASK_COLUMNS}, completed_at FROM archived_tasks WHERE id = ?", (task_id,)
+        )
+        conn.execute(
+            f"INSERT INTO sub_tasks ({_SUB_TASK_COPY_COLUMNS}) "
+            f"SELECT {_SUB_TASK_COPY_COLUMNS} FROM archived_sub_tasks WHERE task_id = ?", (task_id,)
+        )
+        conn.execute("DELETE FROM archived_sub_tasks WHERE task_id = ?", (task_id,))
+        conn.execute("DELETE FROM archived_tasks WHERE id = ?", (task_id,))
+        return conn.execute(f"SELECT {_TASK_COLUMNS} FROM tasks WHERE id = ?", (task_id,)).fetchone()
+
+    try:
+        row = database.run_write(restore)
+    except database.sqlite3.IntegrityError as e: # The id is in use again (only after a reset)
+        print(f"Cannot restore archived task ID {task_id}: {e}")
+        return None
+    restored = _row_to_task(row)
+    _publish_task('task.created', restored)
+    return restored
+
+
+def count_archived() -> int:
+    conn = database.get_db_connection()
+    count = conn.execute("SELECT COUNT(*) FROM archived_tasks").fetchone()[0]
+    conn.close()
+    return count
+
+def get_archived_tasks(limit: int = 50, offset: int = 0) -> List[ArchivedTask]:
+    """Archived chores, most recently completed first, with their sub-tasks loaded."""
+    conn = database.get_db_connection()
+    rows = conn.execute(
+        f"SELECT {_TASK_COLUMNS}, completed_at, archived_at FROM archived_tasks "
+        "ORDER BY completed_at DESC, id DESC LIMIT ? OFFSET ?", (limit, offset)
+    ).fetchall()
+    archived = [_row_to_archived_task(row) for row in rows]
+
+    by_id = {task.id: task for task in archived}
+    for task in archived:
+        task.sub_tasks = []
+    if by_id:
+        placeholders = ", ".join("?" for _ in by_id)
+        sub_task_rows = conn.execute(
+            f"SELECT {_SUB_TASK_COLUMNS} FROM archived_sub_tasks WHERE task_id IN ({placeholders}) "
+            "ORDER BY task_id, order_index", tuple(by_id)
+        ).fetchall()
+        for row in sub_task_rows:
+            by_id[row['task_id']].sub_tasks.append(_row_to_sub_task_dict(row))
+    conn.close()
+    return archived
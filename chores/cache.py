@@ -0,0 +1,68 @@
+# Small in-process caches shared by the web layer.
+
+import sys
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+
+class BoundedCache:
+    """
+    A thread-safe LRU mapping with a memory budget.
+    Each entry is charged its approximate size in bytes; least recently used
+    entries are evicted until the total fits within max_bytes. Entries larger
+    than the whole budget are not stored at all.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._items: "OrderedDict[Hashable, tuple]" = OrderedDict() # key -> (value, size)
+        self._current_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                self.misses += 1
+                return default
+            self._items.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def put(self, key: Hashable, value: Any, size: Optional[int] = None) -> bool:
+        """Stores value under key. Returns False if it does not fit in the budget."""
+        if size is None:
+            size = sys.getsizeof(value)
+        if size > self.max_bytes:
+            return False
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self._current_bytes -= old[1]
+            self._items[key] = (value, size)
+            self._current_bytes += size
+            while self._current_bytes > self.max_bytes:
+                _, (_, evicted_size) = self._items.popitem(last=False)
+                self._current_bytes -= evicted_size
+        return True
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+            self._current_bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                'entries': len(self._items),
+                'bytes': self._current_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+            }
@@ -0,0 +1,209 @@
+# In-process publish/subscribe for chore changes. chores.tasks publishes an event after every
+# successful write; web_app streams them to open pages as Server-Sent Events (/events), so pages
+# patch themselves instead of being reloaded. The bus only reaches subscribers in the same process.
+
+import collections
+import contextlib
+import contextvars
+import threading
+from typing import Any, Deque, Dict, List, Optional
+
+from . import database
+
+BUFFER_SIZE = 100 # Events queued per subscriber; past this the oldest are dropped and a resync is sent
+HISTORY_SIZE = 256 # Recent events kept so a reconnecting client (Last-Event-ID) can catch up
+MAX_SUBSCRIBERS = 200 # Each open stream holds a server thread
+
+_SENTINEL = object()
+
+class TooManySubscribersError(Exception):
+    """Raised by subscribe() when MAX_SUBSCRIBERS streams are already open."""
+
+# Who caused the writes in this context (e.g. a browser tab's client id). Subscribers can skip
+# their own changes, which their page has already applied.
+_origin: contextvars.ContextVar = contextvars.ContextVar('change_origin', default=None)
+
+def set_origin(origin: Optional[str]):
+    """Tags events published in this context with `origin`. Returns a token for reset_origin()."""
+    return _origin.set(origin)
+
+def reset_origin(token):
+    _origin.reset(token)
+
+@contextlib.contextmanager
+def using_origin(origin: Optional[str]):
+    token = set_origin(origin)
+    try:
+        yield
+    finally:
+        reset_origin(token)
+
+
+class ChangeEvent:
+    """
+    One change: kind (e.g. 'task.updated', 'sub_task.created'), the chores it touched (task_ids;
+    None means possibly all of them) and the household it happened in. `data` holds the changed
+    row ('task' or 'sub_task', in task_to_dict form) or, for bulk writes, the fields set ('changes').
+    """
+    __slots__ = ('id', 'kind', 'task_ids', 'tenant', 'origin', 'data')
+
+    def __init__(self, id: int, kind: str, task_ids: Optional[List[int]], tenant: Optional[str],
+                 origin: Optional[str], data: Dict[str, Any]):
+        self.id = id
+        self.kind = kind
+        self.task_ids = task_ids
+        self.tenant = tenant
+        self.origin = origin
+        self.data = data
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'id': self.id, 'kind': self.kind, 'task_ids': self.task_ids, **self.data}
+
+    def __repr__(self):
+        return f"ChangeEvent(id={self.id}, kind='{self.kind}', task_ids={self.task_ids})"
+
+
+class Subscription:
+    """
+    A subscriber's bounded queue of events for one household, optionally only those touching
+    one chore. A slow reader never blocks publishers: when the queue is full the oldest event is
+    dropped and `overflowed` is set, which tells the reader to resync (reload) instead.
+    """
+
+    def __init__(self, bus: 'ChangeBus', tenant: Optional[str], task_id: Optional[int],
+                 exclude_origin: Optional[str], buffer_size: int):
+        self._bus = bus
+        self.tenant = tenant
+        self.task_id = task_id
+        self.exclude_origin = exclude_origin
+        self._events: Deque[ChangeEvent] = collections.deque(maxlen=buffer_size)
+        self._ready = threading.Condition()
+        self.overflowed = False
+        self.closed = False
+
+    def wants(self, event: ChangeEvent) -> bool:
+        if event.tenant != self.tenant or (self.exclude_origin and event.origin == self.exclude_origin):
+            return False
+        return self.task_id is None or event.task_ids is None or self.task_id in event.task_ids
+
+    def _put(self, event: ChangeEvent):
+        with self._ready:
+            if len(self._events) == self._events.maxlen:
+                self.overflowed = True
+            self._events.append(event)
+            self._ready.notify()
+
+    def get(self, timeout: Optional[float] = None) -> List[ChangeEvent]:
+        """
+        Waits up to `timeout` seconds for events and returns all that are queued (possibly none).
+        Check `overflowed` afterwards: if set, events were lost.
+        """
+        with self._ready:
+            if not self._events and not self.closed:
+                self._ready.wait(timeout)
+            events = list(self._events)
+            self._events.clear()
+            return events
+
+    def take_overflow(self) -> bool:
+        """Returns whether events were dropped since the last call, and clears the flag."""
+        with self._ready:
+            overflowed, self.overflowed = self.overflowed, False
+            return overflowed
+
+    def close(self):
+        with self._ready:
+            self.closed = True
+            self._ready.notify_all()
+        self._bus._unsubscribe(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class ChangeBus:
+    """Fans events out to subscriptions. Thread-safe; publishing never waits on a subscriber."""
+
+    def __init__(self, buffer_size: int = BUFFER_SIZE, history_size: int = HISTORY_SIZE,
+                 max_subscribers: int = MAX_SUBSCRIBERS):
+        self.buffer_size = buffer_size
+        self.max_subscribers = max_subscribers
+        self._lock = threading.Lock()
+        self._subscriptions: List[Subscription] = []
+        self._history: Deque[ChangeEvent] = collections.deque(maxlen=history_size)
+        self._last_id = 0
+
+    def subscribe(self, task_id: Optional[int] = None, tenant: Any = _SENTINEL,
+                  exclude_origin: Optional[str] = None, last_event_id: Optional[int] = None) -> Subscription:
+        """
+        Subscribes to the current household's events (or `tenant`'s), optionally only those for
+        one chore and not those caused by `exclude_origin`. With last_event_id, events published
+        after it that are still in the history are queued first; if some have already been
+        forgotten, the subscription starts out overflowed.
+        """
+        if tenant is _SENTINEL:
+            tenant = database.current_tenant()
+        subscription = Subscription(self, tenant, task_id, exclude_origin, self.buffer_size)
+        with self._lock:
+            if len(self._subscriptions) >= self.max_subscribers:
+                raise TooManySubscribersError(f"{self.max_subscribers} change streams are already open")
+            if last_event_id is not None:
+                oldest = self._history[0].id if self._history else self._last_id + 1
+                # Some events in between were forgotten, or the id is from before a restart
+                if last_event_id + 1 < oldest or last_event_id > self._last_id:
+                    subscription.overflowed = True
+                for event in self._history:
+                    if event.id > last_event_id and subscription.wants(event):
+                        subscription._put(event)
+            self._subscriptions.append(subscription)
+        return subscription
+
+    def _unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            if subscription in self._subscriptions:
+                self._subscriptions.remove(subscription)
+
+    def publish(self, kind: str, task_ids: Optional[List[int]], **data) -> ChangeEvent:
+        """Records an event in the current household and origin and queues it for every interested subscriber."""
+        with self._lock:
+            self._last_id += 1
+            event = ChangeEvent(self._last_id, kind, list(task_ids) if task_ids is not None else None,
+                                database.current_tenant(), _origin.get(), data)
+            self._history.append(event)
+            for subscription in self._subscriptions:
+                if subscription.wants(event):
+                    subscription._put(event)
+        return event
+
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return len(self._subscriptions)
+
+    def close_all(self):
+        """Closes every subscription, e.g. so open streams end when the server shuts down."""
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+        for subscription in subscriptions:
+            subscription.close()
+
+
+# The process-wide bus that chores.tasks publishes to.
+_bus = ChangeBus()
+
+def publish(kind: str, task_ids: Optional[List[int]], **data) -> ChangeEvent:
+    """Publishes to the process-wide bus."""
+    return _bus.publish(kind, task_ids, **data)
+
+def subscribe(**kwargs) -> Subscription:
+    """Subscribes to the process-wide bus; see ChangeBus.subscribe."""
+    return _bus.subscribe(**kwargs)
+
+def close_all():
+    """Closes every subscription to the process-wide bus."""
+    _bus.close_all()
+
+def get_bus() -> ChangeBus:
+    return _bus
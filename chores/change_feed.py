@@ -0,0 +1,142 @@
+# Incremental sync: the `changes` log (written by triggers, see database._add_change_log) read
+# from a sequence number on, consumer acknowledgements, and compaction of the acknowledged part.
+# A mirror calls changes_since(last_seq) instead of re-downloading every chore. SQLite backend only.
+
+from typing import Any, Dict, List
+
+from . import database
+from .storage import _TASK_COLUMNS, _SUB_TASK_COLUMNS, _id_chunks
+from .tasks import _row_to_sub_task_dict, _row_to_task, task_to_dict
+
+DEFAULT_LIMIT = 500
+MAX_LIMIT = 5000
+COMPACT_BATCH_SIZE = 1000 # Log rows deleted per transaction
+
+def _current_rows(conn, table: str, columns: str, ids: List[int]) -> Dict[int, Any]:
+    rows = {}
+    for chunk in _id_chunks(ids):
+        placeholders = ", ".join("?" for _ in chunk)
+        for row in conn.execute(f"SELECT {columns} FROM {table} WHERE id IN ({placeholders})", tuple(chunk)):
+            rows[row['id']] = row
+    return rows
+
+def _compacted_through(conn) -> int:
+    """The highest seq that may have been compacted away (0 if nothing has been)."""
+    oldest = conn.execute("SELECT MIN(seq) FROM changes").fetchone()[0]
+    if oldest is not None:
+        return oldest - 1
+    # An empty log: everything ever logged (if anything) was compacted.
+    row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'changes'").fetchone()
+    return row[0] if row else 0
+
+def changes_since(seq: int = 0, limit: int = DEFAULT_LIMIT) -> Dict[str, Any]:
+    """
+    Chores and sub-tasks changed after `seq`, oldest first, at most `limit` log entries per call.
+    Returns:
+      'changes': [{'seq', 'entity' ('task'/'sub_task'), 'id', 'task_id', 'op', 'changed_at',
+                   'task' or 'sub_task': the row as it is now, or None if it no longer exists}]
+                 An entity changed several times within the page appears once, at its latest seq.
+      'last_seq': pass this as `seq` next time (unchanged when there is nothing new).
+      'has_more': True if more entries follow; call again right away.
+      'reset':    True if entries after `seq` were already compacted: the client must reload
+                  everything (get_all_tasks) and continue from 'last_seq'.
+    Rows are read after the log, so a row may already reflect a later change; applying it again
+    when that change arrives is harmless.
+    """
+    limit = max(1, min(int(limit), MAX_LIMIT))
+    conn = database.get_db_connection()
+    try:
+        if seq < _compacted_through(conn):
+            latest = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'changes'").fetchone()
+            return {'changes': [], 'last_seq': latest[0] if latest else 0, 'has_more': False, 'reset': True}
+
+        log = conn.execute(
+            "SELECT seq, entity, entity_id, task_id, op, changed_at FROM changes WHERE seq > ? ORDER BY seq LIMIT ?",
+            (seq, limit + 1)
+        ).fetchall()
+        has_more = len(log) > limit
+        log = log[:limit]
+
+        latest_entries = {} # (entity, id) -> its last entry in this page
+        for entry in log:
+            latest_entries[(entry['entity'], entry['entity_id'])] = entry
+        entries = sorted(latest_entries.values(), key=lambda entry: entry['seq'])
+        tasks_now = _current_rows(conn, 'tasks', _TASK_COLUMNS,
+                                  [entry['entity_id'] for entry in entries if entry['entity'] == 'task'])
+        sub_tasks_now = _current_rows(conn, 'sub_tasks', _SUB_TASK_COLUMNS,
+                                      [entry['entity_id'] for entry in entries if entry['entity'] == 'sub_task'])
+    finally:
+        conn.close()
+
+    changes = []
+    for entry in entries:
+        change = {'seq': entry['seq'], 'entity': entry['entity'], 'id': entry['entity_id'],
+                  'task_id': entry['task_id'], 'op': entry['op'], 'changed_at': entry['changed_at']}
+        if entry['entity'] == 'task':
+            row = tasks_now.get(entry['entity_id'])
+            change['task'] = task_to_dict(_row_to_task(row), include_sub_tasks=False) if row else None
+        else:
+            change['sub_task'] = _row_to_sub_task_dict(sub_tasks_now.get(entry['entity_id']))
+        changes.append(change)
+    return {'changes': changes, 'last_seq': log[-1]['seq'] if log else seq, 'has_more': has_more, 'reset': False}
+
+def latest_seq() -> int:
+    """The seq of the newest log entry (0 if nothing was ever logged); a full reload starts here."""
+    conn = database.get_db_connection()
+    row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'changes'").fetchone()
+    conn.close()
+    return row[0] if row else 0
+
+
+# --- Consumers and compaction ---
+
+def acknowledge(consumer: str, seq: int) -> int:
+    """
+    Records that `consumer` has applied every change up to `seq` (registering it on first use).
+    Acknowledgements never move backwards. Returns the consumer's acknowledged seq.
+    """
+    consumer = (consumer or "").strip()
+    if not consumer:
+        raise ValueError("A consumer name is required.")
+
+    def write(conn):
+        conn.execute(
+            "INSERT INTO change_consumers (name, acked_seq, acked_at) "
+            "VALUES (?, ?, strftime('%Y-%m-%dT%H:%M:%SZ', 'now')) "
+            "ON CONFLICT (name) DO UPDATE SET acked_seq = MAX(acked_seq, excluded.acked_seq), acked_at = excluded.acked_at",
+            (consumer, int(seq))
+        )
+        return conn.execute("SELECT acked_seq FROM change_consumers WHERE name = ?", (consumer,)).fetchone()[0]
+
+    return database.run_write(write)
+
+def forget_consumer(consumer: str) -> bool:
+    """Stops waiting for a consumer that no longer syncs, so it doesn't hold back compaction."""
+    return database.run_write(lambda conn: conn.execute(
+        "DELETE FROM change_consumers WHERE name = ?", (consumer,)).rowcount) > 0
+
+def get_consumers() -> List[Dict[str, Any]]:
+    """Known consumers as {'name', 'acked_seq', 'acked_at'}, by name."""
+    conn = database.get_db_connection()
+    consumers = [dict(row) for row in conn.execute("SELECT name, acked_seq, acked_at FROM change_consumers ORDER BY name")]
+    conn.close()
+    return consumers
+
+def compact_changes(batch_size: int = COMPACT_BATCH_SIZE) -> int:
+    """
+    Deletes log entries every known consumer has acknowledged, in batches. With no consumers
+    registered nothing is deleted. Returns the number of entries deleted.
+    """
+    conn = database.get_db_connection()
+    through = conn.execute("SELECT MIN(acked_seq) FROM change_consumers").fetchone()[0]
+    conn.close()
+    if not through:
+        return 0
+    deleted = 0
+    while True:
+        count = database.run_write(lambda write_conn: write_conn.execute(
+            "DELETE FROM changes WHERE seq IN (SELECT seq FROM changes WHERE seq <= ? ORDER BY seq LIMIT ?)",
+            (through, batch_size)).rowcount)
+        deleted += count
+        if count < batch_size:
+            return deleted
@@ -0,0 +1,172 @@
+# Chore templates: reusable chores (e.g. "Deep-clean kitchen") with their sub-tasks.
+# Saving and instantiating copy rows table-to-table with INSERT ... SELECT inside one write
+# transaction, so a chore and all its sub-tasks never pass through Python. SQLite backend only.
+
+from datetime import date
+from typing import Any, Dict, List, Optional
+
+from . import change_bus, database
+from .storage import _TASK_COLUMNS, _id_chunks
+from .tasks import Task, _row_to_task
+
+_TEMPLATE_COLUMNS = "id, name, description, notes, materials_needed, created_at"
+
+class ChoreTemplate:
+    """A saved chore: the fields new chores start from, and their sub-task descriptions in order."""
+    def __init__(self, name: str, description: str, notes: str = "",
+                 materials_needed: Optional[List[str]] = None, sub_tasks: Optional[List[str]] = None):
+        self.id: Optional[int] = None
+        self.name: str = name
+        self.description: str = description
+        self.notes: str = notes
+        self.materials_needed: List[str] = materials_needed if materials_needed is not None else []
+        self.sub_tasks: List[str] = sub_tasks if sub_tasks is not None else []
+        self.created_at: Optional[str] = None # UTC ISO string
+
+    def __repr__(self):
+        return f"ChoreTemplate(id={self.id}, name='{self.name}', sub_tasks={len(self.sub_tasks)})"
+
+    def __str__(self):
+        return f"[{self.id}] {self.name}: {self.description} ({len(self.sub_tasks)} sub-task(s))"
+
+def _row_to_template(row) -> Optional[ChoreTemplate]:
+    if not row:
+        return None
+    materials = [m.strip() for m in row['materials_needed'].split('\n') if m.strip()] if row['materials_needed'] else []
+    template = ChoreTemplate(row['name'], row['description'], notes=row['notes'] or "", materials_needed=materials)
+    template.id, template.created_at = row['id'], row['created_at']
+    return template
+
+def template_to_dict(template: ChoreTemplate) -> Dict[str, Any]:
+    """Plain-data form of a template (JSON-serializable), as used by the CLI's --json output."""
+    return {
+        'id': template.id,
+        'name': template.name,
+        'description': template.description,
+        'notes': template.notes,
+        'materials_needed': list(template.materials_needed),
+        'sub_tasks': list(template.sub_tasks),
+        'created_at': template.created_at,
+    }
+
+
+def save_as_template(task_id: int, name: Optional[str] = None) -> Optional[ChoreTemplate]:
+    """
+    Saves a chore and its sub-tasks (descriptions and order; not their completion) as a new
+    template called `name` (default: the chore's description). Returns the template, or None
+    if the chore doesn't exist. Raises ValueError if a template with that name (ignoring case)
+    already exists.
+    """
+    def save(conn):
+        cursor = conn.execute(
+            "INSERT INTO chore_templates (name, description, notes, materials_needed, created_at) "
+            "SELECT COALESCE(?, description), description, notes, materials_needed, "
+            "strftime('%Y-%m-%dT%H:%M:%SZ', 'now') FROM tasks WHERE id = ?",
+            (name.strip() if name and name.strip() else None, task_id)
+        )
+        if cursor.rowcount == 0:
+            return None
+        template_id = cursor.lastrowid
+        conn.execute(
+            "INSERT INTO chore_template_sub_tasks (template_id, description, order_index) "
+            "SELECT ?, description, order_index FROM sub_tasks WHERE task_id = ? ORDER BY order_index, id",
+            (template_id, task_id)
+        )
+        return template_id
+
+    try:
+        template_id = database.run_write(save)
+    except database.sqlite3.IntegrityError:
+        raise ValueError(f"A template named '{name or _task_description(task_id)}' already exists.")
+    return get_template(template_id) if template_id is not None else None
+
+def _task_description(task_id: int) -> str:
+    conn = database.get_db_connection()
+    row = conn.execute("SELECT description FROM tasks WHERE id = ?", (task_id,)).fetchone()
+    conn.close()
+    return row['description'] if row else str(task_id)
+
+def instantiate_template(template_id: int, due_dates: Optional[List[Optional[date]]] = None) -> Optional[List[Task]]:
+    """
+    Creates one new pending chore, with copies of the template's sub-tasks, for every entry of
+    due_dates (None entries get no due date; the default is a single chore without one). All
+    chores are created in one transaction with two INSERT ... SELECT statements per 500 dates,
+    however many sub-tasks the template has. Returns the new chores in due_dates order, or
+    None if the template doesn't exist.
+    """
+    if due_dates is None:
+        due_dates = [None]
+    values = [(position, due_date.isoformat() if due_date else None) for position, due_date in enumerate(due_dates)]
+
+    def instantiate(conn):
+        if not conn.execute("SELECT 1 FROM chore_templates WHERE id = ?", (template_id,)).fetchone():
+            return None
+        # AUTOINCREMENT only hands out ids above every id ever used, and this transaction holds
+        # the write lock: the rows above the current maximum are exactly the chores created here.
+        first_new_id = conn.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM tasks").fetchone()[0]
+        for chunk in _id_chunks(values):
+            rows = ", ".join("(?, ?)" for _ in chunk)
+            params = tuple(value for pair in chunk for value in pair)
+            conn.execute(
+                f"WITH dates(position, due_date) AS (VALUES {rows}) "
+                "INSERT INTO tasks (description, status, notes, due_date, materials_needed) "
+                "SELECT t.description, 'pending', t.notes, dates.due_date, t.materials_needed "
+                "FROM dates, chore_templates t WHERE t.id = ? ORDER BY dates.position",
+                params + (template_id,)
+            )
+        conn.execute(
+            "INSERT INTO sub_tasks (task_id, description, completed, order_index) "
+            "SELECT tasks.id, s.description, 0, s.order_index FROM tasks, chore_template_sub_tasks s "
+            "WHERE tasks.id >= ? AND s.template_id = ? ORDER BY tasks.id, s.order_index, s.id",
+            (first_new_id, template_id)
+        )
+        return conn.execute(f"SELECT {_TASK_COLUMNS} FROM tasks WHERE id >= ? ORDER BY id", (first_new_id,)).fetchall()
+
+    rows = database.run_write(instantiate)
+    if rows is None:
+        return None
+    created = [_row_to_task(row) for row in rows]
+    if created:
+        change_bus.publish('task.created', [task.id for task in created])
+    return created
+
+
+def get_template(template_id: int) -> Optional[ChoreTemplate]:
+    """A template with its sub-task descriptions, or None if it doesn't exist."""
+    conn = database.get_db_connection()
+    template = _row_to_template(conn.execute(
+        f"SELECT {_TEMPLATE_COLUMNS} FROM chore_templates WHERE id = ?", (template_id,)).fetchone())
+    if template:
+        template.sub_tasks = [row['description'] for row in conn.execute(
+            "SELECT description FROM chore_template_sub_tasks WHERE template_id = ? ORDER BY order_index, id",
+            (template_id,))]
+    conn.close()
+    return template
+
+def find_template(name: str) -> Optional[ChoreTemplate]:
+    """The template with this name (ignoring case), or None."""
+    conn = database.get_db_connection()
+    row = conn.execute("SELECT id FROM chore_templates WHERE name = ?", (name.strip(),)).fetchone()
+    conn.close()
+    return get_template(row['id']) if row else None
+
+def get_all_templates() -> List[ChoreTemplate]:
+    """All templates, by name, with their sub-task descriptions loaded."""
+    conn = database.get_db_connection()
+    templates = [_row_to_template(row) for row in conn.execute(
+        f"SELECT {_TEMPLATE_COLUMNS} FROM chore_templates ORDER BY name, id")]
+    by_id = {template.id: template for template in templates}
+    for row in conn.execute(
+            "SELECT template_id, description FROM chore_template_sub_tasks ORDER BY template_id, order_index, id"):
+        by_id[row['template_id']].sub_tasks.append(row['description'])
+    conn.close()
+    return templates
+
+def delete_template(template_id: int) -> Optional[ChoreTemplate]:
+    """Deletes a template (its sub-tasks cascade). Chores created from it are kept. Returns it, or None."""
+    template = get_template(template_id)
+    if template is None:
+        return None
+    deleted = database.run_write(
+        lambda conn: conn.execute("DELETE FROM chore_templates WHERE id = ?", (template_id,)).rowcount)
+    return template if deleted else None
@@ -1,29 +1,639 @@
-import sqlite3
+import collections
+import contextlib
+import contextvars
 import os
+import queue
+import random
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
 
 # Determine the path for the database file.
 # Place it in the instance folder if using Flask, or project root for simplicity here.
-DATABASE_FILE = os.path.join(os.path.dirname(__file__), '..', 'chores_app.db')
+# CHORES_DATABASE (or configure(database_file=...)) overrides it; besides a path, this may be a
+# SQLite URI, including the shared-cache in-memory database "file::memory:?cache=shared".
+DATABASE_FILE = os.environ.get('CHORES_DATABASE') or os.path.join(os.path.dirname(__file__), '..', 'chores_app.db')
 # This places chores_app.db in the project root directory.
 
-def get_db_connection():
-    """Establishes a connection to the SQLite database."""
-    conn = sqlite3.connect(DATABASE_FILE)
+def _probe_returning_support() -> bool:
+    """
+    Checks whether the linked SQLite library understands INSERT/UPDATE/DELETE ... RETURNING
+    (added in SQLite 3.35). Probed against a throwaway in-memory database so that
+    builds with backported or disabled features are detected correctly.
+    """
+    conn = sqlite3.connect(":memory:")
+    try:
+        conn.execute("CREATE TABLE probe (id INTEGER PRIMARY KEY)")
+        conn.execute("INSERT INTO probe DEFAULT VALUES RETURNING id").fetchall()
+        return True
+    except sqlite3.OperationalError:
+        return False
+    finally:
+        conn.close()
+
+# Detected once at startup. The mutation layer in chores.tasks falls back to a
+# write followed by a lookup on the same connection when this is False.
+SUPPORTS_RETURNING = _probe_returning_support()
+
+# How long a connection waits on another writer's lock before raising "database is locked".
+BUSY_TIMEOUT_SECONDS = 5.0
+# Journal mode applied by init_db (e.g. 'WAL' so readers don't block behind a writer when
+# several worker processes share the file). None leaves the file's current mode untouched.
+JOURNAL_MODE = None
+
+# Directory holding one SQLite file per household ("tenant"), named <tenant_id>.db.
+# None disables sharding: every request uses DATABASE_FILE.
+SHARD_DIRECTORY = None
+# Writes (run_write) retry "database is locked" with jittered backoff until this many seconds have passed.
+WRITE_DEADLINE_SECONDS = 10.0
+WRITE_RETRY_BASE_DELAY = 0.005
+WRITE_RETRY_MAX_DELAY = 0.25
+# True funnels every write of this process through one writer thread, so threads never
+# contend for the lock among themselves (only other processes can still make them wait).
+SERIALIZE_WRITES = False
+# Group commit: small writes submitted with coalesce=True that arrive within this many seconds
+# of each other share one transaction (one commit and fsync), up to GROUP_COMMIT_MAX_BATCH
+# writes. 0 disables it.
+GROUP_COMMIT_WINDOW = 0.0
+GROUP_COMMIT_MAX_BATCH = 64
+# Open connections kept per thread, across DATABASE_FILE and all shards; least recently used are closed first.
+MAX_OPEN_CONNECTIONS = 16
+
+def configure(database_file: str = None, busy_timeout: float = None, journal_mode: str = None,
+              shard_directory: str = None, write_deadline: float = None, serialize_writes: bool = None,
+              group_commit_window: float = None):
+    """
+    Points this process at a database file and sets connection options.
+    Arguments left as None keep their current values. Pooled connections are keyed by
+    file and timeout, so this takes effect for every connection handed out afterwards.
+    """
+    global DATABASE_FILE, BUSY_TIMEOUT_SECONDS, JOURNAL_MODE, SHARD_DIRECTORY
+    global WRITE_DEADLINE_SECONDS, SERIALIZE_WRITES, GROUP_COMMIT_WINDOW
+    if database_file is not None:
+        DATABASE_FILE = _normalize_database(database_file)
+    if busy_timeout is not None:
+        BUSY_TIMEOUT_SECONDS = busy_timeout
+    if journal_mode is not None:
+        JOURNAL_MODE = journal_mode
+    if shard_directory is not None:
+        SHARD_DIRECTORY = shard_directory
+    if write_deadline is not None:
+        WRITE_DEADLINE_SECONDS = write_deadline
+    if serialize_writes is not None:
+        SERIALIZE_WRITES = serialize_writes
+    if group_commit_window is not None:
+        GROUP_COMMIT_WINDOW = group_commit_window
+
+@contextlib.contextmanager
+def using_database(database_file: str):
+    """Points this process at another database for the duration of a with block (for tests and scripts)."""
+    global DATABASE_FILE
+    previous = DATABASE_FILE
+    configure(database_file=database_file)
+    try:
+        yield DATABASE_FILE
+    finally:
+        DATABASE_FILE = previous
+
+# Every pooled connection is a separate SQLite connection, so a private ":memory:" database
+# would differ per thread. It is replaced by the process-wide shared-cache one.
+_SHARED_MEMORY_DATABASE = "file::memory:?cache=shared"
+
+def _normalize_database(database_file: str) -> str:
+    return _SHARED_MEMORY_DATABASE if database_file == ':memory:' else database_file
+
+def is_memory_database(path: str) -> bool:
+    """True for in-memory database names ("file::memory:?cache=shared", "file:name?mode=memory&cache=shared")."""
+    if not path.startswith('file:'):
+        return path == ':memory:'
+    location, _, query = path[len('file:'):].partition('?')
+    return location == ':memory:' or 'mode=memory' in query.split('&')
+
+DATABASE_FILE = _normalize_database(DATABASE_FILE)
+
+
+# --- Tenants (households) ---
+
+class UnknownTenantError(LookupError):
+    """Raised when a connection is requested for a household that has no shard."""
+
+_TENANT_ID_RE = re.compile(r'^[a-z0-9][a-z0-9_-]{0,62}$')
+
+# The household whose shard get_db_connection() uses. None means DATABASE_FILE.
+# A context variable, so each request thread (or task) has its own.
+_current_tenant = contextvars.ContextVar('chores_tenant', default=None)
+
+def validate_tenant_id(tenant_id: str) -> str:
+    """Returns tenant_id if it is a safe shard name (lowercase letters, digits, '-' and '_')."""
+    if not isinstance(tenant_id, str) or not _TENANT_ID_RE.match(tenant_id):
+        raise ValueError(f"Invalid household id: {tenant_id!r}")
+    return tenant_id
+
+def shard_path(tenant_id: str) -> str:
+    """Path of the SQLite file holding a household's data."""
+    if not SHARD_DIRECTORY:
+        raise ValueError("Sharding is not enabled: no shard directory configured.")
+    return os.path.join(SHARD_DIRECTORY, f"{validate_tenant_id(tenant_id)}.db")
+
+def shard_exists(tenant_id: str) -> bool:
+    return os.path.exists(shard_path(tenant_id))
+
+def current_tenant():
+    return _current_tenant.get()
+
+def set_current_tenant(tenant_id):
+    """Routes this context's connections to tenant_id's shard (None: the default database). Returns a reset token."""
+    if tenant_id is not None:
+        validate_tenant_id(tenant_id)
+    return _current_tenant.set(tenant_id)
+
+def reset_current_tenant(token):
+    _current_tenant.reset(token)
+
+@contextlib.contextmanager
+def using_tenant(tenant_id):
+    """Context manager form of set_current_tenant()."""
+    token = set_current_tenant(tenant_id)
+    try:
+        yield
+    finally:
+        reset_current_tenant(token)
+
+
+# --- Connections ---
+
+class _PooledConnection(sqlite3.Connection):
+    """
+    A connection that lives in the per-thread pool. close() returns it to the pool
+    (discarding any uncommitted transaction, as a real close would) instead of closing it,
+    so callers keep the usual open/close pattern while the file stays open between calls.
+    While run_write's transaction is open on it, close() leaves the transaction alone: a read
+    or nested write inside the write function must not roll back the caller's changes.
+    """
+
+    _in_write = False # Set by run_write while it owns the transaction
+
+    def close(self):
+        if self.in_transaction and not self._in_write:
+            self.rollback()
+
+    def close_for_real(self):
+        super().close()
+
+# Pools are per thread: sqlite3 connections must not be shared between threads.
+_pool = threading.local()
+# Pools inherited across a fork; see _forget_connections_after_fork().
+_inherited_pools = []
+
+def _thread_connections() -> collections.OrderedDict:
+    connections = getattr(_pool, 'connections', None)
+    if connections is None:
+        connections = _pool.connections = collections.OrderedDict()
+    return connections
+
+def _open_connection(path: str, factory=_PooledConnection) -> _PooledConnection:
+    conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT_SECONDS, factory=factory, uri=path.startswith('file:'))
     conn.row_factory = sqlite3.Row # Access columns by name
+    # Off by default in SQLite and per connection: without it ON DELETE CASCADE does nothing.
+    conn.execute("PRAGMA foreign_keys = ON")
+    if is_memory_database(path):
+        # Shared-cache connections lock whole tables and don't honour the busy timeout: a reader
+        # would fail with "database table is locked" while any write is open. Readers see
+        # uncommitted rows instead; writers still take turns through run_write's retries.
+        conn.execute("PRAGMA read_uncommitted = ON")
     return conn
 
-def init_db(conn = None):
+# An in-memory database is freed when its last connection closes. One extra connection per
+# such database stays open for the life of the process, so close_connections() and threads
+# coming and going don't wipe it.
+_memory_anchors = {}
+_memory_anchors_lock = threading.Lock()
+
+def _keep_memory_database_alive(path: str):
+    with _memory_anchors_lock:
+        if path not in _memory_anchors:
+            _memory_anchors[path] = _open_connection(path)
+
+def discard_memory_database(path: str = None):
+    """Frees an in-memory database (default: DATABASE_FILE) once the pooled connections to it are closed."""
+    with _memory_anchors_lock:
+        anchor = _memory_anchors.pop(path or DATABASE_FILE, None)
+    if anchor is not None:
+        anchor.close_for_real()
+
+def _current_database_path() -> str:
+    tenant_id = current_tenant()
+    return shard_path(tenant_id) if tenant_id is not None else DATABASE_FILE
+
+def get_db_connection():
     """
-    Initializes the database by creating tables if they don't already exist.
-    If a connection is passed, it uses it; otherwise, it creates a new one.
+    Returns a connection to the current household's database (see set_current_tenant),
+    or to DATABASE_FILE when there is none. Connections come from a per-thread LRU pool;
+    close() hands them back.
     """
-    should_close_conn = False
-    if conn is None:
+    tenant_id = current_tenant()
+    path = _current_database_path()
+    test_transaction = _rolled_back_transaction
+    if test_transaction is not None and test_transaction.path == path:
+        return test_transaction.conn
+    key = (path, BUSY_TIMEOUT_SECONDS)
+    connections = _thread_connections()
+    conn = connections.get(key)
+    if conn is not None:
+        connections.move_to_end(key)
+        return conn
+
+    if tenant_id is not None:
+        if not os.path.exists(path): # sqlite3.connect would silently create an empty file
+            raise UnknownTenantError(tenant_id)
+        conn = _open_connection(path)
+        try:
+            # Shards are brought up to date the first time this process opens them, so a
+            # deploy with new migrations doesn't have to touch every shard up front.
+            _apply_journal_mode(conn)
+            migrate(conn)
+        except sqlite3.Error:
+            conn.close_for_real()
+            raise
+    else:
+        if is_memory_database(path):
+            _keep_memory_database_alive(path)
+        conn = _open_connection(path)
+
+    connections[key] = conn
+    while len(connections) > MAX_OPEN_CONNECTIONS:
+        _, evicted = connections.popitem(last=False)
+        evicted.close_for_real()
+    return conn
+
+def close_connections():
+    """Closes every pooled connection opened by the calling thread."""
+    connections = _thread_connections()
+    while connections:
+        _, conn = connections.popitem()
+        conn.close_for_real()
+
+def _forget_connections_after_fork():
+    # A forked child must neither use nor close connections opened by its parent (SQLite's
+    # locks are per process). Keep them referenced so they are never finalized here, and
+    # start with an empty pool.
+    global _pool, _writer, _rolled_back_transaction
+    _inherited_pools.append(_pool)
+    _pool = threading.local()
+    _writer = None # The parent's writer thread doesn't exist in the child
+    # In-memory databases are per process; the child starts with empty ones.
+    _inherited_pools.append(dict(_memory_anchors))
+    _memory_anchors.clear()
+    _rolled_back_transaction = None
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_forget_connections_after_fork)
+
+
+# --- Rolled-back transactions (tests) ---
+
+class _TestTransactionConnection(_PooledConnection):
+    """
+    The one connection used inside rolled_back_transaction(). Its transaction is owned by the
+    block: commit() and close() leave it open, and rollback() returns to the block's start.
+    """
+
+    def commit(self):
+        pass
+
+    def close(self):
+        pass
+
+    def rollback(self):
+        self.execute(f"ROLLBACK TO {_TEST_SAVEPOINT}")
+
+_TEST_SAVEPOINT = "rolled_back_transaction"
+
+class _RolledBackTransaction:
+    def __init__(self, path: str, conn: _TestTransactionConnection):
+        self.path = path
+        self.conn = conn
+
+_rolled_back_transaction = None
+
+@contextlib.contextmanager
+def rolled_back_transaction():
+    """
+    Runs the block inside a savepoint that is rolled back at the end, so every change the block
+    makes (through get_db_connection or run_write, on this thread) disappears without rebuilding
+    the schema. Writes inside it become nested savepoints, so they still succeed or fail as a
+    unit. Meant for tests: only the default database (DATABASE_FILE) is covered, and SQL that
+    can't run in a transaction (VACUUM, journal mode changes) fails.
+    """
+    global _rolled_back_transaction
+    if _rolled_back_transaction is not None:
+        raise RuntimeError("rolled_back_transaction() blocks can't be nested.")
+    if is_memory_database(DATABASE_FILE):
+        _keep_memory_database_alive(DATABASE_FILE)
+    conn = _open_connection(DATABASE_FILE, factory=_TestTransactionConnection)
+    conn.execute(f"SAVEPOINT {_TEST_SAVEPOINT}") # Outside a transaction, this also begins one
+    _rolled_back_transaction = _RolledBackTransaction(DATABASE_FILE, conn)
+    try:
+        yield conn
+    finally:
+        _rolled_back_transaction = None
+        conn.execute(f"ROLLBACK TO {_TEST_SAVEPOINT}")
+        conn.execute(f"RELEASE {_TEST_SAVEPOINT}")
+        conn.close_for_real()
+
+
+# --- Writes ---
+
+class WriteTimeoutError(sqlite3.OperationalError):
+    """Raised by run_write when the database stayed locked past the write deadline."""
+
+def _is_busy_error(error: sqlite3.Error) -> bool:
+    if getattr(error, 'sqlite_errorcode', None) in (sqlite3.SQLITE_BUSY, sqlite3.SQLITE_LOCKED):
+        return True
+    message = str(error)
+    return isinstance(error, sqlite3.OperationalError) and ('locked' in message or 'busy' in message)
+
+class _WriteMetrics:
+    """Counters for run_write: how often and how long writers waited for the database lock."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.writes = 0
+            self.retries = 0
+            self.timeouts = 0
+            self.total_lock_wait = 0.0
+            self.max_lock_wait = 0.0
+            self.group_commits = 0
+            self.grouped_writes = 0
+
+    def record(self, lock_wait: float, retries: int, timed_out: bool = False, writes: int = 1):
+        with self._lock:
+            self.writes += 0 if timed_out else writes
+            self.timeouts += 1 if timed_out else 0
+            if writes > 1:
+                self.group_commits += 1
+                self.grouped_writes += writes
+            self.retries += retries
+            self.total_lock_wait += lock_wait
+            self.max_lock_wait = max(self.max_lock_wait, lock_wait)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                'writes': self.writes,
+                'retries': self.retries,
+                'timeouts': self.timeouts,
+                'total_lock_wait_seconds': self.total_lock_wait,
+                'max_lock_wait_seconds': self.max_lock_wait,
+                'mean_lock_wait_seconds': self.total_lock_wait / self.writes if self.writes else 0.0,
+                'group_commits': self.group_commits, # Transactions that committed more than one write
+                'grouped_writes': self.grouped_writes,
+            }
+
+_write_metrics = _WriteMetrics()
+
+def write_metrics() -> dict:
+    """Lock-wait statistics of run_write in this process (since start or reset_write_metrics)."""
+    return _write_metrics.snapshot()
+
+def reset_write_metrics():
+    _write_metrics.reset()
+
+def _retry_busy(action, deadline: float):
+    """
+    Calls action() until it doesn't fail with a busy error, retrying with jittered exponential
+    backoff until the deadline (then WriteTimeoutError). Returns (result, seconds waited, retries).
+    """
+    started = time.monotonic()
+    delay = WRITE_RETRY_BASE_DELAY
+    retries = 0
+    while True:
+        try:
+            result = action()
+            return result, time.monotonic() - started, retries
+        except sqlite3.OperationalError as e:
+            if not _is_busy_error(e):
+                raise
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                waited = time.monotonic() - started
+                _write_metrics.record(waited, retries, timed_out=True)
+                raise WriteTimeoutError(f"database is locked (gave up after {waited:.2f}s)") from e
+            retries += 1
+            # Full jitter keeps writers that collided from retrying in lockstep.
+            time.sleep(min(remaining, random.uniform(0, delay)))
+            delay = min(delay * 2, WRITE_RETRY_MAX_DELAY)
+
+def _begin_immediate(conn, deadline: float):
+    """
+    Takes the write lock up front (BEGIN IMMEDIATE), so a transaction never fails half-way
+    when it later tries to upgrade a read lock. Retries busy errors until the deadline.
+    Returns (seconds waited, retries).
+    """
+    _, waited, retries = _retry_busy(lambda: conn.execute("BEGIN IMMEDIATE"), deadline)
+    return waited, retries
+
+def _run_write_here(fn, deadline: float):
+    conn = get_db_connection()
+    if conn.in_transaction:
+        # Called from inside another write on this thread (or a rolled_back_transaction):
+        # join its transaction, in a savepoint so an error undoes only this write. The
+        # transaction belongs to the caller, so the connection isn't closed here.
+        conn.execute("SAVEPOINT nested_write")
+        try:
+            result = fn(conn)
+        except BaseException:
+            conn.execute("ROLLBACK TO nested_write")
+            conn.execute("RELEASE nested_write")
+            raise
+        conn.execute("RELEASE nested_write")
+        return result
+    try:
+        lock_wait, retries = _begin_immediate(conn, deadline)
+        conn._in_write = True
+        try:
+            result = fn(conn)
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            conn._in_write = False
+        _write_metrics.record(lock_wait, retries)
+        return result
+    finally:
+        conn.close()
+
+class _WriteJob:
+    def __init__(self, fn, deadline: float, coalesce: bool):
+        self.fn = fn
+        self.deadline = deadline
+        self.coalesce = coalesce
+        # The job runs in a copy of the caller's context, so it writes to the caller's household.
+        self.context = contextvars.copy_context()
+        self.database_path = _current_database_path()
+        self.future = Future()
+
+class _WriterThread:
+    """
+    One background thread that performs writes of the process in submission order.
+    Coalescable writes that arrive within GROUP_COMMIT_WINDOW of each other are committed
+    together (group commit).
+    """
+
+    def __init__(self):
+        self.jobs = queue.Queue()
+        self.thread = threading.Thread(target=self._run, name='chores-db-writer', daemon=True)
+        self.thread.start()
+
+    def submit(self, fn, deadline: float, coalesce: bool = False) -> Future:
+        job = _WriteJob(fn, deadline, coalesce)
+        self.jobs.put(job)
+        return job.future
+
+    def _run(self):
+        carried_over = None
+        while True:
+            job = carried_over or self.jobs.get()
+            carried_over = None
+            if not (job.coalesce and GROUP_COMMIT_WINDOW > 0):
+                self._run_single(job)
+                continue
+
+            batch = [job]
+            window_ends = time.monotonic() + GROUP_COMMIT_WINDOW
+            while len(batch) < GROUP_COMMIT_MAX_BATCH:
+                remaining = window_ends - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    next_job = self.jobs.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if not next_job.coalesce:
+                    carried_over = next_job # Runs on its own, right after this batch
+                    break
+                batch.append(next_job)
+
+            # One transaction per database: households don't share files.
+            by_database = {}
+            for batch_job in batch:
+                by_database.setdefault(batch_job.database_path, []).append(batch_job)
+            for group in by_database.values():
+                group[0].context.run(self._run_group, group)
+
+    def _run_single(self, job):
+        if not job.future.set_running_or_notify_cancel():
+            return
+        try:
+            job.future.set_result(job.context.run(_run_write_here, job.fn, job.deadline))
+        except BaseException as e:
+            job.future.set_exception(e)
+
+    def _run_group(self, group):
+        group = [job for job in group if job.future.set_running_or_notify_cancel()]
+        if len(group) == 1:
+            try:
+                group[0].future.set_result(_run_write_here(group[0].fn, group[0].deadline))
+            except BaseException as e:
+                group[0].future.set_exception(e)
+            return
+
         conn = get_db_connection()
-        should_close_conn = True
+        try:
+            lock_wait, retries = _begin_immediate(conn, min(job.deadline for job in group))
+        except sqlite3.Error as e:
+            conn.close()
+            for job in group:
+                job.future.set_exception(e)
+            return
 
-    cursor = conn.cursor()
+        # Each write runs in its own savepoint, so one caller's error undoes only its changes.
+        outcomes = []
+        conn._in_write = True
+        try:
+            for job in group:
+                conn.execute("SAVEPOINT group_write")
+                try:
+                    outcomes.append((job, job.fn(conn), None))
+                except Exception as e:
+                    conn.execute("ROLLBACK TO group_write")
+                    outcomes.append((job, None, e))
+                conn.execute("RELEASE group_write")
+            conn.commit()
+        except BaseException as e:
+            conn.rollback()
+            for job in group:
+                job.future.set_exception(e)
+            return
+        finally:
+            conn._in_write = False
+            conn.close()
+
+        _write_metrics.record(lock_wait, retries, writes=len(group))
+        for job, result, error in outcomes:
+            if error is not None:
+                job.future.set_exception(error)
+            else:
+                job.future.set_result(result)
+
+_writer = None
+_writer_lock = threading.Lock()
+
+def _get_writer() -> _WriterThread:
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = _WriterThread()
+        return _writer
+
+def run_write(fn, deadline_seconds: float = None, coalesce: bool = False):
+    """
+    Runs fn(conn) as one write transaction and returns its result. The transaction starts with
+    BEGIN IMMEDIATE; "database is locked" is retried with backoff for up to deadline_seconds
+    (default WRITE_DEADLINE_SECONDS), then WriteTimeoutError is raised. fn must not commit;
+    any exception from it rolls the transaction back and is re-raised to the caller.
+    With SERIALIZE_WRITES, the write runs on the process's single writer thread. coalesce=True
+    marks a small, independent write that may share its transaction with others when group
+    commit is enabled (GROUP_COMMIT_WINDOW); it still gets its own result or exception.
+    """
+    deadline = time.monotonic() + (WRITE_DEADLINE_SECONDS if deadline_seconds is None else deadline_seconds)
+    grouped = coalesce and GROUP_COMMIT_WINDOW > 0
+    if not (SERIALIZE_WRITES or grouped):
+        return _run_write_here(fn, deadline)
+    writer = _get_writer()
+    if threading.current_thread() is writer.thread:
+        return _run_write_here(fn, deadline) # A write nested in a queued write
+    return writer.submit(fn, deadline, coalesce=grouped).result()
+
+def run_outside_transaction(fn, deadline_seconds: float = None):
+    """
+    Runs fn(conn) with no transaction open, for statements SQLite refuses inside one (VACUUM).
+    "database is locked" is retried with run_write's backoff for up to deadline_seconds
+    (default WRITE_DEADLINE_SECONDS), then WriteTimeoutError is raised; fn is called again on
+    each retry, so it must be a single statement or otherwise safe to repeat.
+    """
+    deadline = time.monotonic() + (WRITE_DEADLINE_SECONDS if deadline_seconds is None else deadline_seconds)
+    conn = get_db_connection()
+    try:
+        if conn.in_transaction:
+            raise RuntimeError("run_outside_transaction() called inside a transaction")
+        result, lock_wait, retries = _retry_busy(lambda: fn(conn), deadline)
+        _write_metrics.record(lock_wait, retries)
+        return result
+    finally:
+        conn.close()
+
+
+# --- Schema and migrations ---
 
+def _create_base_schema(cursor):
     # Create tasks table
     cursor.execute("""
     CREATE TABLE IF NOT EXISTS tasks (
@@ -49,11 +659,329 @@ def init_db(conn = None):
     """)
     # ON DELETE CASCADE ensures sub_tasks are deleted if their parent task is deleted.
 
-    conn.commit()
+def _add_row_versions(cursor):
+    # Every write bumps a row's version; updates made with an expected version only apply if
+    # it still matches (optimistic concurrency, see chores.tasks.Conflict).
+    cursor.execute("ALTER TABLE tasks ADD COLUMN version INTEGER NOT NULL DEFAULT 1")
+    cursor.execute("ALTER TABLE sub_tasks ADD COLUMN version INTEGER NOT NULL DEFAULT 1")
+
+def _add_archive(cursor):
+    # When a task was completed, maintained by triggers so every writer (bulk updates, the
+    # API, imports) keeps it right. Chores completed before a cutoff move to the archive tables.
+    cursor.execute("ALTER TABLE tasks ADD COLUMN completed_at TEXT") # UTC, YYYY-MM-DDTHH:MM:SSZ
+    # Chores already completed have no known completion time; their archive age starts now.
+    cursor.execute("UPDATE tasks SET completed_at = strftime('%Y-%m-%dT%H:%M:%SZ', 'now') WHERE status = 'completed'")
+    cursor.execute("""
+    CREATE TRIGGER IF NOT EXISTS tasks_completed_at_on_insert AFTER INSERT ON tasks
+    WHEN NEW.status = 'completed' AND NEW.completed_at IS NULL
+    BEGIN
+        UPDATE tasks SET completed_at = strftime('%Y-%m-%dT%H:%M:%SZ', 'now') WHERE id = NEW.id;
+    END;
+    """)
+    cursor.execute("""
+    CREATE TRIGGER IF NOT EXISTS tasks_completed_at_on_update AFTER UPDATE OF status ON tasks
+    WHEN NEW.status IS NOT OLD.status
+    BEGIN
+        UPDATE tasks SET completed_at = CASE WHEN NEW.status = 'completed'
+            THEN strftime('%Y-%m-%dT%H:%M:%SZ', 'now') ELSE NULL END
+        WHERE id = NEW.id;
+    END;
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_tasks_completed_at ON tasks (completed_at) WHERE completed_at IS NOT NULL")
+
+    # Cold store: same columns plus when the chore was archived. Ids are kept (AUTOINCREMENT
+    # never reuses them), so a restored chore gets its old id back.
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS archived_tasks (
+        id INTEGER PRIMARY KEY,
+        description TEXT NOT NULL,
+        status TEXT NOT NULL,
+        notes TEXT,
+        due_date TEXT,
+        materials_needed TEXT,
+        version INTEGER NOT NULL DEFAULT 1,
+        completed_at TEXT,
+        archived_at TEXT NOT NULL
+    );
+    """)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS archived_sub_tasks (
+        id INTEGER PRIMARY KEY,
+        task_id INTEGER NOT NULL,
+        description TEXT NOT NULL,
+        completed INTEGER NOT NULL DEFAULT 0,
+        order_index INTEGER NOT NULL DEFAULT 0,
+        version INTEGER NOT NULL DEFAULT 1
+    );
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_archived_sub_tasks_task_id ON archived_sub_tasks (task_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_archived_tasks_archived_at ON archived_tasks (archived_at)")
+
+def _index_sub_tasks_by_task(cursor):
+    # Every sub-task lookup is by task_id, and so is the cascade when a task is deleted.
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_sub_tasks_task_id ON sub_tasks (task_id, order_index)")
+
+def _add_chore_templates(cursor):
+    # Reusable chores: the task fields a new chore starts from, plus its sub-task descriptions.
+    # Saving and instantiating copy rows with INSERT ... SELECT (see chores.chore_templates).
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS chore_templates (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL UNIQUE COLLATE NOCASE,
+        description TEXT NOT NULL,
+        notes TEXT,
+        materials_needed TEXT,
+        created_at TEXT NOT NULL -- UTC, YYYY-MM-DDTHH:MM:SSZ
+    );
+    """)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS chore_template_sub_tasks (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        template_id INTEGER NOT NULL,
+        description TEXT NOT NULL,
+        order_index INTEGER NOT NULL DEFAULT 0,
+        FOREIGN KEY (template_id) REFERENCES chore_templates (id) ON DELETE CASCADE
+    );
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_chore_template_sub_tasks_template_id "
+                   "ON chore_template_sub_tasks (template_id, order_index)")
+
+def _add_change_log(cursor):
+    # Append-only log of every insert/update/delete of a chore or sub-task, written by triggers in
+    # the same transaction as the change, so no writer can skip it. seq only ever grows
+    # (AUTOINCREMENT); sync clients fetch what changed after the last seq they saw (see
+    # chores.change_feed). Updates are logged when the row version moves, i.e. for every write
+    # through the app but not for the completed_at bookkeeping above.
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS changes (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        entity TEXT NOT NULL, -- 'task' or 'sub_task'
+        entity_id INTEGER NOT NULL,
+        task_id INTEGER NOT NULL, -- The chore it belongs to (entity_id itself for a task)
+        op TEXT NOT NULL, -- 'insert', 'update' or 'delete'
+        changed_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%SZ', 'now'))
+    );
+    """)
+    # How far each known sync client has read; the log is compacted up to the lowest of these.
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS change_consumers (
+        name TEXT PRIMARY KEY,
+        acked_seq INTEGER NOT NULL DEFAULT 0,
+        acked_at TEXT
+    );
+    """)
+    for table, entity, task_id in (('tasks', 'task', 'id'), ('sub_tasks', 'sub_task', 'task_id')):
+        cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {table}_log_insert AFTER INSERT ON {table}
+        BEGIN
+            INSERT INTO changes (entity, entity_id, task_id, op) VALUES ('{entity}', NEW.id, NEW.{task_id}, 'insert');
+        END;
+        """)
+        cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {table}_log_update AFTER UPDATE ON {table}
+        WHEN NEW.version IS NOT OLD.version
+        BEGIN
+            INSERT INTO changes (entity, entity_id, task_id, op) VALUES ('{entity}', NEW.id, NEW.{task_id}, 'update');
+        END;
+        """)
+        cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {table}_log_delete AFTER DELETE ON {table}
+        BEGIN
+            INSERT INTO changes (entity, entity_id, task_id, op) VALUES ('{entity}', OLD.id, OLD.{task_id}, 'delete');
+        END;
+        """)
+
+def _add_task_events(cursor):
+    # Append-only history of chore creation, status changes and sub-task completion, for
+    # analytics (lead time, throughput, overdue rates; see chores.analytics). Written by triggers,
+    # so every writer records it; rows outlive the chore (deleting or archiving keeps them).
+    # Chores that existed before this migration have no creation event and no lead time.
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS task_events (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        task_id INTEGER NOT NULL,
+        sub_task_id INTEGER, -- Set for 'sub_task' events
+        kind TEXT NOT NULL, -- 'created', 'status' or 'sub_task'
+        old_value TEXT, -- Previous status, or completed flag ('0'/'1') for sub-tasks
+        new_value TEXT,
+        due_date TEXT, -- The chore's due date at the time (YYYY-MM-DD)
+        ts TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%SZ', 'now')) -- UTC
+    );
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_task_events_task_ts ON task_events (task_id, ts)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_task_events_ts ON task_events (ts)")
+    # A restored chore is inserted again; it was created only once.
+    cursor.execute("""
+    CREATE TRIGGER IF NOT EXISTS tasks_event_on_insert AFTER INSERT ON tasks
+    WHEN NOT EXISTS (SELECT 1 FROM task_events WHERE task_id = NEW.id AND kind = 'created')
+    BEGIN
+        INSERT INTO task_events (task_id, kind, new_value, due_date) VALUES (NEW.id, 'created', NEW.status, NEW.due_date);
+    END;
+    """)
+    cursor.execute("""
+    CREATE TRIGGER IF NOT EXISTS tasks_event_on_status AFTER UPDATE OF status ON tasks
+    WHEN NEW.status IS NOT OLD.status
+    BEGIN
+        INSERT INTO task_events (task_id, kind, old_value, new_value, due_date)
+        VALUES (NEW.id, 'status', OLD.status, NEW.status, NEW.due_date);
+    END;
+    """)
+    cursor.execute("""
+    CREATE TRIGGER IF NOT EXISTS sub_tasks_event_on_completed AFTER UPDATE OF completed ON sub_tasks
+    WHEN NEW.completed IS NOT OLD.completed
+    BEGIN
+        INSERT INTO task_events (task_id, sub_task_id, kind, old_value, new_value)
+        VALUES (NEW.task_id, NEW.id, 'sub_task', OLD.completed, NEW.completed);
+    END;
+    """)
+
+def _add_pending_suggestions(cursor):
+    # AI suggestions fetched ahead of time for a new chore (see chores.prefetch), waiting until
+    # someone asks for them. Sub-tasks and materials are newline-separated, like materials_needed.
+    # They go with the chore when it is deleted.
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS pending_suggestions (
+        task_id INTEGER PRIMARY KEY,
+        sub_tasks TEXT NOT NULL,
+        materials TEXT NOT NULL,
+        fetched_at TEXT NOT NULL, -- UTC, YYYY-MM-DDTHH:MM:SSZ
+        FOREIGN KEY (task_id) REFERENCES tasks (id) ON DELETE CASCADE
+    );
+    """)
+
+def _add_suggestion_memory(cursor):
+    # AI suggestions that were accepted for a chore, so near-duplicate chores can reuse them
+    # without a model call (see chores.similarity). Newline-separated, like materials_needed.
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS suggestion_memory (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        description TEXT NOT NULL,
+        sub_tasks TEXT NOT NULL,
+        materials TEXT NOT NULL,
+        created_at TEXT NOT NULL -- UTC, YYYY-MM-DDTHH:MM:SSZ
+    );
+    """)
+
+# MIGRATIONS[n] upgrades a database from schema version n to n + 1. The version is kept in
+# PRAGMA user_version. Only ever append: existing files have already run the earlier steps.
+# (Files created before versioning have the base tables at version 0; step 0 is idempotent.)
+MIGRATIONS = [
+    _create_base_schema,
+    _add_row_versions,
+    _add_archive,
+    _index_sub_tasks_by_task,
+    _add_chore_templates,
+    _add_change_log,
+    _add_task_events,
+    _add_pending_suggestions,
+    _add_suggestion_memory,
+]
+SCHEMA_VERSION = len(MIGRATIONS)
+
+def schema_version(conn) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def migrate(conn = None):
+    """
+    Applies pending migrations in one transaction. Returns (old_version, new_version).
+    BEGIN IMMEDIATE makes concurrent migrators of the same file take turns; each re-reads
+    the version once it holds the lock.
+    """
+    should_close_conn = False
+    if conn is None:
+        conn = get_db_connection()
+        should_close_conn = True
+
+    try:
+        current_version = schema_version(conn)
+        if current_version >= SCHEMA_VERSION:
+            return current_version, current_version
+        cursor = conn.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        old_version = schema_version(conn)
+        if old_version >= SCHEMA_VERSION: # Another migrator got there first
+            conn.commit()
+            return old_version, old_version
+        for version in range(old_version, SCHEMA_VERSION):
+            MIGRATIONS[version](cursor)
+        cursor.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        conn.commit()
+        return old_version, SCHEMA_VERSION
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+    finally:
+        if should_close_conn:
+            conn.close()
+
+def _apply_journal_mode(conn):
+    if JOURNAL_MODE:
+        # Persistent for file databases; only needs to be set once per file.
+        conn.execute(f"PRAGMA journal_mode={JOURNAL_MODE}")
+
+def _enable_incremental_vacuum(conn):
+    # Only possible before the first table is created; existing files are converted by a full
+    # VACUUM only when asked (maintenance --convert-vacuum). Lets maintenance return free pages
+    # to the OS in small steps.
+    if conn.execute("PRAGMA page_count").fetchone()[0] == 0:
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+
+def init_db(conn = None):
+    """
+    Initializes the database by creating tables if they don't already exist and applying
+    any pending migrations. If a connection is passed, it uses it; otherwise, it creates a new one.
+    """
+    should_close_conn = False
+    if conn is None:
+        conn = get_db_connection()
+        should_close_conn = True
+
+    _enable_incremental_vacuum(conn)
+    _apply_journal_mode(conn)
+    migrate(conn)
 
     if should_close_conn:
         conn.close()
 
+
+# --- Shard administration ---
+
+def create_shard(tenant_id: str) -> str:
+    """Creates and initializes a new household database. Returns its path."""
+    path = shard_path(tenant_id)
+    os.makedirs(SHARD_DIRECTORY, exist_ok=True)
+    # Exclusive create, so two admins can't both "create" the same household.
+    with open(path, 'x'):
+        pass
+    conn = _open_connection(path)
+    try:
+        init_db(conn=conn)
+    finally:
+        conn.close_for_real()
+    return path
+
+def migrate_shard(tenant_id: str):
+    """Brings one household database up to SCHEMA_VERSION. Returns (old_version, new_version)."""
+    if not shard_exists(tenant_id):
+        raise UnknownTenantError(tenant_id)
+    conn = _open_connection(shard_path(tenant_id))
+    try:
+        _apply_journal_mode(conn)
+        return migrate(conn)
+    finally:
+        conn.close_for_real()
+
+def list_shards():
+    """Ids of all households that have a shard, sorted."""
+    if not SHARD_DIRECTORY or not os.path.isdir(SHARD_DIRECTORY):
+        return []
+    tenant_ids = []
+    for filename in os.listdir(SHARD_DIRECTORY):
+        tenant_id, extension = os.path.splitext(filename)
+        if extension == '.db' and _TENANT_ID_RE.match(tenant_id):
+            tenant_ids.append(tenant_id)
+    return sorted(tenant_ids)
+
 def clear_db_for_testing(conn = None):
     """
     Clears all data from tasks and sub_tasks tables. Used for testing.
@@ -64,10 +992,29 @@ def clear_db_for_testing(conn = None):
         conn = get_db_connection()
         should_close_conn = True
 
+    if isinstance(conn, _TestTransactionConnection):
+        # Inside rolled_back_transaction(): the schema is current, and DDL plus migrate()'s own
+        # transaction don't fit in a savepoint. Emptying the tables (and AUTOINCREMENT counters) is enough.
+        for table in ('sub_tasks', 'tasks', 'archived_sub_tasks', 'archived_tasks',
+                      'chore_template_sub_tasks', 'chore_templates', 'changes', 'change_consumers',
+                      'task_events', 'pending_suggestions', 'suggestion_memory', 'sqlite_sequence'):
+            conn.execute(f"DELETE FROM {table}")
+        return
+
     cursor = conn.cursor()
     # Drop tables to ensure schema is recreated by init_db if it changed
     cursor.execute("DROP TABLE IF EXISTS sub_tasks;")
-    cursor.execute("DROP TABLE IF EXISTS tasks;")
+    cursor.execute("DROP TABLE IF EXISTS tasks;") # Also drops its triggers and indexes
+    cursor.execute("DROP TABLE IF EXISTS archived_sub_tasks;")
+    cursor.execute("DROP TABLE IF EXISTS archived_tasks;")
+    cursor.execute("DROP TABLE IF EXISTS chore_template_sub_tasks;")
+    cursor.execute("DROP TABLE IF EXISTS chore_templates;")
+    cursor.execute("DROP TABLE IF EXISTS changes;")
+    cursor.execute("DROP TABLE IF EXISTS change_consumers;")
+    cursor.execute("DROP TABLE IF EXISTS task_events;")
+    cursor.execute("DROP TABLE IF EXISTS pending_suggestions;")
+    cursor.execute("DROP TABLE IF EXISTS suggestion_memory;")
+    cursor.execute("PRAGMA user_version = 0;") # So init_db runs every migration again
     conn.commit() # Commit drops before recreating
 
     # Re-initialize the schema
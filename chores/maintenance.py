@@ -0,0 +1,94 @@
+# Database housekeeping: orphan sweeps, planner statistics and returning free space to the OS.
+
+from typing import Any, Dict
+
+from . import change_feed, database
+
+ORPHAN_BATCH_SIZE = 500 # Rows deleted per transaction, so the write lock is held only briefly
+INCREMENTAL_VACUUM = 2 # PRAGMA auto_vacuum value
+VACUUM_BATCH_PAGES = 1000 # Free pages returned to the OS per transaction
+
+# (child table, parent table): rows whose task_id no longer matches a parent are orphans.
+# archived_sub_tasks has no foreign key, so it is swept the same way.
+_ORPHAN_CHECKS = (
+    ('sub_tasks', 'tasks'),
+    ('archived_sub_tasks', 'archived_tasks'),
+)
+
+def _file_usage(conn) -> Dict[str, int]:
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+    freelist_count = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    return {'bytes': page_size * page_count, 'free_bytes': page_size * freelist_count}
+
+def sweep_orphans(batch_size: int = ORPHAN_BATCH_SIZE) -> int:
+    """
+    Deletes sub-tasks (active and archived) whose parent chore no longer exists, in batches.
+    These accumulate in files written while foreign keys weren't enforced. Returns the number deleted.
+    """
+    deleted = 0
+    for child, parent in _ORPHAN_CHECKS:
+        statement = (
+            f"DELETE FROM {child} WHERE id IN ("
+            f"SELECT id FROM {child} WHERE NOT EXISTS (SELECT 1 FROM {parent} WHERE {parent}.id = {child}.task_id) "
+            "LIMIT ?)"
+        )
+        while True:
+            count = database.run_write(lambda conn: conn.execute(statement, (batch_size,)).rowcount)
+            deleted += count
+            if count < batch_size:
+                break
+    return deleted
+
+def _release_free_pages(conn, limit: int) -> int:
+    # Through the sqlite3 module each execution of the pragma releases a single page.
+    released = 0
+    while released < limit and conn.execute("PRAGMA freelist_count").fetchone()[0]:
+        conn.execute("PRAGMA incremental_vacuum")
+        released += 1
+    return released
+
+def run_maintenance(batch_size: int = ORPHAN_BATCH_SIZE, convert_to_incremental_vacuum: bool = False) -> Dict[str, Any]:
+    """
+    Sweeps orphans, compacts the change log up to what every sync consumer has acknowledged,
+    refreshes the query planner's statistics (ANALYZE) and releases free pages with an
+    incremental VACUUM. Every step retries while another process holds the write lock.
+    A file created before incremental vacuum was enabled keeps its free pages unless
+    convert_to_incremental_vacuum is set: that rewrites the whole file once with a full VACUUM.
+    Returns a report including the bytes reclaimed.
+    """
+    orphans = sweep_orphans(batch_size)
+    compacted = change_feed.compact_changes()
+    database.run_write(lambda conn: conn.execute("ANALYZE"))
+    conn = database.get_db_connection()
+    try:
+        before = _file_usage(conn) # After ANALYZE, whose statistics table can itself add a page
+        incremental = conn.execute("PRAGMA auto_vacuum").fetchone()[0] == INCREMENTAL_VACUUM
+    finally:
+        conn.close()
+
+    converted = False
+    if incremental:
+        while database.run_write(lambda conn: _release_free_pages(conn, VACUUM_BATCH_PAGES)) == VACUUM_BATCH_PAGES:
+            pass
+    elif convert_to_incremental_vacuum:
+        database.run_outside_transaction(lambda conn: conn.executescript(
+            "PRAGMA auto_vacuum = INCREMENTAL; VACUUM;")) # Rewrites the whole file
+        incremental = converted = True
+
+    conn = database.get_db_connection()
+    try:
+        after = _file_usage(conn)
+    finally:
+        conn.close()
+
+    return {
+        'orphaned_sub_tasks_deleted': orphans,
+        'change_log_entries_compacted': compacted,
+        'bytes_before': before['bytes'],
+        'bytes_after': after['bytes'],
+        'reclaimed_bytes': before['bytes'] - after['bytes'],
+        'free_bytes_after': after['free_bytes'], # Kept in the file for reuse when incremental vacuum is off
+        'incremental_vacuum': incremental, # False: free pages are never returned to the OS
+        'converted_to_incremental_vacuum': converted,
+    }
@@ -0,0 +1,192 @@
+# Speculative AI suggestions: when a chore is created, a background worker asks the provider for
+# sub-tasks and materials and stores them in pending_suggestions without applying them. The
+# chore's "Suggest with AI" button then uses them at once instead of waiting on a cold call.
+# Off unless enabled (AI_PREFETCH in the web app). SQLite backend only.
+
+import collections
+import contextvars
+import queue
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+from . import ai_assistant, database, similarity, tasks
+
+WORKERS = 2 # Concurrent provider calls per process
+HOURLY_BUDGET = 30 # Provider calls per rolling hour per process; chores beyond it aren't prefetched
+QUEUE_SIZE = 100 # Chores waiting for a worker; past this new chores are skipped
+
+# (chore description, existing sub-task descriptions) -> {'sub_tasks': [...], 'materials': [...]}
+Provider = Callable[[str, List[str]], Dict[str, List[str]]]
+
+
+def store_pending(task_id: int, suggestions: Dict[str, List[str]]) -> bool:
+    """Stores suggestions for a chore, replacing earlier ones. Returns False if the chore no longer exists."""
+    return database.run_write(lambda conn: conn.execute(
+        "INSERT OR REPLACE INTO pending_suggestions (task_id, sub_tasks, materials, fetched_at) "
+        "SELECT id, ?, ?, strftime('%Y-%m-%dT%H:%M:%SZ', 'now') FROM tasks WHERE id = ?",
+        ("\n".join(suggestions.get('sub_tasks', [])), "\n".join(suggestions.get('materials', [])), task_id)
+    ).rowcount) > 0
+
+def get_pending(task_id: int) -> Optional[Dict[str, List[str]]]:
+    """A chore's waiting suggestions as {'sub_tasks', 'materials', 'fetched_at'}, or None."""
+    conn = database.get_db_connection()
+    row = conn.execute("SELECT sub_tasks, materials, fetched_at FROM pending_suggestions WHERE task_id = ?",
+                       (task_id,)).fetchone()
+    conn.close()
+    if not row:
+        return None
+    return {'sub_tasks': [line for line in row['sub_tasks'].split('\n') if line],
+            'materials': [line for line in row['materials'].split('\n') if line],
+            'fetched_at': row['fetched_at']}
+
+def discard_pending(task_id: int) -> bool:
+    """Deletes a chore's waiting suggestions. Returns False if there were none."""
+    return database.run_write(lambda conn: conn.execute(
+        "DELETE FROM pending_suggestions WHERE task_id = ?", (task_id,)).rowcount) > 0
+
+def take_pending(task_id: int) -> Optional[Dict[str, List[str]]]:
+    """Returns a chore's waiting suggestions and deletes them, so each set is applied once; None if there are none."""
+    pending = get_pending(task_id)
+    if pending is None or not discard_pending(task_id): # Someone else took them in between
+        return None
+    return pending
+
+
+class _BudgetSpent(Exception):
+    """Raised in place of a provider call once the hour's budget is spent."""
+
+
+class SuggestionPrefetcher:
+    """
+    Fetches suggestions for new chores on up to `workers` daemon threads, started on first use.
+    schedule() never blocks: when the queue is full or the hour's budget is spent, the chore is
+    skipped. A chore deleted before its turn costs no provider call, and the result for one
+    deleted during the call is discarded. Jobs run in the scheduling context (household).
+    """
+
+    def __init__(self, provider: Optional[Provider] = None, workers: int = WORKERS,
+                 hourly_budget: int = HOURLY_BUDGET, queue_size: int = QUEUE_SIZE, clock=time.monotonic):
+        self.provider = provider # None: similarity.suggest, falling back to ai_assistant
+        self.workers = max(1, workers)
+        self.hourly_budget = hourly_budget
+        self._clock = clock
+        self._jobs = queue.Queue(maxsize=queue_size)
+        self._calls = collections.deque() # When recent provider calls started (clock seconds)
+        self._lock = threading.Lock()
+        self._threads: List[threading.Thread] = []
+        self._stopped = False
+        self._unfinished = 0 # Jobs queued or running
+        self._idle = threading.Condition(self._lock)
+        self.counts = collections.Counter() # 'stored', 'cancelled', 'failed', 'skipped'
+
+    def _budget_left(self, now: float) -> int:
+        while self._calls and self._calls[0] <= now - 3600:
+            self._calls.popleft()
+        return self.hourly_budget - len(self._calls)
+
+    def schedule(self, task_id: int, description: str) -> bool:
+        """Queues a chore for prefetching. Returns False if it was skipped."""
+        with self._lock:
+            if self._stopped or self._budget_left(self._clock()) <= 0:
+                self.counts['skipped'] += 1
+                return False
+            try:
+                self._jobs.put_nowait((contextvars.copy_context(), task_id, description))
+            except queue.Full:
+                self.counts['skipped'] += 1
+                return False
+            self._unfinished += 1
+            if len(self._threads) < self.workers:
+                thread = threading.Thread(target=self._work, name=f'chores-prefetch-{len(self._threads)}', daemon=True)
+                self._threads.append(thread)
+                thread.start()
+        return True
+
+    def _work(self):
+        while True:
+            job = self._jobs.get()
+            if job is None: # stop()
+                return
+            context, task_id, description = job
+            try:
+                outcome = context.run(self._fetch, task_id, description)
+            except Exception as e:
+                print(f"[Prefetch] Fetching suggestions for task ID {task_id} failed: {e}")
+                outcome = 'failed'
+            with self._lock:
+                self.counts[outcome] += 1
+                self._unfinished -= 1
+                self._idle.notify_all()
+
+    def _call_provider(self, provider: Provider, description: str, existing: List[str]) -> Dict[str, List[str]]:
+        with self._lock: # The budget is spent when the call is made, not when the chore is queued
+            now = self._clock()
+            if self._budget_left(now) <= 0:
+                raise _BudgetSpent()
+            self._calls.append(now)
+        return provider(description, existing)
+
+    def _fetch(self, task_id: int, description: str) -> str:
+        if self._stopped or tasks.get_task_by_id(task_id) is None:
+            return 'cancelled'
+        try:
+            if self.provider is not None:
+                suggestions = self._call_provider(self.provider, description, [])
+            else: # Near-duplicates of earlier chores are answered by similarity and cost no call
+                def fetch(description, existing_subtask_descriptions):
+                    return self._call_provider(ai_assistant.get_subtask_and_material_suggestions,
+                                               description, existing_subtask_descriptions)
+                suggestions = similarity.suggest(description, [], fetch=fetch)
+        except _BudgetSpent:
+            return 'skipped'
+        if ai_assistant.suggestion_error(suggestions):
+            return 'failed'
+        return 'stored' if store_pending(task_id, suggestions) else 'cancelled'
+
+    def wait_idle(self, timeout: Optional[float] = None) -> bool:
+        """Blocks until no job is queued or running. Returns False if timeout expired first."""
+        with self._idle:
+            return self._idle.wait_for(lambda: self._unfinished == 0, timeout=timeout)
+
+    def stop(self):
+        """Drops queued jobs and lets the threads exit; calls already in progress finish."""
+        with self._lock:
+            self._stopped = True
+            while True:
+                try:
+                    self._jobs.get_nowait()
+                except queue.Empty:
+                    break
+                self._unfinished -= 1
+            self._idle.notify_all()
+            threads = list(self._threads)
+        for _ in threads: # Outside the lock: a worker finishing a job needs it
+            self._jobs.put(None)
+
+
+# The process-wide prefetcher, or None while prefetching is off.
+_prefetcher: Optional[SuggestionPrefetcher] = None
+
+def enable(provider: Optional[Provider] = None, workers: int = WORKERS,
+           hourly_budget: int = HOURLY_BUDGET) -> SuggestionPrefetcher:
+    """Turns prefetching on for this process (replacing an earlier prefetcher) and returns it."""
+    global _prefetcher
+    disable()
+    _prefetcher = SuggestionPrefetcher(provider, workers=workers, hourly_budget=hourly_budget)
+    return _prefetcher
+
+def disable():
+    """Turns prefetching off; queued chores are dropped."""
+    global _prefetcher
+    if _prefetcher is not None:
+        _prefetcher.stop()
+        _prefetcher = None
+
+def enabled() -> bool:
+    return _prefetcher is not None
+
+def schedule(task) -> bool:
+    """Queues a newly created chore for prefetching, if prefetching is on. Returns whether it was queued."""
+    prefetcher = _prefetcher
+    return prefetcher.schedule(task.id, task.description) if prefetcher is not None else False
@@ -0,0 +1,185 @@
+# Reuse of AI suggestions across near-duplicate chores ("Clean the kitchen", "clean kitchen",
+# "Kitchen cleaning"). Accepted suggestions are remembered in suggestion_memory; an in-process
+# index of their chore descriptions (TF-IDF over character trigrams) finds the closest earlier
+# chore, and above REUSE_THRESHOLD its suggestions are used instead of calling the model.
+
+import heapq
+import functools
+import math
+import re
+import threading
+import zlib
+from array import array
+from typing import Callable, Dict, List, Optional, Tuple
+
+from . import ai_assistant, database
+
+@functools.lru_cache(maxsize=None)
+def _load_numpy(): # Optional: vectorized scoring, for large indexes
+    """Imports NumPy on first use (it is slow to import); None if it isn't installed."""
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+REUSE_THRESHOLD = 0.8 # Cosine similarity above which an earlier chore's suggestions are reused
+NGRAM = 3
+
+# Words that say nothing about which chore it is.
+_STOPWORDS = frozenset("a an and the my our your to of for in on at up out do get".split())
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+def _features(text: str) -> Dict[int, float]:
+    """Log-scaled counts of the character trigrams of each word (padded with spaces), keyed by CRC32."""
+    counts: Dict[int, int] = {}
+    for word in _WORD_RE.findall(text.lower()):
+        if word in _STOPWORDS:
+            continue
+        padded = f" {word} "
+        for start in range(len(padded) - NGRAM + 1):
+            key = zlib.crc32(padded[start:start + NGRAM].encode())
+            counts[key] = counts.get(key, 0) + 1
+    return {key: 1 + math.log(count) for key, count in counts.items()}
+
+def _normalized(weights: Dict[int, float]) -> Dict[int, float]:
+    norm = math.sqrt(sum(weight * weight for weight in weights.values()))
+    return {key: weight / norm for key, weight in weights.items()} if norm else {}
+
+
+class SimilarityIndex:
+    """
+    An inverted index from trigram to the entries containing it. Each posting list is a pair of
+    compact arrays (entry positions, weights), and entry ids are kept in a third. Entries are
+    unit-length log-TF vectors, so adding one never touches the others; IDF is applied to the
+    query (SMART lnc.ltc weighting). A query only visits the postings of its own trigrams, summed
+    with one numpy.bincount when NumPy is installed. Not thread-safe; callers hold a lock.
+    """
+
+    def __init__(self):
+        self._postings: Dict[int, Tuple[array, array]] = {}
+        self._ids = array('q') # Position -> entry id
+
+    def __len__(self):
+        return len(self._ids)
+
+    def add(self, entry_id: int, text: str):
+        position = len(self._ids)
+        self._ids.append(entry_id)
+        for key, weight in _normalized(_features(text)).items():
+            postings = self._postings.get(key)
+            if postings is None:
+                postings = self._postings[key] = (array('I'), array('f'))
+            postings[0].append(position)
+            postings[1].append(weight)
+
+    def query(self, text: str, limit: int = 1) -> List[Tuple[int, float]]:
+        """The `limit` entries most similar to text as (entry_id, cosine similarity), best first."""
+        size = len(self._ids)
+        query = {}
+        for key, weight in _features(text).items():
+            postings = self._postings.get(key)
+            document_frequency = len(postings[0]) if postings is not None else 0
+            query[key] = weight * (math.log((size + 1) / (document_frequency + 1)) + 1) # Smoothed IDF
+        # Trigrams no entry has only lower every score.
+        matched = [(self._postings[key], weight) for key, weight in _normalized(query).items() if key in self._postings]
+        if not matched:
+            return []
+
+        numpy = _load_numpy()
+        if numpy is not None:
+            positions = numpy.concatenate([numpy.frombuffer(postings[0], dtype=numpy.uint32) for postings, _ in matched])
+            weights = numpy.concatenate([numpy.frombuffer(postings[1], dtype=numpy.float32) * weight
+                                         for postings, weight in matched])
+            totals = numpy.bincount(positions, weights=weights, minlength=size)
+            # Every entry scoring at least the limit-th best, ties included; the heap below picks among them.
+            cutoff = max(numpy.partition(totals, size - limit)[size - limit] if limit < size else 0.0, 1e-9)
+            scores = {position: float(totals[position]) for position in numpy.flatnonzero(totals >= cutoff).tolist()}
+        else:
+            scores: Dict[int, float] = {}
+            get = scores.get
+            for (positions, weights), query_weight in matched:
+                for position, weight in zip(positions, weights):
+                    scores[position] = get(position, 0.0) + query_weight * weight
+        best = heapq.nlargest(limit, scores.items(), key=lambda item: (item[1], item[0])) # Ties: newer wins
+        return [(self._ids[position], score) for position, score in best]
+
+
+# --- Remembered suggestions ---
+
+DUPLICATE_THRESHOLD = 0.95 # A chore this close with the same suggestions isn't remembered twice
+
+_indexes: Dict[str, Tuple[SimilarityIndex, int]] = {} # Database path -> (index, highest id loaded)
+_indexes_lock = threading.Lock()
+
+def _split_lines(text: str) -> List[str]:
+    return [line for line in text.split('\n') if line]
+
+def forget_indexes():
+    """Drops the in-process indexes; they are rebuilt on next use (e.g. after a database was cleared)."""
+    with _indexes_lock:
+        _indexes.clear()
+
+def _best_match(conn, description: str) -> Optional[Tuple[int, float]]:
+    # Loads rows remembered since the last call (by any process), then queries.
+    path = database._current_database_path()
+    with _indexes_lock:
+        index, last_id = _indexes.get(path) or (SimilarityIndex(), 0)
+        for row in conn.execute("SELECT id, description FROM suggestion_memory WHERE id > ? ORDER BY id", (last_id,)):
+            index.add(row['id'], row['description'])
+            last_id = row['id']
+        _indexes[path] = (index, last_id)
+        matches = index.query(description, limit=1)
+    return matches[0] if matches else None
+
+def find_similar(description: str, threshold: float = REUSE_THRESHOLD) -> Optional[Dict]:
+    """
+    The remembered suggestions of the chore most similar to `description`, if its similarity is
+    at least `threshold`: {'sub_tasks', 'materials', 'similar_to' (that chore's description),
+    'score'}. Otherwise None.
+    """
+    conn = database.get_db_connection()
+    try:
+        match = _best_match(conn, description)
+        if match is None or match[1] < threshold:
+            return None
+        row = conn.execute("SELECT description, sub_tasks, materials FROM suggestion_memory WHERE id = ?",
+                           (match[0],)).fetchone()
+    finally:
+        conn.close()
+    if row is None: # The database was reset under the index
+        return None
+    return {'sub_tasks': _split_lines(row['sub_tasks']), 'materials': _split_lines(row['materials']),
+            'similar_to': row['description'], 'score': round(match[1], 3)}
+
+def remember(description: str, suggestions: Dict[str, List[str]]) -> bool:
+    """
+    Records suggestions that were accepted for a chore, so similar chores can reuse them.
+    Returns False if there was nothing to record or a near-identical chore already has them.
+    """
+    sub_tasks, materials = suggestions.get('sub_tasks') or [], suggestions.get('materials') or []
+    if not (sub_tasks or materials) or not description.strip():
+        return False
+    duplicate = find_similar(description, threshold=DUPLICATE_THRESHOLD)
+    if duplicate and (duplicate['sub_tasks'], duplicate['materials']) == (list(sub_tasks), list(materials)):
+        return False
+    database.run_write(lambda conn: conn.execute(
+        "INSERT INTO suggestion_memory (description, sub_tasks, materials, created_at) "
+        "VALUES (?, ?, ?, strftime('%Y-%m-%dT%H:%M:%SZ', 'now'))",
+        (description.strip(), "\n".join(sub_tasks), "\n".join(materials))))
+    return True
+
+def suggest(description: str, existing_subtask_descriptions: Optional[List[str]] = None,
+            fetch: Optional[Callable[..., Dict[str, List[str]]]] = None) -> Dict[str, List[str]]:
+    """
+    Suggestions for a chore: a similar earlier chore's (with 'similar_to' and 'score' set) when
+    there is one, otherwise fetch(description, existing_subtask_descriptions=...), by default
+    ai_assistant.get_subtask_and_material_suggestions.
+    """
+    similar = find_similar(description)
+    if similar is not None:
+        print(f"[Similarity] Reusing suggestions from '{similar['similar_to']}' (similarity {similar['score']}) "
+              f"for chore: '{description}'.")
+        return similar
+    fetch = fetch or ai_assistant.get_subtask_and_material_suggestions
+    return fetch(description, existing_subtask_descriptions=existing_subtask_descriptions or [])
@@ -0,0 +1,554 @@
+# Storage backends for chores and sub-tasks.
+#
+# chores.tasks talks to a repository rather than to SQL directly. A repository takes and
+# returns rows: anything indexable by column name (sqlite3.Row, or a plain dict for the
+# in-memory engine) with the columns in TASK_FIELDS / SUB_TASK_FIELDS. Turning rows into
+# Task objects, detecting conflicts and reporting errors stays in chores.tasks.
+#
+# Backends:
+#   'sqlite' - the database file (or household shard) managed by chores.database.
+#   'memory' - plain dicts in this process; nothing survives a restart. For tests, demos and
+#              throwaway workloads. Archive, maintenance and shard commands need 'sqlite'.
+
+import abc
+import contextlib
+import os
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from . import database
+
+TASK_FIELDS = ('id', 'description', 'status', 'notes', 'due_date', 'materials_needed', 'version')
+SUB_TASK_FIELDS = ('id', 'task_id', 'description', 'completed', 'order_index', 'version')
+_TASK_COLUMNS = ", ".join(TASK_FIELDS)
+_SUB_TASK_COLUMNS = ", ".join(SUB_TASK_FIELDS)
+_CHUNK_SIZE = 500 # Stays well below SQLite's limit on bound parameters per statement
+
+# Selected with configure(backend=...) or the CHORES_STORAGE_BACKEND environment variable.
+STORAGE_BACKEND = os.environ.get('CHORES_STORAGE_BACKEND', 'sqlite')
+
+# A new chore: (task fields without id/version, [(sub-task description, completed), ...])
+NewTask = Tuple[Dict[str, Any], List[Tuple[str, bool]]]
+
+
+class TaskRepository(abc.ABC):
+    """
+    Storage interface for chores and their sub-tasks.
+    Every method is atomic. Updates bump the row's version; with expected_version they only
+    apply to that version of the row. Methods that change one row return it as it is after
+    the change (or, for deletes, just before), or None if no row matched.
+    """
+
+    name = None
+
+    # Chores
+    @abc.abstractmethod
+    def insert_task(self, fields: Dict[str, Any]) -> int:
+        """Inserts a chore with version 1 and returns its id."""
+
+    @abc.abstractmethod
+    def insert_tasks(self, new_tasks: List[NewTask]) -> List[int]:
+        """Inserts many chores and their sub-tasks, all or nothing. Returns the new ids in order."""
+
+    @abc.abstractmethod
+    def list_tasks(self) -> List[Any]:
+        """Every chore, in id order."""
+
+    @abc.abstractmethod
+    def get_task(self, task_id: int) -> Optional[Any]:
+        """The chore with this id, or None."""
+
+    @abc.abstractmethod
+    def update_task(self, task_id: int, fields: Dict[str, Any], expected_version: Optional[int] = None) -> Optional[Any]:
+        """Applies fields to one chore."""
+
+    def set_task_status(self, task_id: int, status: str, expected_version: Optional[int] = None) -> Optional[Any]:
+        """Like update_task for the status alone; a small write that may share a commit with others."""
+        return self.update_task(task_id, {'status': status}, expected_version)
+
+    @abc.abstractmethod
+    def delete_task(self, task_id: int) -> Optional[Any]:
+        """Deletes a chore and its sub-tasks."""
+
+    @abc.abstractmethod
+    def update_tasks(self, task_ids: List[int], fields: Dict[str, Any]) -> set:
+        """Applies fields to many chores at once. Returns the set of ids that matched a chore."""
+
+    @abc.abstractmethod
+    def delete_tasks(self, task_ids: List[int]) -> set:
+        """Deletes many chores (and their sub-tasks) at once. Returns the set of ids that matched."""
+
+    # Sub-tasks
+    @abc.abstractmethod
+    def sub_tasks_for(self, task_ids: Iterable[int]) -> List[Any]:
+        """Sub-tasks of the given chores, ordered by task_id, then order_index."""
+
+    @abc.abstractmethod
+    def get_sub_task(self, sub_task_id: int) -> Optional[Any]:
+        """The sub-task with this id, or None."""
+
+    @abc.abstractmethod
+    def insert_sub_task(self, task_id: int, description: str) -> Optional[Any]:
+        """Appends a sub-task after the chore's last one. None if the chore doesn't exist."""
+
+    @abc.abstractmethod
+    def update_sub_task(self, sub_task_id: int, fields: Dict[str, Any], task_id: Optional[int] = None,
+                        expected_version: Optional[int] = None) -> Optional[Any]:
+        """If task_id is given, the sub-task must belong to that chore."""
+
+    @abc.abstractmethod
+    def toggle_sub_task(self, sub_task_id: int, task_id: Optional[int] = None) -> Optional[Any]:
+        """Flips completed as one atomic step, so concurrent toggles never act on a stale read."""
+
+    @abc.abstractmethod
+    def delete_sub_task(self, sub_task_id: int, task_id: Optional[int] = None) -> Optional[Any]:
+        """Deletes one sub-task. If task_id is given, it must belong to that chore."""
+
+    @abc.abstractmethod
+    def move_sub_task(self, task_id: int, sub_task_id: int, direction: str) -> bool:
+        """Swaps a sub-task with its neighbour ('up' or 'down'). False if it can't move."""
+
+    @abc.abstractmethod
+    def clear(self) -> None:
+        """Deletes everything and restarts ids at 1. Used for testing."""
+
+
+# --- SQLite ---
+
+def _versioned_where(where_clause: str, params: tuple, expected_version: Optional[int]):
+    """Adds the optimistic-concurrency check (AND version = ?) when an expected version is given."""
+    if expected_version is None:
+        return where_clause, params
+    return f"{where_clause} AND version = ?", params + (int(expected_version),)
+
+def _execute_returning(conn, statement: str, params: tuple, columns: str,
+                       lookup_sql: str, lookup_params: Optional[tuple] = None,
+                       lookup_first: bool = False) -> Optional[database.sqlite3.Row]:
+    """
+    Runs one INSERT/UPDATE/DELETE and returns the affected row, or None if no row matched.
+    With RETURNING support this is a single statement. On older SQLite builds it falls back
+    to the plain statement plus lookup_sql on the same connection: the lookup runs after the
+    write (by lookup_params, or by lastrowid when lookup_params is None), or before it when
+    lookup_first is set (needed for DELETE).
+    The caller owns the transaction and must commit.
+    """
+    if database.SUPPORTS_RETURNING:
+        return conn.execute(f"{statement} RETURNING {columns}", params).fetchone()
+
+    if lookup_first:
+        row = conn.execute(lookup_sql, lookup_params).fetchone()
+        cursor = conn.execute(statement, params)
+        return row if cursor.rowcount > 0 else None
+
+    cursor = conn.execute(statement, params)
+    if cursor.rowcount <= 0:
+        return None
+    return conn.execute(lookup_sql, lookup_params if lookup_params is not None else (cursor.lastrowid,)).fetchone()
+
+def _id_chunks(ids: List[int]):
+    for start in range(0, len(ids), _CHUNK_SIZE):
+        yield ids[start:start + _CHUNK_SIZE]
+
+def _write_by_ids(conn, statement: str, params: tuple, ids: List[int]) -> set:
+    """
+    Runs `statement WHERE id IN (...)` for every chunk of ids and returns the set of ids
+    that matched a row. The caller owns the transaction.
+    """
+    affected = set()
+    for chunk in _id_chunks(ids):
+        placeholders = ", ".join("?" for _ in chunk)
+        where_clause = f"WHERE id IN ({placeholders})"
+        if database.SUPPORTS_RETURNING:
+            rows = conn.execute(f"{statement} {where_clause} RETURNING id", params + tuple(chunk)).fetchall()
+        else:
+            rows = conn.execute(f"SELECT id FROM tasks {where_clause}", tuple(chunk)).fetchall()
+            conn.execute(f"{statement} {where_clause}", params + tuple(chunk))
+        affected.update(row['id'] for row in rows)
+    return affected
+
+
+class SqliteRepository(TaskRepository):
+    """Chores in the SQLite database (or the current household's shard); writes go through database.run_write."""
+
+    name = 'sqlite'
+
+    def _read(self, sql: str, params: tuple = (), one: bool = False):
+        conn = database.get_db_connection()
+        try:
+            cursor = conn.execute(sql, params)
+            return cursor.fetchone() if one else cursor.fetchall()
+        finally:
+            conn.close()
+
+    def insert_task(self, fields):
+        return database.run_write(lambda conn: conn.execute(
+            "INSERT INTO tasks (description, notes, due_date, status, materials_needed) VALUES (?, ?, ?, ?, ?)",
+            (fields['description'], fields['notes'], fields['due_date'], fields['status'], fields['materials_needed'])
+        ).lastrowid)
+
+    def insert_tasks(self, new_tasks):
+        def write(conn) -> List[int]:
+            ids = []
+            for fields, sub_tasks in new_tasks:
+                task_id = conn.execute(
+                    "INSERT INTO tasks (description, notes, due_date, status, materials_needed) VALUES (?, ?, ?, ?, ?)",
+                    (fields['description'], fields['notes'], fields['due_date'], fields['status'], fields['materials_needed'])
+                ).lastrowid
+                conn.executemany(
+                    "INSERT INTO sub_tasks (task_id, description, completed, order_index) VALUES (?, ?, ?, ?)",
+                    [(task_id, description, 1 if completed else 0, order_index)
+                     for order_index, (description, completed) in enumerate(sub_tasks)]
+                )
+                ids.append(task_id)
+            return ids
+        # Any error rolls back every insert.
+        return database.run_write(write)
+
+    def list_tasks(self):
+        return self._read(f"SELECT {_TASK_COLUMNS} FROM tasks ORDER BY id")
+
+    def get_task(self, task_id):
+        return self._read(f"SELECT {_TASK_COLUMNS} FROM tasks WHERE id = ?", (task_id,), one=True)
+
+    def _update_task(self, task_id, set_clause, params, expected_version, coalesce=False):
+        where_clause, where_params = _versioned_where("id = ?", (task_id,), expected_version)
+        return database.run_write(lambda conn: _execute_returning(
+            conn, f"UPDATE tasks SET {set_clause}, version = version + 1 WHERE {where_clause}",
+            params + where_params, _TASK_COLUMNS, f"SELECT {_TASK_COLUMNS} FROM tasks WHERE id = ?", (task_id,)
+        ), coalesce=coalesce)
+
+    def update_task(self, task_id, fields, expected_version=None):
+        set_clause = ", ".join(f"{field} = ?" for field in fields)
+        return self._update_task(task_id, set_clause, tuple(fields.values()), expected_version)
+
+    def set_task_status(self, task_id, status, expected_version=None):
+        # A small independent write: may share a transaction with others under group commit.
+        return self._update_task(task_id, "status = ?", (status,), expected_version, coalesce=True)
+
+    def delete_task(self, task_id):
+        # Sub-tasks are deleted by CASCADE.
+        return database.run_write(lambda conn: _execute_returning(
+            conn, "DELETE FROM tasks WHERE id = ?", (task_id,), _TASK_COLUMNS,
+            f"SELECT {_TASK_COLUMNS} FROM tasks WHERE id = ?", (task_id,), lookup_first=True
+        ))
+
+    def update_tasks(self, task_ids, fields):
+        set_clause = ", ".join(f"{field} = ?" for field in fields) + ", version = version + 1"
+        return database.run_write(lambda conn: _write_by_ids(
+            conn, f"UPDATE tasks SET {set_clause}", tuple(fields.values()), task_ids))
+
+    def delete_tasks(self, task_ids):
+        return database.run_write(lambda conn: _write_by_ids(conn, "DELETE FROM tasks", (), task_ids))
+
+    def sub_tasks_for(self, task_ids):
+        task_ids = list(task_ids)
+        rows = []
+        conn = database.get_db_connection()
+        try:
+            # One query per chunk of task ids instead of one per task.
+            for chunk in _id_chunks(task_ids):
+                placeholders = ", ".join("?" for _ in chunk)
+                rows.extend(conn.execute(
+                    f"SELECT {_SUB_TASK_COLUMNS} FROM sub_tasks "
+                    f"WHERE task_id IN ({placeholders}) ORDER BY task_id, order_index ASC",
+                    tuple(chunk)
+                ).fetchall())
+        finally:
+            conn.close()
+        return rows
+
+    def get_sub_task(self, sub_task_id):
+        return self._read(f"SELECT {_SUB_TASK_COLUMNS} FROM sub_tasks WHERE id = ?", (sub_task_id,), one=True)
+
+    def insert_sub_task(self, task_id, description):
+        # A single INSERT ... SELECT: inserts nothing when the parent task does not exist,
+        # and appends the new sub-task after the current last one.
+        return database.run_write(lambda conn: _execute_returning(
+            conn,
+            "INSERT INTO sub_tasks (task_id, description, completed, order_index) "
+            "SELECT id, ?, 0, (SELECT COALESCE(MAX(order_index) + 1, 0) FROM sub_tasks WHERE task_id = tasks.id) "
+            "FROM tasks WHERE id = ?",
+            (description, task_id), _SUB_TASK_COLUMNS,
+            f"SELECT {_SUB_TASK_COLUMNS} FROM sub_tasks WHERE id = ?"
+        ))
+
+    def _update_sub_task(self, set_clause, params, sub_task_id, task_id, expected_version):
+        where_clause = "id = ?"
+        where_params: tuple = (sub_task_id,)
+        if task_id is not None:
+            where_clause += " AND task_id = ?"
+            where_params += (task_id,)
+        where_clause, where_params = _versioned_where(where_clause, where_params, expected_version)
+        return database.run_write(lambda conn: _execute_returning(
+            conn, f"UPDATE sub_tasks SET {set_clause}, version = version + 1 WHERE {where_clause}",
+            params + where_params, _SUB_TASK_COLUMNS,
+            f"SELECT {_SUB_TASK_COLUMNS} FROM sub_tasks WHERE id = ?", (sub_task_id,)
+        ), coalesce=True)
+
+    def update_sub_task(self, sub_task_id, fields, task_id=None, expected_version=None):
+        set_clause = ", ".join(f"{field} = ?" for field in fields)
+        return self._update_sub_task(set_clause, tuple(fields.values()), sub_task_id, task_id, expected_version)
+
+    def toggle_sub_task(self, sub_task_id, task_id=None):
+        # completed = 1 - completed is evaluated by SQLite against the row as it is now.
+        return self._update_sub_task("completed = 1 - completed", (), sub_task_id, task_id, None)
+
+    def delete_sub_task(self, sub_task_id, task_id=None):
+        where_clause = "id = ?"
+        params: tuple = (sub_task_id,)
+        if task_id is not None:
+            where_clause += " AND task_id = ?"
+            params += (task_id,)
+        return database.run_write(lambda conn: _execute_returning(
+            conn, f"DELETE FROM sub_tasks WHERE {where_clause}", params, _SUB_TASK_COLUMNS,
+            f"SELECT {_SUB_TASK_COLUMNS} FROM sub_tasks WHERE {where_clause}", params, lookup_first=True
+        ), coalesce=True)
+
+    def move_sub_task(self, task_id, sub_task_id, direction):
+        def swap(conn) -> bool:
+            # Read and swap in one write transaction, so the order can't change in between.
+            ordered = [row['id'] for row in conn.execute(
+                "SELECT id FROM sub_tasks WHERE task_id = ? ORDER BY order_index ASC", (task_id,))]
+            positions = _swap_positions(ordered, sub_task_id, direction)
+            if positions is None:
+                return False
+            current_index, target_index = positions
+            # The moved item takes the target position and the other item takes its old one.
+            conn.execute("UPDATE sub_tasks SET order_index = ?, version = version + 1 WHERE id = ?",
+                         (target_index, ordered[current_index]))
+            conn.execute("UPDATE sub_tasks SET order_index = ?, version = version + 1 WHERE id = ?",
+                         (current_index, ordered[target_index]))
+            return True
+        return database.run_write(swap)
+
+    def clear(self):
+        database.clear_db_for_testing()
+
+
+def _swap_positions(ordered_ids: List[int], sub_task_id: int, direction: str) -> Optional[Tuple[int, int]]:
+    """(current, target) list positions for moving sub_task_id one step, or None if it can't move."""
+    if direction not in ('up', 'down') or sub_task_id not in ordered_ids:
+        return None
+    current_index = ordered_ids.index(sub_task_id)
+    target_index = current_index - 1 if direction == 'up' else current_index + 1
+    if not 0 <= target_index < len(ordered_ids):
+        return None # Already at the top or bottom
+    return current_index, target_index
+
+
+# --- In memory ---
+
+class _MemoryStore:
+    """One database's worth of rows: primary dicts by id, plus each chore's sub-task ids in display order."""
+
+    def __init__(self):
+        self.tasks: Dict[int, Dict[str, Any]] = {}
+        self.sub_tasks: Dict[int, Dict[str, Any]] = {}
+        self.sub_task_ids_by_task: Dict[int, List[int]] = {}
+        self.next_task_id = 1
+        self.next_sub_task_id = 1
+
+    def add_task(self, fields: Dict[str, Any]) -> int:
+        task_id = self.next_task_id
+        self.next_task_id += 1
+        self.tasks[task_id] = {'id': task_id, 'version': 1, **fields}
+        self.sub_task_ids_by_task[task_id] = []
+        return task_id
+
+    def add_sub_task(self, task_id: int, description: str, completed: bool, order_index: int) -> Dict[str, Any]:
+        sub_task_id = self.next_sub_task_id
+        self.next_sub_task_id += 1
+        row = {'id': sub_task_id, 'task_id': task_id, 'description': description,
+               'completed': 1 if completed else 0, 'order_index': order_index, 'version': 1}
+        self.sub_tasks[sub_task_id] = row
+        self.sub_task_ids_by_task[task_id].append(sub_task_id)
+        return row
+
+    def remove_task(self, task_id: int) -> Dict[str, Any]:
+        for sub_task_id in self.sub_task_ids_by_task.pop(task_id):
+            del self.sub_tasks[sub_task_id]
+        return self.tasks.pop(task_id)
+
+    def sort_sub_tasks(self, task_id: int) -> None:
+        self.sub_task_ids_by_task[task_id].sort(key=lambda sub_task_id: self.sub_tasks[sub_task_id]['order_index'])
+
+
+def _matches(row: Optional[Dict[str, Any]], expected_version: Optional[int]) -> bool:
+    return row is not None and (expected_version is None or row['version'] == int(expected_version))
+
+
+class MemoryRepository(TaskRepository):
+    """
+    Chores held in dicts in this process, one store per household. Ids, versions, ordering and
+    cascades follow the SQLite backend. A lock makes every method atomic; rows are returned as copies.
+    """
+
+    name = 'memory'
+
+    def __init__(self):
+        self._stores: Dict[Optional[str], _MemoryStore] = {}
+        self._lock = threading.RLock()
+
+    def _store(self) -> _MemoryStore:
+        tenant = database.current_tenant()
+        store = self._stores.get(tenant)
+        if store is None:
+            store = self._stores[tenant] = _MemoryStore()
+        return store
+
+    def insert_task(self, fields):
+        with self._lock:
+            return self._store().add_task(dict(fields))
+
+    def insert_tasks(self, new_tasks):
+        with self._lock:
+            store = self._store()
+            ids = []
+            for fields, sub_tasks in new_tasks: # Entries are validated by the caller, so this can't fail halfway
+                task_id = store.add_task(dict(fields))
+                for order_index, (description, completed) in enumerate(sub_tasks):
+                    store.add_sub_task(task_id, description, completed, order_index)
+                ids.append(task_id)
+            return ids
+
+    def list_tasks(self):
+        with self._lock:
+            return [dict(row) for row in self._store().tasks.values()] # Ids only grow, so this is id order
+
+    def get_task(self, task_id):
+        with self._lock:
+            row = self._store().tasks.get(task_id)
+            return dict(row) if row else None
+
+    def update_task(self, task_id, fields, expected_version=None):
+        with self._lock:
+            row = self._store().tasks.get(task_id)
+            if not _matches(row, expected_version):
+                return None
+            row.update(fields)
+            row['version'] += 1
+            return dict(row)
+
+    def delete_task(self, task_id):
+        with self._lock:
+            store = self._store()
+            return store.remove_task(task_id) if task_id in store.tasks else None
+
+    def update_tasks(self, task_ids, fields):
+        with self._lock:
+            affected = set()
+            for task_id in task_ids:
+                if self.update_task(task_id, fields) is not None:
+                    affected.add(task_id)
+            return affected
+
+    def delete_tasks(self, task_ids):
+        with self._lock:
+            return {task_id for task_id in task_ids if self.delete_task(task_id) is not None}
+
+    def sub_tasks_for(self, task_ids):
+        with self._lock:
+            store = self._store()
+            return [dict(store.sub_tasks[sub_task_id])
+                    for task_id in sorted(set(task_ids))
+                    for sub_task_id in store.sub_task_ids_by_task.get(task_id, ())]
+
+    def get_sub_task(self, sub_task_id):
+        with self._lock:
+            row = self._store().sub_tasks.get(sub_task_id)
+            return dict(row) if row else None
+
+    def insert_sub_task(self, task_id, description):
+        with self._lock:
+            store = self._store()
+            if task_id not in store.tasks:
+                return None
+            siblings = store.sub_task_ids_by_task[task_id]
+            order_index = store.sub_tasks[siblings[-1]]['order_index'] + 1 if siblings else 0
+            return dict(store.add_sub_task(task_id, description, False, order_index))
+
+    def _sub_task_row(self, sub_task_id, task_id):
+        row = self._store().sub_tasks.get(sub_task_id)
+        if row is None or (task_id is not None and row['task_id'] != task_id):
+            return None
+        return row
+
+    def update_sub_task(self, sub_task_id, fields, task_id=None, expected_version=None):
+        with self._lock:
+            row = self._sub_task_row(sub_task_id, task_id)
+            if not _matches(row, expected_version):
+                return None
+            row.update(fields)
+            row['version'] += 1
+            return dict(row)
+
+    def toggle_sub_task(self, sub_task_id, task_id=None):
+        with self._lock:
+            row = self._sub_task_row(sub_task_id, task_id)
+            if row is None:
+                return None
+            return self.update_sub_task(sub_task_id, {'completed': 1 - row['completed']})
+
+    def delete_sub_task(self, sub_task_id, task_id=None):
+        with self._lock:
+            row = self._sub_task_row(sub_task_id, task_id)
+            if row is None:
+                return None
+            store = self._store()
+            store.sub_task_ids_by_task[row['task_id']].remove(sub_task_id)
+            return store.sub_tasks.pop(sub_task_id)
+
+    def move_sub_task(self, task_id, sub_task_id, direction):
+        with self._lock:
+            store = self._store()
+            ordered = store.sub_task_ids_by_task.get(task_id, [])
+            positions = _swap_positions(ordered, sub_task_id, direction)
+            if positions is None:
+                return False
+            current_index, target_index = positions
+            # Same rule as the SQLite backend: order_index becomes the list position.
+            for moved_id, order_index in ((ordered[current_index], target_index), (ordered[target_index], current_index)):
+                row = store.sub_tasks[moved_id]
+                row['order_index'] = order_index
+                row['version'] += 1
+            store.sort_sub_tasks(task_id)
+            return True
+
+    def clear(self):
+        with self._lock:
+            self._stores.pop(database.current_tenant(), None)
+
+
+BACKENDS = {
+    SqliteRepository.name: SqliteRepository,
+    MemoryRepository.name: MemoryRepository,
+}
+
+_repositories: Dict[str, TaskRepository] = {} # One instance per backend, so memory stores persist while selected
+
+def configure(backend: str = None):
+    """Selects the storage backend ('sqlite' or 'memory'). None keeps the current one."""
+    global STORAGE_BACKEND
+    if backend is not None:
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown storage backend {backend!r}; expected one of {', '.join(BACKENDS)}.")
+        STORAGE_BACKEND = backend
+
+def get_repository() -> TaskRepository:
+    """The repository of the configured backend."""
+    repository = _repositories.get(STORAGE_BACKEND)
+    if repository is None:
+        if STORAGE_BACKEND not in BACKENDS:
+            raise ValueError(f"Unknown storage backend {STORAGE_BACKEND!r}; expected one of {', '.join(BACKENDS)}.")
+        repository = _repositories.setdefault(STORAGE_BACKEND, BACKENDS[STORAGE_BACKEND]())
+    return repository
+
+@contextlib.contextmanager
+def using_backend(backend: str):
+    """Selects a backend for the duration of a with block (process-wide; meant for tests and scripts)."""
+    previous = STORAGE_BACKEND
+    configure(backend=backend)
+    try:
+        yield get_repository()
+    finally:
+        configure(backend=previous)
@@ -11,13 +11,32 @@ class Task:
                  sub_tasks: Optional[List[Dict[str, Any]]] = None,
                  materials_needed: Optional[List[str]] = None): # New attribute
         self.id: Optional[int] = None
+        self.version: Optional[int] = None # Row version in the database; bumped by every write
         self.description: str = description
         self.status: str = status
         self.notes: str = notes
         self.due_date: Optional[date] = due_date
-        self.sub_tasks: List[Dict[str, Any]] = sub_tasks if sub_tasks is not None else []
+        # None means "not loaded yet": sub-tasks are fetched on first access of .sub_tasks
+        # (or filled in bulk by prefetch_sub_tasks).
+        self._sub_tasks: Optional[List[Dict[str, Any]]] = sub_tasks
         self.materials_needed: List[str] = materials_needed if materials_needed is not None else [] # New attribute
 
+    @property
+    def sub_tasks(self) -> List[Dict[str, Any]]:
+        """Sub-tasks of this task, loaded lazily from the database on first access."""
+        if self._sub_tasks is None:
+            self._sub_tasks = get_sub_tasks_for_task(self.id) if self.id is not None else []
+        return self._sub_tasks
+
+    @sub_tasks.setter
+    def sub_tasks(self, value: List[Dict[str, Any]]) -> None:
+        self._sub_tasks = value
+
+    @property
+    def sub_tasks_loaded(self) -> bool:
+        """True once sub-tasks have been fetched (or set explicitly)."""
+        return self._sub_tasks is not None
+
     def __str__(self) -> str:
         due_date_str = f", Due: {self.due_date.isoformat()}" if self.due_date else ""
         notes_str = f", Notes: Yes" if self.notes else ""
@@ -26,11 +45,27 @@ class Task:
         materials_str = f", Materials: {len(self.materials_needed)}" if self.materials_needed else ""
         return (f"[ID: {self.id}] Task: {self.description} (Status: {self.status}{due_date_str}{notes_str}{sub_tasks_str}{materials_str})")
 
-# No more in-memory storage, _next_id counters. DB handles this.
-from . import database # Import the database module
+class Conflict:
+    """
+    Returned by the update functions instead of the updated row when expected_version no
+    longer matches the row in the database, i.e. someone else changed it first.
+    `current` is the row as it is now (a Task, or a sub-task dict). Falsy, like a failed update.
+    """
+    def __init__(self, current):
+        self.current = current
+
+    def __bool__(self) -> bool:
+        return False
+
+    def __repr__(self) -> str:
+        return f"Conflict(current={self.current!r})"
+
+# No more in-memory storage, _next_id counters. The configured storage backend handles this.
+from . import change_bus, database # Import the database module
+from .storage import get_repository as _repository
 
 def _row_to_task(row: database.sqlite3.Row) -> Optional[Task]:
-    """Converts a database row to a Task object."""
+    """Converts a database row (or a backend's dict row) to a Task object."""
     if not row:
         return None
 
@@ -56,105 +91,137 @@ def _row_to_task(row: database.sqlite3.Row) -> Optional[Task]:
         # sub_tasks are populated by get_sub_tasks_for_task and added in higher-level functions
     )
     task.id = row['id']
+    task.version = row['version']
     return task
 
 def add_task(description: str, notes: str = "", due_date: Optional[date] = None, materials_needed_text: str = "") -> Task:
     """Adds a new task to the database."""
     due_date_str = due_date.isoformat() if due_date else None
     # materials_needed_text is assumed to be a newline-separated string from a textarea or similar
-    conn = database.get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute(
-        "INSERT INTO tasks (description, notes, due_date, status, materials_needed) VALUES (?, ?, ?, ?, ?)",
-        (description, notes, due_date_str, "pending", materials_needed_text)
-    )
-    conn.commit()
-    new_task_id = cursor.lastrowid
-    conn.close()
+    new_task_id = _repository().insert_task({
+        'description': description, 'notes': notes, 'due_date': due_date_str,
+        'status': "pending", 'materials_needed': materials_needed_text,
+    })
 
     materials_list = [m.strip() for m in materials_needed_text.splitlines() if m.strip()]
-    created_task = Task(description=description, notes=notes, due_date=due_date, status="pending", materials_needed=materials_list)
+    # A freshly inserted task has no sub-tasks, so there is nothing to load lazily.
+    created_task = Task(description=description, notes=notes, due_date=due_date, status="pending",
+                        sub_tasks=[], materials_needed=materials_list)
     created_task.id = new_task_id
+    created_task.version = 1
+    _publish_task('task.created', created_task)
     return created_task
 
+# Every successful write is published to the change bus (see chores/change_bus.py), after it committed.
+def _publish_task(kind: str, task: Optional[Task]) -> None:
+    if task:
+        change_bus.publish(kind, [task.id], task=task_to_dict(task, include_sub_tasks=False))
 
-def get_all_tasks() -> List[Task]:
-    """Returns all tasks from the database. Sub-tasks are NOT populated yet."""
-    conn = database.get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT id, description, status, notes, due_date, materials_needed FROM tasks ORDER BY id")
-    rows = cursor.fetchall()
-    conn.close()
+def _publish_sub_task(kind: str, sub_task: Optional[Dict[str, Any]]) -> None:
+    if sub_task:
+        change_bus.publish(kind, [sub_task['task_id']], sub_task=dict(sub_task))
 
+
+def get_all_tasks(include_sub_tasks: bool = False) -> List[Task]:
+    """
+    Returns all tasks from the database.
+    Sub-tasks are loaded lazily on first access unless include_sub_tasks is True,
+    in which case they are prefetched for every task with a single query.
+    """
     tasks_list = []
-    for row in rows:
+    for row in _repository().list_tasks():
         task = _row_to_task(row)
         if task:
-            # Populate sub_tasks for each task
-            task.sub_tasks = get_sub_tasks_for_task(task.id)
             tasks_list.append(task)
-    return tasks_list
 
-def get_task_by_id(task_id: int) -> Optional[Task]:
-    """Finds a task by its ID from the database. Sub-tasks are NOT populated yet."""
-    conn = database.get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT id, description, status, notes, due_date, materials_needed FROM tasks WHERE id = ?", (task_id,))
-    row = cursor.fetchone()
-    conn.close()
+    if include_sub_tasks:
+        prefetch_sub_tasks(tasks_list)
+    return tasks_list
 
-    task = _row_to_task(row)
-    if task:
-        # Populate sub_tasks for this specific task
-        task.sub_tasks = get_sub_tasks_for_task(task.id)
+def get_task_by_id(task_id: int, include_sub_tasks: bool = False) -> Optional[Task]:
+    """
+    Finds a task by its ID from the database.
+    Sub-tasks are loaded lazily on first access unless include_sub_tasks is True.
+    """
+    task = _row_to_task(_repository().get_task(task_id))
+    if task and include_sub_tasks:
+        prefetch_sub_tasks([task])
     return task
 
 
-def update_task_status(task_id: int, new_status: str) -> Optional[Task]:
-    """Updates the status of a specific task in the database."""
-    conn = database.get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("UPDATE tasks SET status = ? WHERE id = ?", (new_status, task_id))
-    conn.commit()
+def prefetch_sub_tasks(tasks_list: List[Task]) -> List[Task]:
+    """
+    Fills the lazy sub_tasks collections of many tasks at once.
+    Issues one query per chunk of task ids instead of one query per task.
+    Tasks whose sub-tasks are already loaded are left untouched.
+    """
+    pending = {t.id: t for t in tasks_list if t.id is not None and not t.sub_tasks_loaded}
+    if not pending:
+        return tasks_list
 
-    updated_rows = cursor.rowcount
-    conn.close()
+    grouped: Dict[int, List[Dict[str, Any]]] = {task_id: [] for task_id in pending}
+    for row in _repository().sub_tasks_for(list(pending)):
+        grouped[row['task_id']].append(_row_to_sub_task_dict(row))
 
-    if updated_rows > 0:
-        return get_task_by_id(task_id) # Fetch the updated task
-    return None
+    for task_id, task in pending.items():
+        task.sub_tasks = grouped[task_id]
+    return tasks_list
+
+
+def update_task_status(task_id: int, new_status: str, expected_version: Optional[int] = None) -> Optional[Task]:
+    """
+    Updates the status of a specific task in the database. Returns the updated task, or None if not found.
+    With expected_version, the update only applies to that version of the row; otherwise a Conflict is returned.
+    """
+    row = _repository().set_task_status(task_id, new_status, expected_version)
+    if row is None and expected_version is not None:
+        return _conflict_or_none(get_task_by_id(task_id))
+    updated_task = _row_to_task(row)
+    _publish_task('task.updated', updated_task)
+    return updated_task
+
+
+def _conflict_or_none(current):
+    # A conditional update matched no row: either the row is gone (None) or its version moved on.
+    return Conflict(current) if current else None
+
+
+def remove_task(task_id: int) -> Optional[Task]:
+    """
+    Deletes a task by its ID and returns it as it was just before deletion, or None if not found.
+    Sub-tasks are deleted with it.
+    """
+    task = _row_to_task(_repository().delete_task(task_id))
+    if task:
+        task.sub_tasks = [] # Gone with the parent; nothing left to load lazily
+    _publish_task('task.deleted', task)
+    return task
 
 
 def delete_task(task_id: int) -> bool:
-    """Deletes a task by its ID from the database. Sub-tasks are deleted by CASCADE."""
-    conn = database.get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM tasks WHERE id = ?", (task_id,))
-    conn.commit()
-    deleted_rows = cursor.rowcount
-    conn.close()
-    return deleted_rows > 0
+    """Deletes a task by its ID from the database. Sub-tasks are deleted with it."""
+    return remove_task(task_id) is not None
 
 def clear_all_tasks():
-    """Clears all tasks and sub-tasks from the database. Useful for testing."""
-    # This function now directly calls the database clearing function.
-    database.clear_db_for_testing()
+    """Clears all tasks and sub-tasks from the storage backend. Useful for testing."""
+    _repository().clear()
+    change_bus.publish('tasks.cleared', None)
 
 
 def update_task_details(task_id: int,
                         description: Any = _SENTINEL,
                         notes: Any = _SENTINEL,
                         due_date: Any = _SENTINEL,
-                        materials_needed_text: Any = _SENTINEL) -> Optional[Task]:
+                        materials_needed_text: Any = _SENTINEL,
+                        status: Any = _SENTINEL,
+                        expected_version: Optional[int] = None) -> Optional[Task]:
     """
     Updates the core details of a specific task, including materials.
     Uses a sentinel to differentiate between passing None and not passing an argument.
     materials_needed_text is expected as a raw string (e.g., from a textarea).
+    With expected_version (the version the caller read), the update only applies if nobody
+    changed the task since; otherwise nothing is written and a Conflict is returned.
     """
-    task_exists = get_task_by_id(task_id)
-    if not task_exists:
-        return None
-
     fields_to_update = {}
     if description is not _SENTINEL:
         fields_to_update['description'] = description if description is not None else ""
@@ -165,36 +232,27 @@ def update_task_details(task_id: int,
     if materials_needed_text is not _SENTINEL:
         # Store as text; conversion to list happens in _row_to_task or Task constructor
         fields_to_update['materials_needed'] = materials_needed_text if materials_needed_text is not None else ""
-
+    if status is not _SENTINEL:
+        fields_to_update['status'] = status
 
     if not fields_to_update:
-        return task_exists
-
-    set_clause = ", ".join([f"{field} = ?" for field in fields_to_update.keys()])
-    values = list(fields_to_update.values())
-    values.append(task_id)
+        return get_task_by_id(task_id)
 
-    conn = database.get_db_connection()
-    cursor = conn.cursor()
-    updated_rows = 0
+    # One UPDATE ... RETURNING: no separate existence check and no re-read afterwards.
     try:
-        cursor.execute(f"UPDATE tasks SET {set_clause} WHERE id = ?", tuple(values))
-        conn.commit()
-        updated_rows = cursor.rowcount
-    except database.sqlite3.Error as e:
+        row = _repository().update_task(task_id, fields_to_update, expected_version)
+    except database.sqlite3.Error as e: # Rolled back by run_write
         print(f"Database error during task update for task ID {task_id}: {e}")
-        conn.rollback() # Rollback on error
-    finally:
-        conn.close()
-
-    if updated_rows > 0:
-        return get_task_by_id(task_id) # Fetch and return the updated task
-    else:
-        # If no rows updated, but we know the task exists, it might mean an error or no actual change needed
-        # We return the task as it was before the attempted update if an error occurred during DB op,
-        # or if the values provided happened to be the same as already in DB.
-        # get_task_by_id will give the current state from DB.
+        row = _SENTINEL
+
+    if row is _SENTINEL:
+        # The write failed; report the task as it currently is in the DB.
         return get_task_by_id(task_id)
+    if row is None and expected_version is not None:
+        return _conflict_or_none(get_task_by_id(task_id))
+    updated_task = _row_to_task(row)
+    _publish_task('task.updated', updated_task)
+    return updated_task
 
 
 # --- Sub-task Management ---
@@ -208,63 +266,28 @@ def _row_to_sub_task_dict(row: database.sqlite3.Row) -> Optional[Dict[str, Any]]
         'task_id': row['task_id'],
         'description': row['description'],
         'completed': bool(row['completed']), # Convert 0/1 to False/True
-        'order_index': row['order_index']
+        'order_index': row['order_index'],
+        'version': row['version']
     }
 
 def add_sub_task(task_id: int, sub_task_description: str) -> Optional[Dict[str, Any]]:
     """Adds a new sub-task to a given parent task in the database."""
-    conn = database.get_db_connection()
-    cursor = conn.cursor()
     try:
-        # Check if parent task exists
-        cursor.execute("SELECT id FROM tasks WHERE id = ?", (task_id,))
-        parent_task_row = cursor.fetchone()
-        if not parent_task_row:
-            print(f"Parent task with ID {task_id} not found. Cannot add sub-task.")
-            conn.close()
-            return None
-
-        # Determine the next order_index
-        cursor.execute("SELECT COUNT(*) FROM sub_tasks WHERE task_id = ?", (task_id,))
-        count = cursor.fetchone()[0]
-        order_index = count # 0-based index for new item
-
-        cursor.execute(
-            "INSERT INTO sub_tasks (task_id, description, completed, order_index) VALUES (?, ?, ?, ?)",
-            (task_id, sub_task_description, 0, order_index) # completed defaults to 0 (False)
-        )
-        conn.commit()
-        new_sub_task_id = cursor.lastrowid
-
-        # Return the newly created sub-task as a dictionary
-        return {
-            'id': new_sub_task_id,
-            'task_id': task_id,
-            'description': sub_task_description,
-            'completed': False,
-            'order_index': order_index
-        }
+        row = _repository().insert_sub_task(task_id, sub_task_description)
     except database.sqlite3.Error as e:
         print(f"Database error adding sub_task for task_id {task_id}: {e}")
-        conn.rollback()
         return None
-    finally:
-        conn.close()
+    if row is None:
+        print(f"Parent task with ID {task_id} not found. Cannot add sub-task.")
+    new_sub_task = _row_to_sub_task_dict(row)
+    _publish_sub_task('sub_task.created', new_sub_task)
+    return new_sub_task
 
 
 def get_sub_tasks_for_task(task_id: int) -> List[Dict[str, Any]]:
     """Retrieves all sub-tasks for a given parent task_id, ordered by order_index."""
-    conn = database.get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute(
-        "SELECT id, task_id, description, completed, order_index FROM sub_tasks WHERE task_id = ? ORDER BY order_index ASC",
-        (task_id,)
-    )
-    rows = cursor.fetchall()
-    conn.close()
-
     sub_tasks_list = []
-    for row in rows:
+    for row in _repository().sub_tasks_for([task_id]):
         st_dict = _row_to_sub_task_dict(row)
         if st_dict:
             sub_tasks_list.append(st_dict)
@@ -274,25 +297,17 @@ def get_sub_tasks_for_task(task_id: int) -> List[Dict[str, Any]]:
 # but can be useful for direct manipulation or if needed.
 def get_sub_task_by_id_from_db(sub_task_id: int) -> Optional[Dict[str, Any]]:
     """Finds a specific sub-task by its ID from the database."""
-    conn = database.get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute(
-        "SELECT id, task_id, description, completed, order_index FROM sub_tasks WHERE id = ?",
-        (sub_task_id,)
-    )
-    row = cursor.fetchone()
-    conn.close()
-    return _row_to_sub_task_dict(row)
+    return _row_to_sub_task_dict(_repository().get_sub_task(sub_task_id))
 
 
 def update_sub_task(sub_task_id: int,
                     description: Any = _SENTINEL,
-                    completed: Any = _SENTINEL) -> Optional[Dict[str, Any]]:
-    """Updates a sub-task's description or completed status in the database."""
-    current_sub_task = get_sub_task_by_id_from_db(sub_task_id)
-    if not current_sub_task:
-        return None
-
+                    completed: Any = _SENTINEL,
+                    expected_version: Optional[int] = None) -> Optional[Dict[str, Any]]:
+    """
+    Updates a sub-task's description or completed status in the database.
+    With expected_version, returns a Conflict instead of writing if the sub-task changed since it was read.
+    """
     fields_to_update = {}
     if description is not _SENTINEL:
         fields_to_update['description'] = description if description is not None else ""
@@ -300,105 +315,180 @@ def update_sub_task(sub_task_id: int,
         fields_to_update['completed'] = 1 if completed else 0 # Convert boolean to int
 
     if not fields_to_update:
-        return current_sub_task # No actual update values passed
+        return get_sub_task_by_id_from_db(sub_task_id) # No actual update values passed
+
+    return _write_sub_task(lambda repository: repository.update_sub_task(
+        sub_task_id, fields_to_update, expected_version=expected_version), sub_task_id, expected_version=expected_version)
+
+
+def toggle_sub_task(sub_task_id: int, task_id: Optional[int] = None) -> Optional[Dict[str, Any]]:
+    """
+    Flips a sub-task's completed flag atomically (completed = 1 - completed in SQL), so concurrent
+    toggles never act on a stale read. If task_id is given, the sub-task must belong to that task.
+    Returns the updated sub-task, or None if no matching sub-task exists.
+    """
+    return _write_sub_task(lambda repository: repository.toggle_sub_task(sub_task_id, task_id), sub_task_id)
 
-    set_clause = ", ".join([f"{field} = ?" for field in fields_to_update.keys()])
-    values = list(fields_to_update.values())
-    values.append(sub_task_id)
 
-    conn = database.get_db_connection()
-    cursor = conn.cursor()
-    updated_rows = 0
+def _write_sub_task(write, sub_task_id: int, expected_version: Optional[int] = None) -> Optional[Dict[str, Any]]:
+    """
+    Shared result handling for update_sub_task and toggle_sub_task: `write(repository)` returns
+    the updated row, or None if nothing matched.
+    """
     try:
-        cursor.execute(f"UPDATE sub_tasks SET {set_clause} WHERE id = ?", tuple(values))
-        conn.commit()
-        updated_rows = cursor.rowcount
+        row = write(_repository())
     except database.sqlite3.Error as e:
         print(f"Database error updating sub_task ID {sub_task_id}: {e}")
-        conn.rollback()
-    finally:
-        conn.close()
+        row = _SENTINEL
 
-    if updated_rows > 0:
-        return get_sub_task_by_id_from_db(sub_task_id)
-    return current_sub_task # Return current state if update failed or made no changes
+    if row is _SENTINEL:
+        return get_sub_task_by_id_from_db(sub_task_id) # Return current state if the update failed
+    if row is None and expected_version is not None:
+        return _conflict_or_none(get_sub_task_by_id_from_db(sub_task_id))
+    updated_sub_task = _row_to_sub_task_dict(row)
+    _publish_sub_task('sub_task.updated', updated_sub_task)
+    return updated_sub_task
 
 
-def delete_sub_task(sub_task_id: int) -> bool:
-    """Deletes a sub-task by its ID from the database."""
-    conn = database.get_db_connection()
-    cursor = conn.cursor()
-    deleted_rows = 0
+def remove_sub_task(sub_task_id: int, task_id: Optional[int] = None) -> Optional[Dict[str, Any]]:
+    """
+    Deletes a sub-task and returns it as it was just before deletion, or None if not found.
+    If task_id is given, the sub-task must belong to that task.
+    """
     try:
-        cursor.execute("DELETE FROM sub_tasks WHERE id = ?", (sub_task_id,))
-        conn.commit()
-        deleted_rows = cursor.rowcount
+        row = _repository().delete_sub_task(sub_task_id, task_id)
     except database.sqlite3.Error as e:
         print(f"Database error deleting sub_task ID {sub_task_id}: {e}")
-        conn.rollback()
-    finally:
-        conn.close()
-    return deleted_rows > 0
+        row = None
+    removed_sub_task = _row_to_sub_task_dict(row)
+    _publish_sub_task('sub_task.deleted', removed_sub_task)
+    return removed_sub_task
+
+
+def delete_sub_task(sub_task_id: int) -> bool:
+    """Deletes a sub-task by its ID from the database."""
+    return remove_sub_task(sub_task_id) is not None
 
 def move_sub_task(task_id: int, sub_task_id: int, direction: str) -> bool:
     """Moves a sub-task up or down, updating order_index in the database."""
-    conn = database.get_db_connection()
-    cursor = conn.cursor()
+    if direction not in ('up', 'down'):
+        return False # Invalid direction
 
     try:
-        # Get all sub-tasks for the parent task, ordered
-        cursor.execute("SELECT id, order_index FROM sub_tasks WHERE task_id = ? ORDER BY order_index ASC", (task_id,))
-        sub_tasks_ordered = cursor.fetchall()
-
-        if not sub_tasks_ordered:
-            return False # No sub-tasks for this parent
-
-        current_index = -1
-        for i, st_row in enumerate(sub_tasks_ordered):
-            if st_row['id'] == sub_task_id:
-                current_index = i
-                break
-
-        if current_index == -1:
-            return False # Sub-task not found in this parent's list
-
-        num_sub_tasks = len(sub_tasks_ordered)
-
-        if direction == 'up':
-            if current_index == 0: return False # Already at top
-            target_index = current_index - 1
-            # Swap order_index with the item currently at target_index
-            st_to_move_id = sub_tasks_ordered[current_index]['id']
-            st_other_id = sub_tasks_ordered[target_index]['id']
-
-            # Start transaction
-            cursor.execute("BEGIN TRANSACTION;")
-            # Temporarily give st_to_move_id a placeholder index to avoid unique constraint violation if swapping directly
-            # A common way is to update both:
-            # Item moving up gets the lower index, item moving down gets the higher index.
-            cursor.execute("UPDATE sub_tasks SET order_index = ? WHERE id = ?", (target_index, st_to_move_id))
-            cursor.execute("UPDATE sub_tasks SET order_index = ? WHERE id = ?", (current_index, st_other_id))
-            conn.commit()
-            return True
-
-        elif direction == 'down':
-            if current_index == num_sub_tasks - 1: return False # Already at bottom
-            target_index = current_index + 1
-            # Swap order_index
-            st_to_move_id = sub_tasks_ordered[current_index]['id']
-            st_other_id = sub_tasks_ordered[target_index]['id']
-
-            cursor.execute("BEGIN TRANSACTION;")
-            cursor.execute("UPDATE sub_tasks SET order_index = ? WHERE id = ?", (target_index, st_to_move_id))
-            cursor.execute("UPDATE sub_tasks SET order_index = ? WHERE id = ?", (current_index, st_other_id))
-            conn.commit()
-            return True
-        else:
-            return False # Invalid direction
-
+        moved = _repository().move_sub_task(task_id, sub_task_id, direction)
     except database.sqlite3.Error as e:
         print(f"Database error moving sub_task ID {sub_task_id} for task ID {task_id}: {e}")
-        conn.rollback()
         return False
-    finally:
-        conn.close()
+    if moved:
+        change_bus.publish('sub_task.moved', [task_id], sub_task_id=sub_task_id, direction=direction)
+    return moved
+
+
+# --- Bulk operations ---
+# Each bulk function is a single backend call: for SQLite, set-based statements (WHERE id IN (...),
+# one per chunk of ids) in one transaction, so thousands of updates cost one commit instead of one each.
+
+def _unique_ids(task_ids: List[int]) -> List[int]:
+    return list(dict.fromkeys(int(task_id) for task_id in task_ids)) # De-duplicate, keep order
+
+def _publish_bulk(kind: str, task_ids: List[int], affected, **data) -> None:
+    # One event for the whole batch, listing the affected ids in input order.
+    changed = [task_id for task_id in task_ids if task_id in affected]
+    if changed:
+        change_bus.publish(kind, changed, **data)
+
+def bulk_update_status(task_ids: List[int], new_status: str) -> Dict[int, bool]:
+    """
+    Sets the status of many tasks in one transaction.
+    Returns {task_id: True if updated, False if no such task}, in input order.
+    """
+    unique_ids = _unique_ids(task_ids)
+    # Errors roll back the whole batch and propagate
+    affected = _repository().update_tasks(unique_ids, {'status': new_status})
+    _publish_bulk('task.updated', unique_ids, affected, changes={'status': new_status})
+    return {task_id: task_id in affected for task_id in unique_ids}
+
+def bulk_set_due_date(task_ids: List[int], due_date: Optional[date]) -> Dict[int, bool]:
+    """
+    Sets (or, with None, clears) the due date of many tasks in one transaction.
+    Returns {task_id: True if updated, False if no such task}, in input order.
+    """
+    unique_ids = _unique_ids(task_ids)
+    fields = {'due_date': due_date.isoformat() if due_date else None}
+    affected = _repository().update_tasks(unique_ids, fields)
+    _publish_bulk('task.updated', unique_ids, affected, changes=fields)
+    return {task_id: task_id in affected for task_id in unique_ids}
+
+def bulk_delete(task_ids: List[int]) -> Dict[int, bool]:
+    """
+    Deletes many tasks in one transaction, with their sub-tasks.
+    Returns {task_id: True if deleted, False if no such task}, in input order.
+    """
+    unique_ids = _unique_ids(task_ids)
+    affected = _repository().delete_tasks(unique_ids)
+    _publish_bulk('task.deleted', unique_ids, affected)
+    return {task_id: task_id in affected for task_id in unique_ids}
+
+def bulk_add_tasks(entries: List[Dict[str, Any]]) -> List[Task]:
+    """
+    Inserts many tasks (and their sub-tasks) in one transaction; all or nothing.
+    Each entry uses the task_to_dict() format: 'description' is required; 'status', 'notes',
+    'due_date' (ISO string or date), 'materials_needed' (list or newline-separated text) and
+    'sub_tasks' (list of descriptions or {'description', 'completed'} dicts) are optional.
+    """
+    # Every entry is checked before anything is written: a bad one (ValueError/KeyError) inserts nothing.
+    new_tasks = []
+    created = []
+    for entry in entries:
+        description = entry.get('description')
+        if not description:
+            raise ValueError("Every task needs a description.")
+        due_date = entry.get('due_date')
+        if isinstance(due_date, str):
+            due_date = date.fromisoformat(due_date) if due_date else None
+        materials = entry.get('materials_needed') or []
+        materials_text = "\n".join(materials) if isinstance(materials, list) else materials
+
+        sub_tasks = []
+        for sub_task in entry.get('sub_tasks') or []:
+            if isinstance(sub_task, str):
+                sub_task = {'description': sub_task}
+            sub_tasks.append((sub_task['description'], bool(sub_task.get('completed'))))
+        new_tasks.append(({
+            'description': description, 'notes': entry.get('notes') or "",
+            'due_date': due_date.isoformat() if due_date else None,
+            'status': entry.get('status') or "pending", 'materials_needed': materials_text,
+        }, sub_tasks))
+
+        task = Task(description=description, status=entry.get('status') or "pending",
+                    notes=entry.get('notes') or "", due_date=due_date,
+                    materials_needed=[m.strip() for m in materials_text.splitlines() if m.strip()])
+        task.version = 1
+        if not sub_tasks:
+            task.sub_tasks = [] # Known to be empty; nothing to load lazily
+        created.append(task)
+
+    for task, task_id in zip(created, _repository().insert_tasks(new_tasks)):
+        task.id = task_id
+    if created:
+        change_bus.publish('task.created', [task.id for task in created])
+    return created
+
+def task_to_dict(task: Task, include_sub_tasks: bool = True) -> Dict[str, Any]:
+    """Plain-data form of a task (JSON-serializable), as used by export and the CLI's --json output."""
+    data = {
+        'id': task.id,
+        'version': task.version,
+        'description': task.description,
+        'status': task.status,
+        'notes': task.notes,
+        'due_date': task.due_date.isoformat() if task.due_date else None,
+        'materials_needed': list(task.materials_needed),
+    }
+    if include_sub_tasks:
+        data['sub_tasks'] = [
+            {'id': st['id'], 'description': st['description'], 'completed': st['completed'],
+             'order_index': st['order_index'], 'version': st['version']}
+            for st in task.sub_tasks
+        ]
+    return data
@@ -1,143 +1,512 @@
-# Main application file for the Chores Manager
-from chores import tasks, planning # Assuming tasks and planning are exposed via chores/__init__.py
-
-def print_menu():
-    """Prints the main menu options."""
-    print("\nChores Manager Menu:")
-    print("1. Add new chore")
-    print("2. View all chores")
-    print("3. Update chore status")
-    print("4. Delete chore")
-    print("5. Add/Update plan for chore")
-    print("6. View plan for chore")
-    print("7. Exit")
-
-def handle_add_chore():
-    """Handles adding a new chore."""
-    description = input("Enter chore description: ")
-    task = tasks.add_task(description)
-    print(f"Chore added: {task}")
-
-def handle_view_chores():
-    """Handles viewing all chores."""
-    all_tasks = tasks.get_all_tasks()
-    if not all_tasks:
-        print("No chores yet!")
-        return
-    print("\n--- All Chores ---")
-    for task in all_tasks:
-        print(task)
-    print("------------------")
-
-def handle_update_chore_status():
-    """Handles updating a chore's status."""
-    try:
-        task_id_str = input("Enter chore ID to update: ")
-        task_id = int(task_id_str)
-        new_status = input(f"Enter new status for chore {task_id} (e.g., pending, in progress, completed): ")
-        updated_task = tasks.update_task_status(task_id, new_status)
-        if updated_task:
-            print(f"Chore status updated: {updated_task}")
+# Command-line interface for the Chores Manager.
+#
+#   python main.py add "Clean the kitchen" "Take out the trash" [--notes ...] [--due YYYY-MM-DD]
+#   python main.py list [--status pending] [--json]
+#   python main.py status completed 3 4 5         # or: ... | python main.py status completed -
+#   python main.py delete 3 4 5                   # or: ... | python main.py delete -
+#   python main.py import chores.json             # or: ... | python main.py import -
+#   python main.py export [chores.json]
+#   python main.py suggest 3 [--apply] [--provider gemini,heuristic]
+#   python main.py archive [--older-than-days 30] [--all-households]   # e.g. nightly from cron
+#   python main.py restore 3 4
+#   python main.py maintenance [--all-households] [--convert-vacuum]   # orphan sweep, ANALYZE, incremental VACUUM
+#   python main.py template save 3 [--name "Deep-clean kitchen"]
+#   python main.py template use "Deep-clean kitchen" --due 2024-06-01 --due 2024-09-01   # or: template list|delete 2
+#   python main.py changes --consumer mirror --json      # what changed since mirror's last ack
+#   python main.py changes --consumer mirror --ack 1234  # mirror has applied everything up to 1234
+#   python main.py --shard-dir shards/ shards create smiths|migrate [ids...]|list
+#   python main.py --shard-dir shards/ --household smiths list
+#
+# Every subcommand accepts --json for machine-readable output. Commands that take ids
+# also read them (whitespace-separated) from stdin when given "-". Bulk commands apply
+# all their changes in a single transaction.
+
+import argparse
+import json
+import os
+import sys
+from datetime import date, datetime, timedelta, timezone
+
+from chores import database, tasks
+
+VALID_STATUSES = ['pending', 'in progress', 'completed']
+
+
+def _read_ids(raw_ids, stdin):
+    """Expands '-' into whitespace-separated ids read from stdin."""
+    ids = []
+    for raw in raw_ids:
+        values = stdin.read().split() if raw == '-' else [raw]
+        for value in values:
+            try:
+                ids.append(int(value))
+            except ValueError:
+                raise SystemExit(f"Invalid chore ID: {value!r}")
+    return ids
+
+
+def _read_lines(raw_values, stdin):
+    """Expands '-' into non-empty lines read from stdin."""
+    values = []
+    for raw in raw_values:
+        if raw == '-':
+            values.extend(line.strip() for line in stdin if line.strip())
         else:
-            print(f"Chore with ID {task_id} not found.")
-    except ValueError:
-        print("Invalid input. Chore ID must be a number.")
+            values.append(raw)
+    return values
+
+
+def _print_json(data, stdout):
+    json.dump(data, stdout, indent=2)
+    stdout.write("\n")
+
+
+def _report_bulk(results, verb, args, stdout):
+    """Prints per-id results of a bulk operation; returns exit code 1 if any id was not found."""
+    missing = [task_id for task_id, ok in results.items() if not ok]
+    if args.json:
+        _print_json({'results': [{'id': task_id, 'ok': ok} for task_id, ok in results.items()]}, stdout)
+    else:
+        done = len(results) - len(missing)
+        print(f"{done} chore(s) {verb}.", file=stdout)
+        for task_id in missing:
+            print(f"Chore with ID {task_id} not found.", file=stdout)
+    return 1 if missing else 0
+
+
+def cmd_add(args, stdin, stdout):
+    descriptions = _read_lines(args.descriptions, stdin)
+    if not descriptions:
+        raise SystemExit("No chore descriptions given.")
+    created = tasks.bulk_add_tasks([
+        {'description': description, 'notes': args.notes, 'due_date': args.due,
+         'materials_needed': args.materials.replace(',', '\n') if args.materials else ''}
+        for description in descriptions
+    ])
+    if args.json:
+        _print_json([tasks.task_to_dict(task) for task in created], stdout)
+    else:
+        for task in created:
+            print(f"Chore added: {task}", file=stdout)
+    return 0
+
+
+def cmd_list(args, stdin, stdout):
+    all_tasks = tasks.get_all_tasks(include_sub_tasks=True)
+    if args.status:
+        all_tasks = [task for task in all_tasks if task.status == args.status]
+    if args.json:
+        _print_json([tasks.task_to_dict(task) for task in all_tasks], stdout)
+    elif not all_tasks:
+        print("No chores yet!", file=stdout)
+    else:
+        for task in all_tasks:
+            print(task, file=stdout)
+    return 0
+
+
+def cmd_status(args, stdin, stdout):
+    results = tasks.bulk_update_status(_read_ids(args.ids, stdin), args.status)
+    return _report_bulk(results, f"set to '{args.status}'", args, stdout)
+
 
-def handle_delete_chore():
-    """Handles deleting a chore."""
+def cmd_delete(args, stdin, stdout):
+    results = tasks.bulk_delete(_read_ids(args.ids, stdin))
+    return _report_bulk(results, "deleted", args, stdout)
+
+
+def cmd_import(args, stdin, stdout):
     try:
-        task_id_str = input("Enter chore ID to delete: ")
-        task_id = int(task_id_str)
-        if tasks.delete_task(task_id):
-            print(f"Chore with ID {task_id} deleted.")
-            planning.remove_plan(task_id) # Also remove any associated plan
+        if args.file == '-':
+            entries = json.load(stdin)
         else:
-            print(f"Chore with ID {task_id} not found.")
-    except ValueError:
-        print("Invalid input. Chore ID must be a number.")
-
-def handle_add_plan():
-    """Handles adding or updating a plan for a chore."""
+            with open(args.file, encoding='utf-8') as f:
+                entries = json.load(f)
+    except json.JSONDecodeError as e:
+        raise SystemExit(f"Invalid JSON in {args.file}: {e}")
+    if not isinstance(entries, list) or not all(isinstance(entry, dict) for entry in entries):
+        raise SystemExit("Import expects a JSON list of chores, as written by export.")
+    for entry in entries:
+        entry.pop('id', None) # Imported chores get fresh ids
     try:
-        task_id_str = input("Enter chore ID to plan for: ")
-        task_id = int(task_id_str)
-        task = tasks.get_task_by_id(task_id)
+        created = tasks.bulk_add_tasks(entries) # Checks every entry first: a bad one imports nothing
+    except KeyError as e:
+        raise SystemExit(f"Invalid chore: missing {e}.")
+    except (ValueError, TypeError) as e:
+        raise SystemExit(f"Invalid chore: {e}")
+    if args.json:
+        _print_json({'imported': [task.id for task in created]}, stdout)
+    else:
+        print(f"{len(created)} chore(s) imported.", file=stdout)
+    return 0
+
+
+def cmd_export(args, stdin, stdout):
+    data = [tasks.task_to_dict(task) for task in tasks.get_all_tasks(include_sub_tasks=True)]
+    if args.file and args.file != '-':
+        with open(args.file, 'w', encoding='utf-8') as f:
+            _print_json(data, f)
+        if not args.json:
+            print(f"{len(data)} chore(s) exported to {args.file}.", file=stdout)
+    else:
+        _print_json(data, stdout)
+    return 0
+
+
+def cmd_suggest(args, stdin, stdout):
+    from chores import ai_assistant, similarity # Only this command needs the AI modules
+
+    if args.provider:
+        try:
+            ai_assistant.configure_provider(args.provider)
+        except (ValueError, OSError) as e:
+            print(e, file=stdout)
+            return 1
+    results = []
+    exit_code = 0
+    for task_id in _read_ids(args.ids, stdin):
+        task = tasks.get_task_by_id(task_id, include_sub_tasks=True)
         if not task:
-            print(f"Chore with ID {task_id} not found. Cannot add plan.")
-            return
+            results.append({'id': task_id, 'error': 'not found'})
+            exit_code = 1
+            continue
+        existing = [st['description'] for st in task.sub_tasks]
+        suggestions = similarity.suggest(task.description, existing) # Reuses a near-duplicate chore's if possible
+        result = {'id': task_id, 'sub_tasks': suggestions.get('sub_tasks', []), 'materials': suggestions.get('materials', [])}
+        if 'similar_to' in suggestions:
+            result['similar_to'] = suggestions['similar_to']
+        if suggestions.get('error'):
+            result['error'] = suggestions['error']['message']
+            exit_code = 1
 
-        print(f"Adding/Updating plan for: {task}")
-        notes = input("Enter planning notes (optional): ")
-        due_date = input("Enter due date (e.g., YYYY-MM-DD, optional): ")
+        if args.apply:
+            existing_normalized = {desc.strip().lower() for desc in existing}
+            for desc in result['sub_tasks']:
+                if desc.strip().lower() not in existing_normalized and tasks.add_sub_task(task_id, desc.strip()):
+                    existing_normalized.add(desc.strip().lower())
+            materials_normalized = {m.strip().lower() for m in task.materials_needed}
+            new_materials = []
+            for material in result['materials']:
+                if material.strip() and material.strip().lower() not in materials_normalized:
+                    new_materials.append(material.strip())
+                    materials_normalized.add(material.strip().lower())
+            if new_materials:
+                tasks.update_task_details(task_id, materials_needed_text="\n".join(task.materials_needed + new_materials))
+            if 'similar_to' not in suggestions and not ai_assistant.suggestion_error(suggestions):
+                similarity.remember(task.description, suggestions)
+        results.append(result)
 
-        plan_details = {}
-        if notes:
-            plan_details["notes"] = notes
-        if due_date:
-            plan_details["due_date"] = due_date
+    if args.json:
+        _print_json(results, stdout)
+    else:
+        for result in results:
+            if result.get('error') == 'not found':
+                print(f"Chore with ID {result['id']} not found.", file=stdout)
+                continue
+            if 'error' in result:
+                print(f"Chore {result['id']}: {result['error']}", file=stdout)
+                continue
+            reused = f" (reused from similar chore '{result['similar_to']}')" if 'similar_to' in result else ""
+            print(f"Chore {result['id']}:{reused}", file=stdout)
+            for desc in result['sub_tasks']:
+                print(f"  - {desc}", file=stdout)
+            if result['materials']:
+                print(f"  Materials: {', '.join(result['materials'])}", file=stdout)
+    return exit_code
 
-        if not plan_details:
-            print("No planning details provided. Plan not added/updated.")
-            return
 
-        if planning.add_plan_details(task_id, plan_details):
-            print(f"Plan details added/updated for chore ID {task_id}.")
-        else:
-            # This case should ideally not be hit if task_id validation is done prior
-            print(f"Failed to add/update plan for chore ID {task_id}.")
+def cmd_archive(args, stdin, stdout):
+    from chores import archive
 
-    except ValueError:
-        print("Invalid input. Chore ID must be a number.")
+    before = datetime.now(timezone.utc) - timedelta(days=args.older_than_days)
+    results = []
+    for household in _households_for(args):
+        with database.using_tenant(household):
+            results.append({'household': household, 'archived': archive.archive_completed(before, batch_size=args.batch_size)})
+    if args.json:
+        _print_json(results, stdout)
+    else:
+        for result in results:
+            where = f" for household {result['household']}" if result['household'] else ""
+            print(f"{result['archived']} chore(s) archived{where}.", file=stdout)
+    return 0
 
 
-def handle_view_plan():
-    """Handles viewing the plan for a chore."""
-    try:
-        task_id_str = input("Enter chore ID to view plan: ")
-        task_id = int(task_id_str)
-        task = tasks.get_task_by_id(task_id)
-        if not task:
-            print(f"Chore with ID {task_id} not found.")
-            return
-
-        plan_details = planning.get_plan_details(task_id)
-        print(f"\n--- Plan for Chore: {task.description} (ID: {task.id}) ---")
-        if plan_details:
-            for key, value in plan_details.items():
-                print(f"  {key.replace('_', ' ').capitalize()}: {value}")
+def cmd_restore(args, stdin, stdout):
+    from chores import archive
+
+    results = {task_id: archive.restore_task(task_id) is not None for task_id in _read_ids(args.ids, stdin)}
+    return _report_bulk(results, "restored", args, stdout)
+
+
+def _households_for(args):
+    """The databases a maintenance-style command runs on: every shard, the selected one, or the default."""
+    if args.all_households:
+        if not database.SHARD_DIRECTORY:
+            raise SystemExit("--all-households needs a shard directory (--shard-dir or CHORES_SHARD_DIRECTORY).")
+        return database.list_shards()
+    return [database.current_tenant()]
+
+
+def cmd_maintenance(args, stdin, stdout):
+    from chores import maintenance
+
+    results = []
+    for household in _households_for(args):
+        with database.using_tenant(household):
+            results.append({'household': household, **maintenance.run_maintenance(
+                batch_size=args.batch_size, convert_to_incremental_vacuum=args.convert_vacuum)})
+    if args.json:
+        _print_json(results, stdout)
+    else:
+        for result in results:
+            where = f"household {result['household']}: " if result['household'] else ""
+            print(f"{where}{result['orphaned_sub_tasks_deleted']} orphaned sub-task(s) deleted, "
+                  f"{result['reclaimed_bytes']} bytes reclaimed ({result['bytes_after']} bytes now).", file=stdout)
+            if not result['incremental_vacuum']:
+                print(f"{where}free space stays in the file; run once with --convert-vacuum to enable "
+                      "incremental vacuum (rewrites the whole file).", file=stdout)
+    return 0
+
+
+def _find_template(ref):
+    """A template by id or (case-insensitive) name, or None."""
+    from chores import chore_templates
+
+    if ref.isdigit():
+        return chore_templates.get_template(int(ref))
+    return chore_templates.find_template(ref)
+
+
+def cmd_template(args, stdin, stdout):
+    from chores import chore_templates
+
+    if args.action != 'list' and not args.ref:
+        raise SystemExit(f"template {args.action} needs a {'chore id' if args.action == 'save' else 'template id or name'}.")
+    if args.action == 'list':
+        templates = chore_templates.get_all_templates()
+        if args.json:
+            _print_json([chore_templates.template_to_dict(template) for template in templates], stdout)
+        elif not templates:
+            print("No templates yet!", file=stdout)
+        else:
+            for template in templates:
+                print(template, file=stdout)
+        return 0
+
+    if args.action == 'save':
+        try:
+            task_id = int(args.ref)
+        except ValueError:
+            raise SystemExit(f"Invalid chore ID: {args.ref!r}")
+        try:
+            template = chore_templates.save_as_template(task_id, args.name)
+        except ValueError as e:
+            raise SystemExit(str(e))
+        if not template:
+            print(f"Chore with ID {task_id} not found.", file=stdout)
+            return 1
+        if args.json:
+            _print_json(chore_templates.template_to_dict(template), stdout)
         else:
-            print("  No plan details found for this chore.")
-        print("--------------------------------------")
-
-    except ValueError:
-        print("Invalid input. Chore ID must be a number.")
-
-
-def main():
-    """Main function to run the Chores Manager CLI."""
-    print("Welcome to the Chores Manager!")
-
-    while True:
-        print_menu()
-        choice = input("Enter your choice (1-7): ")
-
-        if choice == '1':
-            handle_add_chore()
-        elif choice == '2':
-            handle_view_chores()
-        elif choice == '3':
-            handle_update_chore_status()
-        elif choice == '4':
-            handle_delete_chore()
-        elif choice == '5':
-            handle_add_plan()
-        elif choice == '6':
-            handle_view_plan()
-        elif choice == '7':
-            print("Exiting Chores Manager. Goodbye!")
-            break
+            print(f"Template saved: {template}", file=stdout)
+        return 0
+
+    template = _find_template(args.ref)
+    if not template:
+        print(f"Template {args.ref!r} not found.", file=stdout)
+        return 1
+    if args.action == 'delete':
+        chore_templates.delete_template(template.id)
+        if args.json:
+            _print_json({'deleted': template.id}, stdout)
         else:
-            print("Invalid choice. Please enter a number between 1 and 7.")
+            print(f"Template '{template.name}' deleted.", file=stdout)
+        return 0
+
+    created = chore_templates.instantiate_template(template.id, args.due or None) or []
+    if args.json:
+        _print_json([tasks.task_to_dict(task, include_sub_tasks=False) for task in created], stdout)
+    else:
+        for task in created:
+            print(f"Chore added: {task}", file=stdout)
+    return 0
+
+
+def cmd_changes(args, stdin, stdout):
+    from chores import change_feed
+
+    if args.ack is not None:
+        if not args.consumer:
+            raise SystemExit("--ack needs --consumer.")
+        acked = change_feed.acknowledge(args.consumer, args.ack)
+        if args.json:
+            _print_json({'consumer': args.consumer, 'acked_seq': acked}, stdout)
+        else:
+            print(f"{args.consumer} has acknowledged changes up to {acked}.", file=stdout)
+        return 0
+
+    since = args.since
+    if since is None: # Continue from the consumer's last acknowledgement, or from the start
+        acked = {consumer['name']: consumer['acked_seq'] for consumer in change_feed.get_consumers()}
+        since = acked.get(args.consumer, 0)
+    result = change_feed.changes_since(since, args.limit)
+    if args.json:
+        _print_json(result, stdout)
+    elif result['reset']:
+        print(f"Changes before {result['last_seq']} were compacted; reload everything, then continue from there.", file=stdout)
+    else:
+        for change in result['changes']:
+            print(f"{change['seq']}: {change['op']} {change['entity']} {change['id']} (chore {change['task_id']})", file=stdout)
+        more = " (more available)" if result['has_more'] else ""
+        print(f"{len(result['changes'])} change(s), last seq {result['last_seq']}{more}.", file=stdout)
+    return 0
+
+
+def cmd_shards(args, stdin, stdout):
+    if not database.SHARD_DIRECTORY:
+        raise SystemExit("No shard directory: pass --shard-dir or set CHORES_SHARD_DIRECTORY.")
+    results = []
+    exit_code = 0
+    if args.action == 'list':
+        for tenant_id in database.list_shards():
+            with database.using_tenant(tenant_id):
+                conn = database.get_db_connection()
+                version = database.schema_version(conn)
+                chore_count = conn.execute("SELECT COUNT(*) FROM tasks").fetchone()[0]
+                conn.close()
+            results.append({'id': tenant_id, 'schema_version': version, 'chores': chore_count})
+    elif args.action == 'create':
+        for tenant_id in _read_lines(args.ids, stdin):
+            try:
+                database.create_shard(tenant_id)
+                results.append({'id': tenant_id, 'ok': True})
+            except (ValueError, FileExistsError) as e:
+                results.append({'id': tenant_id, 'ok': False, 'error': str(e)})
+                exit_code = 1
+    else: # migrate; all shards when no ids are given
+        for tenant_id in _read_lines(args.ids, stdin) or database.list_shards():
+            try:
+                old_version, new_version = database.migrate_shard(tenant_id)
+                results.append({'id': tenant_id, 'ok': True, 'from_version': old_version, 'to_version': new_version})
+            except ValueError as e:
+                results.append({'id': tenant_id, 'ok': False, 'error': str(e)})
+                exit_code = 1
+            except database.UnknownTenantError:
+                results.append({'id': tenant_id, 'ok': False, 'error': "unknown household"})
+                exit_code = 1
+
+    if args.json:
+        _print_json(results, stdout)
+    else:
+        for result in results:
+            if args.action == 'list':
+                print(f"{result['id']}: {result['chores']} chore(s), schema v{result['schema_version']}", file=stdout)
+            elif not result['ok']:
+                print(f"{result['id']}: failed ({result['error']})", file=stdout)
+            elif args.action == 'create':
+                print(f"{result['id']}: created", file=stdout)
+            else:
+                print(f"{result['id']}: schema v{result['from_version']} -> v{result['to_version']}", file=stdout)
+    return exit_code
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='chores', description="Manage household chores from the command line.")
+    parser.add_argument('--shard-dir', default=os.environ.get('CHORES_SHARD_DIRECTORY'),
+                        help="Directory of per-household databases (default: CHORES_SHARD_DIRECTORY)")
+    parser.add_argument('--household', help="Operate on this household's database instead of the default one")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    def add_command(name, handler, help_text):
+        subparser = subparsers.add_parser(name, help=help_text)
+        subparser.add_argument('--json', action='store_true', help="Machine-readable JSON output")
+        subparser.set_defaults(handler=handler)
+        return subparser
+
+    add = add_command('add', cmd_add, "Add one or more chores")
+    add.add_argument('descriptions', nargs='+', help="Chore descriptions, or '-' to read one per line from stdin")
+    add.add_argument('--notes', default="")
+    add.add_argument('--due', type=date.fromisoformat, help="Due date (YYYY-MM-DD)")
+    add.add_argument('--materials', default="", help="Comma-separated materials")
+
+    listing = add_command('list', cmd_list, "List chores")
+    listing.add_argument('--status', choices=VALID_STATUSES)
+
+    status = add_command('status', cmd_status, "Set the status of one or more chores")
+    status.add_argument('status', choices=VALID_STATUSES)
+    status.add_argument('ids', nargs='+', help="Chore ids, or '-' to read them from stdin")
+
+    delete = add_command('delete', cmd_delete, "Delete one or more chores")
+    delete.add_argument('ids', nargs='+', help="Chore ids, or '-' to read them from stdin")
+
+    import_ = add_command('import', cmd_import, "Import chores from a JSON export")
+    import_.add_argument('file', help="JSON file, or '-' for stdin")
+
+    export = add_command('export', cmd_export, "Export all chores as JSON")
+    export.add_argument('file', nargs='?', help="Output file (default: stdout)")
+
+    suggest = add_command('suggest', cmd_suggest, "Get AI sub-task and material suggestions")
+    suggest.add_argument('ids', nargs='+', help="Chore ids, or '-' to read them from stdin")
+    suggest.add_argument('--apply', action='store_true', help="Add new (non-duplicate) suggestions to the chores")
+    suggest.add_argument('--provider', default=os.environ.get('CHORES_AI_PROVIDER'),
+                         help="Suggestion provider or fallback chain, e.g. 'gemini,heuristic' or 'replay:recorded.json' "
+                              "(default: $CHORES_AI_PROVIDER, else gemini)")
+
+    archive = add_command('archive', cmd_archive, "Move chores completed a while ago to the archive")
+    archive.add_argument('--older-than-days', type=float, default=30, help="Archive chores completed more than this many days ago")
+    archive.add_argument('--batch-size', type=int, default=200, help="Chores moved per transaction")
+    archive.add_argument('--all-households', action='store_true', help="Archive in every household's database")
+
+    restore = add_command('restore', cmd_restore, "Move archived chores back to the active list")
+    restore.add_argument('ids', nargs='+', help="Chore ids, or '-' to read them from stdin")
+
+    maintenance = add_command('maintenance', cmd_maintenance, "Delete orphaned rows, update statistics and reclaim space")
+    maintenance.add_argument('--batch-size', type=int, default=500, help="Orphans deleted per transaction")
+    maintenance.add_argument('--all-households', action='store_true', help="Run on every household's database")
+    maintenance.add_argument('--convert-vacuum', action='store_true',
+                             help="Enable incremental vacuum on an older database file (one full VACUUM; rewrites the file)")
+
+    template = add_command('template', cmd_template, "Save chores as templates and create chores from them")
+    template.add_argument('action', choices=['save', 'use', 'list', 'delete'])
+    template.add_argument('ref', nargs='?', help="save: chore id; use/delete: template id or name")
+    template.add_argument('--name', help="save: template name (default: the chore's description)")
+    template.add_argument('--due', type=date.fromisoformat, action='append',
+                          help="use: due date (YYYY-MM-DD) of a chore to create; repeat for several")
+
+    changes = add_command('changes', cmd_changes, "Print what changed since a sequence number, for mirrors")
+    changes.add_argument('--since', type=int, help="Last seq already applied (default: the consumer's acknowledged seq, or 0)")
+    changes.add_argument('--limit', type=int, default=500, help="Log entries per call")
+    changes.add_argument('--consumer', help="Name of the mirror reading the log")
+    changes.add_argument('--ack', type=int, metavar='SEQ', help="Acknowledge that --consumer applied everything up to SEQ")
+
+    shards = add_command('shards', cmd_shards, "Create, migrate and list household databases")
+    shards.add_argument('action', choices=['create', 'migrate', 'list'])
+    shards.add_argument('ids', nargs='*', help="Household ids, or '-' to read them from stdin (migrate: default all)")
+
+    return parser
+
+
+def main(argv=None, stdin=None, stdout=None):
+    """Runs the Chores Manager CLI. Returns the process exit code."""
+    args = build_parser().parse_args(argv)
+    if args.shard_dir:
+        database.configure(shard_directory=args.shard_dir)
+    if not args.household:
+        database.init_db() # Creates a missing schema and applies pending migrations
+        return args.handler(args, stdin or sys.stdin, stdout or sys.stdout)
+    if not database.SHARD_DIRECTORY:
+        raise SystemExit("--household needs a shard directory (--shard-dir or CHORES_SHARD_DIRECTORY).")
+    try:
+        known = database.shard_exists(args.household)
+    except ValueError as e:
+        raise SystemExit(str(e))
+    if not known:
+        raise SystemExit(f"Unknown household: {args.household}")
+    with database.using_tenant(args.household):
+        database.init_db() # The household's database, which may predate the latest migrations
+        return args.handler(args, stdin or sys.stdin, stdout or sys.stdout)
+
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -0,0 +1,171 @@
+# Production entry point for the Chores Manager web application.
+#
+#   python serve.py --workers 4 --threads 8 --port 8000 --database /var/lib/chores/chores_app.db
+#
+# The master process initializes the database once, opens the listening socket and
+# forks worker processes that share it. Each worker builds its own app (and so opens
+# its own SQLite connections) only after the fork. Every worker handles requests on a
+# bounded thread pool. On SIGTERM/SIGINT workers stop accepting connections, let
+# in-flight requests and AI calls finish (up to --drain-timeout), then exit.
+
+import argparse
+import os
+import secrets
+import signal
+import socket
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.serving import BaseWSGIServer
+
+from chores import ai_assistant, change_bus, database, prefetch
+
+
+class PooledWSGIServer(BaseWSGIServer):
+    """A WSGI server that handles requests on a fixed-size thread pool and can drain them."""
+
+    multithread = True
+
+    def __init__(self, host, port, app, threads, fd=None):
+        super().__init__(host, port, app, fd=fd)
+        self._executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='chores-http')
+        self._in_flight = 0
+        self._in_flight_changed = threading.Condition()
+
+    def process_request(self, request, client_address):
+        with self._in_flight_changed:
+            self._in_flight += 1
+        self._executor.submit(self._process_request_in_thread, request, client_address)
+
+    def _process_request_in_thread(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            with self._in_flight_changed:
+                self._in_flight -= 1
+                self._in_flight_changed.notify_all()
+
+    def drain(self, timeout):
+        """Waits for in-flight requests to finish. Returns False if timeout expired first."""
+        with self._in_flight_changed:
+            drained = self._in_flight_changed.wait_for(lambda: self._in_flight == 0, timeout=timeout)
+        self._executor.shutdown(wait=drained)
+        return drained
+
+
+def _build_config(args):
+    return {
+        'SECRET_KEY': args.secret_key,
+        'DATABASE': args.database,
+        'SHARD_DIRECTORY': args.shard_dir,
+        'DATABASE_JOURNAL_MODE': 'WAL', # Readers in one worker don't block behind a writer in another
+        'INIT_DB': False, # Done once by the master before forking
+        'DATABASE_SERIALIZE_WRITES': args.serialize_writes,
+        'DATABASE_GROUP_COMMIT_WINDOW': args.group_commit_ms / 1000,
+        'EVENTS_MAX_STREAMS': max(args.threads // 2, 1), # Each /events stream holds a request thread
+    }
+
+
+def run_worker(listen_socket, args, worker_id):
+    """Serves requests in this process until SIGTERM/SIGINT, then drains and returns."""
+    from web_app import create_app # Imported after fork so each worker sets itself up independently
+
+    app = create_app(_build_config(args))
+    host, port = listen_socket.getsockname()[:2]
+    server = PooledWSGIServer(host, port, app, threads=args.threads, fd=listen_socket.fileno())
+
+    def request_shutdown(signum, frame):
+        # shutdown() blocks until serve_forever() returns, so it can't run on this (the serving) thread.
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, request_shutdown)
+    signal.signal(signal.SIGINT, request_shutdown)
+
+    print(f"[serve] worker {worker_id} (pid {os.getpid()}) serving on http://{host}:{port} "
+          f"with {args.threads} threads")
+    server.serve_forever()
+
+    print(f"[serve] worker {worker_id} draining (up to {args.drain_timeout}s)...")
+    change_bus.close_all() # Open /events streams end now; browsers reconnect to another worker
+    prefetch.disable() # Queued prefetches are dropped; calls in progress count as in-flight AI calls
+    requests_drained = server.drain(args.drain_timeout)
+    ai_calls_drained = ai_assistant.wait_for_in_flight_calls(args.drain_timeout)
+    server.server_close()
+    if not (requests_drained and ai_calls_drained):
+        print(f"[serve] worker {worker_id} exiting with work still in flight.")
+        return 1
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the Chores Manager web app with multiple workers.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--workers', type=int, default=2, help="Worker processes (forked; 1 = no fork)")
+    parser.add_argument('--threads', type=int, default=8, help="Request threads per worker")
+    parser.add_argument('--database', default=os.environ.get('CHORES_DATABASE'),
+                        help="SQLite database file (default: CHORES_DATABASE or the project's chores_app.db)")
+    parser.add_argument('--shard-dir', default=os.environ.get('CHORES_SHARD_DIRECTORY'),
+                        help="Directory of per-household databases (default: CHORES_SHARD_DIRECTORY; none = single database)")
+    parser.add_argument('--serialize-writes', action='store_true',
+                        help="Perform each worker's writes on a single writer thread (less lock contention)")
+    parser.add_argument('--group-commit-ms', type=float, default=0.0,
+                        help="Commit status changes and sub-task toggles arriving within this many ms together (0 = off)")
+    parser.add_argument('--drain-timeout', type=float, default=30.0,
+                        help="Seconds to wait for in-flight requests and AI calls on shutdown")
+    args = parser.parse_args(argv)
+
+    args.secret_key = os.environ.get('CHORES_SECRET_KEY')
+    if not args.secret_key:
+        # Generated before forking so all workers accept each other's session cookies.
+        print("[serve] CHORES_SECRET_KEY not set; sessions will not survive a restart.")
+        args.secret_key = secrets.token_hex(32)
+
+    # Schema setup happens once, here, before any worker exists. No connection stays open across the fork.
+    # (Household shards are migrated by each worker the first time it opens them.)
+    database.configure(database_file=args.database, journal_mode='WAL', shard_directory=args.shard_dir)
+    database.init_db()
+    database.close_connections()
+
+    listen_socket = socket.create_server((args.host, args.port), backlog=128, reuse_port=False)
+    listen_socket.set_inheritable(True)
+
+    if args.workers <= 1 or not hasattr(os, 'fork'):
+        return run_worker(listen_socket, args, worker_id=0)
+
+    children = []
+    for worker_id in range(args.workers):
+        pid = os.fork()
+        if pid == 0:
+            exit_code = 1
+            try:
+                exit_code = run_worker(listen_socket, args, worker_id)
+            finally:
+                os._exit(exit_code)
+        children.append(pid)
+
+    def forward_signal(signum, frame):
+        for child_pid in children:
+            try:
+                os.kill(child_pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, forward_signal)
+    signal.signal(signal.SIGINT, forward_signal)
+
+    exit_code = 0
+    for child_pid in children:
+        _, status = os.waitpid(child_pid, 0)
+        if os.waitstatus_to_exitcode(status) != 0:
+            exit_code = 1
+    listen_socket.close()
+    return exit_code
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,121 @@
+// Live updates for the chore list and chore detail pages. Listens to the /events stream
+// (Server-Sent Events) and patches the list in place: status, description and due date changes,
+// deletions and sub-task counts. Changes it can't patch (new chores, edits on a detail page)
+// show a notice with a reload link, instead of the page having to be refreshed to find out.
+(function () {
+    'use strict';
+
+    var script = document.currentScript;
+    if (!script || !window.EventSource) {
+        return;
+    }
+    // Shared with sub_tasks.js: the changes this page makes itself are not streamed back to it.
+    var clientId = window.choresClientId || (window.choresClientId = Math.random().toString(36).slice(2));
+    var taskId = script.dataset.taskId ? Number(script.dataset.taskId) : null;
+    var url = script.dataset.eventsUrl + '?client_id=' + encodeURIComponent(clientId) +
+        (taskId !== null ? '&task_id=' + taskId : '');
+    var notice = null;
+
+    function showNotice(text) {
+        if (!notice) {
+            notice = document.createElement('p');
+            notice.className = 'live-update-notice';
+            notice.appendChild(document.createElement('span'));
+            var reload = document.createElement('a');
+            reload.href = window.location.href;
+            reload.textContent = 'Reload';
+            notice.appendChild(reload);
+            var container = document.querySelector('.container');
+            container.insertBefore(notice, container.firstChild);
+        }
+        notice.firstChild.textContent = text + ' ';
+    }
+
+    function rowFor(id) {
+        return document.querySelector('tr[data-task-id="' + id + '"]');
+    }
+
+    function setField(row, field, value) {
+        var element = row.querySelector('[data-field="' + field + '"]');
+        if (!element) {
+            return;
+        }
+        if (element.tagName === 'SELECT') {
+            element.value = value;
+        } else {
+            element.textContent = value;
+        }
+    }
+
+    function patchList(change) {
+        var ids = change.task_ids || [];
+        switch (change.kind) {
+        case 'task.deleted':
+        case 'task.archived':
+            if (change.task_ids === null) {
+                showNotice('Some chores were archived.');
+            }
+            ids.forEach(function (id) {
+                var row = rowFor(id);
+                if (row) {
+                    row.remove();
+                }
+            });
+            break;
+        case 'task.updated':
+            var fields = change.task || change.changes || {};
+            ids.forEach(function (id) {
+                var row = rowFor(id);
+                if (!row) {
+                    return;
+                }
+                if ('status' in fields) {
+                    setField(row, 'status', fields.status);
+                }
+                if ('description' in fields) {
+                    setField(row, 'description', fields.description);
+                }
+                if ('due_date' in fields) {
+                    setField(row, 'due_date', fields.due_date || 'N/A');
+                }
+            });
+            break;
+        case 'sub_task.created':
+        case 'sub_task.deleted':
+            ids.forEach(function (id) {
+                var count = rowFor(id) && rowFor(id).querySelector('[data-field="sub_task_count"]');
+                if (count) {
+                    count.textContent = Number(count.textContent) + (change.kind === 'sub_task.created' ? 1 : -1);
+                }
+            });
+            break;
+        case 'sub_task.updated':
+        case 'sub_task.moved':
+            break; // The list only shows sub-task counts
+        default: // task.created, tasks.cleared
+            showNotice('Chores were added or changed.');
+        }
+    }
+
+    function patchDetail(change) {
+        if (change.kind === 'task.deleted' || change.kind === 'task.archived' || change.kind === 'tasks.cleared') {
+            showNotice('This chore was deleted or archived.');
+        } else {
+            showNotice('This chore was changed by someone else.');
+        }
+    }
+
+    var source = new EventSource(url);
+    source.addEventListener('change', function (event) {
+        var change = JSON.parse(event.data);
+        if (taskId !== null) {
+            patchDetail(change);
+        } else {
+            patchList(change);
+        }
+    });
+    source.addEventListener('resync', function () {
+        source.close(); // Too far behind to patch; the reload link opens a fresh stream
+        showNotice('Many changes were made.');
+    });
+}());
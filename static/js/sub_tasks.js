@@ -0,0 +1,92 @@
+// Progressive enhancement for the chore detail page: sub-task forms (add, toggle, move, delete)
+// are posted with fetch and only the rows that changed are swapped in, instead of a redirect and
+// a full page reload. Without JavaScript, or if anything goes wrong, the forms post normally.
+(function () {
+    'use strict';
+
+    var section = document.querySelector('.subtasks-section');
+    if (!section || !window.fetch || !window.FormData) {
+        return;
+    }
+    var list = section.querySelector('.sub-task-list');
+    // Shared with live_updates.js: changes made here are left out of this page's /events stream.
+    var clientId = window.choresClientId || (window.choresClientId = Math.random().toString(36).slice(2));
+    var placeholder = section.querySelector('.no-sub-tasks');
+
+    function rowFor(id) {
+        return list.querySelector('li[data-sub-task-id="' + id + '"]');
+    }
+
+    function showMessage(message, category) {
+        var container = document.querySelector('.container');
+        var messages = container.querySelector('.flash-messages');
+        if (!messages) {
+            messages = document.createElement('ul');
+            messages.className = 'flash-messages';
+            container.insertBefore(messages, container.querySelector('h2')); // Where base.html puts them
+        }
+        var item = document.createElement('li');
+        item.className = 'flash-' + category;
+        item.textContent = message;
+        messages.innerHTML = '';
+        messages.appendChild(item);
+    }
+
+    function apply(data) {
+        data.removed.forEach(function (id) {
+            var row = rowFor(id);
+            if (row) {
+                row.remove();
+            }
+        });
+        data.sub_tasks.forEach(function (subTask) {
+            var template = document.createElement('template');
+            template.innerHTML = subTask.html.trim();
+            var row = rowFor(subTask.id);
+            if (row) {
+                row.replaceWith(template.content.firstChild);
+            } else {
+                list.appendChild(template.content.firstChild);
+            }
+        });
+        data.order.forEach(function (id) { // appendChild moves existing rows into the server's order
+            var row = rowFor(id);
+            if (row) {
+                list.appendChild(row);
+            }
+        });
+        placeholder.hidden = data.order.length > 0;
+        showMessage(data.message, data.category);
+    }
+
+    section.addEventListener('submit', function (event) {
+        var form = event.target;
+        if (!form.hasAttribute('data-sub-task-action')) {
+            return;
+        }
+        event.preventDefault();
+        var buttons = form.querySelectorAll('button');
+        buttons.forEach(function (button) { button.disabled = true; });
+
+        fetch(form.action, {
+            method: 'POST',
+            body: new FormData(form),
+            headers: {'X-Requested-With': 'XMLHttpRequest', 'Accept': 'application/json', 'X-Client-Id': clientId},
+            credentials: 'same-origin'
+        }).then(function (response) {
+            return response.json().then(function (data) {
+                if (!response.ok) {
+                    showMessage(data.error, 'error');
+                } else {
+                    apply(data);
+                    if (form.querySelector('input[type="text"]')) {
+                        form.reset(); // The add form, ready for the next sub-task
+                    }
+                }
+                buttons.forEach(function (button) { button.disabled = false; });
+            });
+        }).catch(function () {
+            form.submit(); // Fall back to the full-page post and redirect
+        });
+    });
+}());
@@ -1 +1,31 @@
 # This file makes the 'tests' directory a Python package.
+
+import unittest
+
+from chores import database, storage
+
+# The suite runs against the backend named by CHORES_STORAGE_BACKEND (default 'sqlite').
+# Tests of features that only exist on SQLite (archive, shards, the database file itself) use this.
+sqlite_only = unittest.skipUnless(storage.STORAGE_BACKEND == 'sqlite', "needs the SQLite storage backend")
+
+TEST_DATABASE = "file:chores-tests?mode=memory&cache=shared"
+
+
+class TransactionalTestCase(unittest.TestCase):
+    """
+    Runs against a shared-cache in-memory database whose schema is created once per class.
+    Each test runs inside database.rolled_back_transaction(), so whatever it writes is rolled
+    back afterwards instead of the tables being dropped and recreated.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.enterClassContext(database.using_database(TEST_DATABASE))
+        cls.addClassCleanup(database.discard_memory_database, TEST_DATABASE)
+        cls.addClassCleanup(database.close_connections)
+        database.init_db()
+
+    def setUp(self):
+        super().setUp()
+        self.enterContext(database.rolled_back_transaction())
@@ -0,0 +1,250 @@
+# Tests for the suggestion providers in chores.ai_assistant and the deadline, concurrency limit
+# and circuit breaker around calls to Gemini.
+
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from chores import ai_assistant
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeModel:
+    """Stands in for genai.GenerativeModel: answers, fails or hangs (until released), on demand."""
+
+    ANSWER = "New Sub-tasks:\n1. Wipe counters\n2. Mop floor\n\nSuggested Materials:\nSponge, Mop"
+
+    def __init__(self, mode='answer'):
+        self.mode = mode
+        self.released = threading.Event()
+        self.calls = 0
+        self.timeouts = []
+
+    def generate_content(self, prompt, request_options=None):
+        self.calls += 1
+        self.timeouts.append(request_options['timeout'])
+        if self.mode == 'hang':
+            self.released.wait(5)
+            raise TimeoutError("transport timeout")
+        if self.mode == 'fail':
+            raise ConnectionError("upstream unavailable")
+        return SimpleNamespace(text=self.ANSWER)
+
+    def genai(self):
+        return SimpleNamespace(configure=lambda api_key: None, GenerativeModel=lambda name: self)
+
+
+class TestCircuitBreaker(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.breaker = ai_assistant.CircuitBreaker(failure_threshold=3, reset_timeout=30, clock=self.clock)
+
+    def test_opens_after_consecutive_failures(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.breaker.record_success() # Resets the count
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, 'closed')
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, 'open')
+        self.assertFalse(self.breaker.allow())
+        self.assertEqual(self.breaker.retry_after(), 30)
+
+    def test_half_open_lets_one_probe_through(self):
+        for _ in range(3):
+            self.breaker.record_failure()
+        self.clock.now = 30
+        self.assertEqual(self.breaker.state, 'half_open')
+        self.assertTrue(self.breaker.allow())
+        self.assertFalse(self.breaker.allow()) # The probe is still running
+
+        self.breaker.record_failure() # The probe failed: open for another reset_timeout
+        self.assertEqual(self.breaker.state, 'open')
+        self.clock.now = 60
+        self.assertTrue(self.breaker.allow())
+        self.breaker.record_success()
+        self.assertEqual(self.breaker.state, 'closed')
+        self.assertTrue(self.breaker.allow())
+
+    def test_released_probe_lets_another_through(self):
+        for _ in range(3):
+            self.breaker.record_failure()
+        self.clock.now = 30
+        self.assertTrue(self.breaker.allow())
+        self.breaker.release()
+        self.assertTrue(self.breaker.allow())
+
+
+class TestCallGuard(unittest.TestCase):
+
+    def test_deadline_frees_the_caller_but_not_the_slot(self):
+        guard = ai_assistant.CallGuard(timeout=0.05, max_concurrent=1, queue_timeout=0.01)
+        released = threading.Event()
+        self.addCleanup(released.set)
+        started = time.monotonic()
+        with self.assertRaises(ai_assistant.AICallError) as caught:
+            guard.call(lambda seconds_left: released.wait(5))
+        self.assertEqual(caught.exception.code, 'timeout')
+        self.assertLess(time.monotonic() - started, 1)
+
+        # The hung call still holds the only slot.
+        with self.assertRaises(ai_assistant.AICallError) as caught:
+            guard.call(lambda seconds_left: "answer")
+        self.assertEqual(caught.exception.code, 'busy')
+
+        released.set()
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline:
+            try:
+                self.assertEqual(guard.call(lambda seconds_left: "answer"), "answer")
+                break
+            except ai_assistant.AICallError:
+                time.sleep(0.01)
+        else:
+            self.fail("the slot was never released")
+
+    def test_fn_is_given_the_time_left(self):
+        guard = ai_assistant.CallGuard(timeout=10)
+        seconds_left = guard.call(lambda seconds_left: seconds_left)
+        self.assertTrue(9 < seconds_left <= 10)
+
+    def test_errors_open_the_circuit(self):
+        guard = ai_assistant.CallGuard(breaker=ai_assistant.CircuitBreaker(failure_threshold=2, reset_timeout=60))
+        calls = []
+        def failing(seconds_left):
+            calls.append(seconds_left)
+            raise ConnectionError("down")
+        for _ in range(2):
+            with self.assertRaises(ConnectionError):
+                guard.call(failing)
+        with self.assertRaises(ai_assistant.AICallError) as caught:
+            guard.call(failing)
+        self.assertEqual(caught.exception.code, 'circuit_open')
+        self.assertEqual(len(calls), 2) # Failed fast without calling
+
+
+class TestSuggestionErrors(unittest.TestCase):
+
+    def setUp(self):
+        self.addCleanup(ai_assistant.configure_guard)
+        self.enterContext(ai_assistant.using_provider('gemini'))
+        self.enterContext(mock.patch.dict(os.environ, {'GOOGLE_API_KEY': 'test-key'}))
+
+    def suggest(self, model):
+        with mock.patch.object(ai_assistant, '_load_genai', model.genai):
+            return ai_assistant.get_subtask_and_material_suggestions("Clean the kitchen")
+
+    def test_answer_is_parsed(self):
+        ai_assistant.configure_guard(timeout=5)
+        model = FakeModel()
+        self.assertEqual(self.suggest(model), {'sub_tasks': ["Wipe counters", "Mop floor"], 'materials': ["Sponge", "Mop"]})
+        self.assertTrue(1 <= model.timeouts[0] <= 5) # The deadline reaches the transport
+
+    def test_missing_key_is_reported(self):
+        with mock.patch.dict(os.environ, {'GOOGLE_API_KEY': ''}):
+            response = ai_assistant.get_subtask_and_material_suggestions("Clean the kitchen")
+        self.assertEqual(response['error']['code'], 'no_api_key')
+        self.assertEqual((response['sub_tasks'], response['materials']), ([], []))
+        self.assertEqual(ai_assistant.suggestion_error(response), "AI features disabled: GOOGLE_API_KEY not set.")
+
+    def test_hanging_model_times_out(self):
+        ai_assistant.configure_guard(timeout=0.05)
+        model = FakeModel('hang')
+        self.addCleanup(model.released.set)
+        response = self.suggest(model)
+        self.assertEqual(response['error']['code'], 'timeout')
+        self.assertEqual(response['sub_tasks'], [])
+        self.assertIsNone(ai_assistant.suggestion_error({'sub_tasks': ["Step"], 'materials': []}))
+
+    def test_repeated_failures_fail_fast_then_recover(self):
+        guard = ai_assistant.configure_guard(failure_threshold=2, reset_timeout=60)
+        model = FakeModel('fail')
+        for _ in range(2):
+            self.assertEqual(self.suggest(model)['error']['code'], 'failed')
+        response = self.suggest(model)
+        self.assertEqual(response['error']['code'], 'circuit_open')
+        self.assertEqual(model.calls, 2)
+
+        guard.breaker.reset_timeout = 0 # Time for a probe
+        model.mode = 'answer'
+        self.assertNotIn('error', self.suggest(model))
+        self.assertEqual(guard.breaker.state, 'closed')
+
+
+class TestProviders(unittest.TestCase):
+
+    def test_heuristic_rules(self):
+        provider = ai_assistant.HeuristicProvider()
+        kitchen = provider.suggest("Clean the kitchen", [])
+        self.assertEqual(kitchen['sub_tasks'], ["Clear countertops", "Wash dishes", "Wipe surfaces"])
+        self.assertEqual(kitchen['materials'], ["Dish soap", "Sponge", "All-purpose cleaner"])
+        self.assertEqual(provider.suggest("Clean the kitchen", []), kitchen) # Deterministic
+
+        combined = provider.suggest("Fix the kitchen tap", ["wash dishes"])
+        self.assertEqual(combined['sub_tasks'], ["Clear countertops", "Wipe surfaces", "Identify problem",
+                                                 "Gather tools", "Attempt repair"])
+        self.assertIn("Toolbox", combined['materials'])
+        self.assertEqual(provider.suggest("Call grandma", []),
+                         {'sub_tasks': ["Assess task", "Break into steps", "Execute steps"], 'materials': []})
+
+    def test_replay_answers_from_recordings(self):
+        temp_dir = self.enterContext(tempfile.TemporaryDirectory())
+        path = os.path.join(temp_dir, 'recorded.json')
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({"clean the garage": {'sub_tasks': ["Sort boxes", "Sweep"], 'materials': ["Broom"]}}, f)
+
+        provider = ai_assistant.ReplayProvider(path)
+        self.assertEqual(provider.suggest("Clean the  Garage", ["sweep"]), {'sub_tasks': ["Sort boxes"], 'materials': ["Broom"]})
+        self.assertEqual(provider.suggest("Wash the car", [])['error']['code'], 'not_recorded')
+
+    def test_replay_records_misses(self):
+        temp_dir = self.enterContext(tempfile.TemporaryDirectory())
+        path = os.path.join(temp_dir, 'recorded.json')
+        recorder = ai_assistant.ReplayProvider(path, record=ai_assistant.HeuristicProvider())
+        answer = recorder.suggest("Wash the car", [])
+
+        self.assertEqual(ai_assistant.ReplayProvider(path).suggest("wash the car", []), answer)
+
+    def test_fallback_chain(self):
+        with mock.patch.dict(os.environ, {'GOOGLE_API_KEY': ''}):
+            chain = ai_assistant.build_provider('gemini, heuristic')
+            self.assertEqual(chain.name, 'gemini,heuristic')
+            self.assertEqual(chain.suggest("Clean the kitchen", [])['sub_tasks'][0], "Clear countertops")
+
+            temp_dir = self.enterContext(tempfile.TemporaryDirectory())
+            path = os.path.join(temp_dir, 'none-recorded.json')
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write('{}')
+            with ai_assistant.using_provider(f'gemini,replay:{path}'):
+                response = ai_assistant.get_subtask_and_material_suggestions("Clean the kitchen")
+            self.assertEqual(response['error']['code'], 'no_api_key') # The first provider's error
+
+    def test_providers_must_implement_suggest(self):
+        class Unfinished(ai_assistant.SuggestionProvider):
+            name = 'unfinished'
+
+        with self.assertRaises(TypeError):
+            Unfinished()
+
+    def test_bad_specs_are_rejected(self):
+        with self.assertRaises(ValueError):
+            ai_assistant.build_provider('gemini,oracle')
+        with self.assertRaises(ValueError):
+            ai_assistant.build_provider('replay')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+# Tests for the task_events history and the completion statistics computed from it.
+
+import unittest
+from datetime import datetime, timezone
+from unittest import mock
+
+from chores import analytics, archive, database, storage, tasks
+from tests import TransactionalTestCase
+
+NOW = datetime(2024, 6, 12, 9, 0, tzinfo=timezone.utc) # A Wednesday; two weeks back start on 2024-06-03
+
+
+class TestAnalytics(TransactionalTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.enterContext(storage.using_backend('sqlite')) # The history is written by SQLite triggers
+
+    def events(self, task_id):
+        conn = database.get_db_connection()
+        rows = conn.execute("SELECT kind, sub_task_id, old_value, new_value FROM task_events "
+                            "WHERE task_id = ? ORDER BY id", (task_id,)).fetchall()
+        conn.close()
+        return [tuple(row) for row in rows]
+
+    def record(self, *events):
+        """Inserts (task_id, kind, new_value, ts, due_date) events with explicit timestamps."""
+        database.run_write(lambda conn: conn.executemany(
+            "INSERT INTO task_events (task_id, kind, new_value, ts, due_date) VALUES (?, ?, ?, ?, ?)", events))
+
+    def test_transitions_are_recorded(self):
+        task = tasks.add_task("Tracked")
+        sub_task = tasks.add_sub_task(task.id, "Step")
+        tasks.update_task_status(task.id, "in progress")
+        tasks.update_task_status(task.id, "completed")
+        tasks.update_task_status(task.id, "completed") # No change, no event
+        tasks.update_task_details(task.id, notes="Not a transition")
+        tasks.toggle_sub_task(sub_task['id'])
+        archive.archive_tasks([task.id])
+        archive.restore_task(task.id) # Inserted again, but not created again
+        tasks.delete_task(task.id) # History outlives the chore
+
+        self.assertEqual(self.events(task.id), [
+            ('created', None, None, 'pending'),
+            ('status', None, 'pending', 'in progress'),
+            ('status', None, 'in progress', 'completed'),
+            ('sub_task', sub_task['id'], '0', '1'),
+        ])
+
+    def test_completion_stats(self):
+        self.record(
+            (101, 'created', 'pending', '2024-06-01T00:00:00Z', None), # Created before the period
+            (101, 'status', 'completed', '2024-06-04T12:00:00Z', '2024-06-03'), # Late: lead 84 h
+            (102, 'created', 'pending', '2024-06-10T00:00:00Z', '2024-06-10'),
+            (102, 'status', 'completed', '2024-06-10T06:00:00Z', '2024-06-10'), # On time: lead 6 h
+            (102, 'status', 'pending', '2024-06-10T07:00:00Z', '2024-06-10'),
+            (102, 'status', 'completed', '2024-06-10T20:00:00Z', '2024-06-10'), # Counted again, same lead
+            (103, 'status', 'completed', '2024-05-20T00:00:00Z', None), # Before the period
+            (104, 'status', 'completed', '2024-06-20T00:00:00Z', None), # After "now"
+        )
+        database.run_write(lambda conn: conn.executemany(
+            "INSERT INTO task_events (task_id, sub_task_id, kind, new_value, ts) VALUES (?, ?, 'sub_task', ?, ?)",
+            [(101, 1, '1', '2024-06-05T00:00:00Z'), (101, 1, '0', '2024-06-05T01:00:00Z')]))
+        tasks.add_task("Open and overdue", due_date=datetime(2024, 6, 1).date())
+        tasks.add_task("Open")
+
+        stats = analytics.completion_stats(weeks=2, now=NOW)
+        self.assertEqual(stats['weeks'], [
+            {'week_start': '2024-06-03', 'completed': 1, 'sub_tasks_completed': 1, 'with_due_date': 1,
+             'overdue': 1, 'overdue_rate': 1.0},
+            {'week_start': '2024-06-10', 'completed': 2, 'sub_tasks_completed': 0, 'with_due_date': 2,
+             'overdue': 0, 'overdue_rate': 0.0},
+        ])
+        self.assertEqual((stats['completed'], stats['overdue_rate']), (3, 0.333))
+        self.assertEqual(stats['lead_time_hours'], {'count': 2, 'mean': 45.0, 'median': 45.0, 'p90': 76.2})
+        self.assertEqual((stats['open'], stats['open_overdue']), (2, 1))
+
+    def test_empty_history(self):
+        stats = analytics.completion_stats(weeks=3, now=NOW)
+        self.assertEqual([week['week_start'] for week in stats['weeks']], ['2024-05-27', '2024-06-03', '2024-06-10'])
+        self.assertEqual((stats['completed'], stats['overdue_rate']), (0, None))
+        self.assertEqual(stats['lead_time_hours']['count'], 0)
+
+    @unittest.skipIf(analytics._load_numpy() is None, "numpy is not installed")
+    def test_numpy_and_python_aggregation_agree(self):
+        for n in range(300):
+            created = f"2024-05-{1 + n % 28:02d}T{n % 24:02d}:00:00Z"
+            self.record((1000 + n, 'created', 'pending', created, None),
+                        (1000 + n, 'status', 'completed', f"2024-06-{1 + n % 11:02d}T{n % 24:02d}:30:00Z",
+                         f"2024-06-{1 + n % 7:02d}" if n % 3 else None))
+        vectorized = analytics.completion_stats(weeks=3, now=NOW)
+        with mock.patch.object(analytics, '_load_numpy', return_value=None):
+            self.assertEqual(analytics.completion_stats(weeks=3, now=NOW), vectorized)
+
+if __name__ == '__main__':
+    unittest.main()
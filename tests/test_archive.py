@@ -0,0 +1,94 @@
+# Tests for moving completed chores to the archive tables and back.
+
+import unittest
+from datetime import datetime, timedelta, timezone
+
+from chores import archive, database, storage, tasks
+from tests import TransactionalTestCase
+
+
+class TestArchive(TransactionalTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.enterContext(storage.using_backend('sqlite')) # The archive tables exist only in SQLite
+
+    def complete(self, task, days_ago):
+        """Marks a task completed `days_ago` days ago."""
+        tasks.update_task_status(task.id, "completed")
+        completed_at = (datetime.now(timezone.utc) - timedelta(days=days_ago)).strftime('%Y-%m-%dT%H:%M:%SZ')
+        conn = database.get_db_connection()
+        conn.execute("UPDATE tasks SET completed_at = ? WHERE id = ?", (completed_at, task.id))
+        conn.commit()
+        conn.close()
+
+    def completed_at(self, task_id):
+        conn = database.get_db_connection()
+        row = conn.execute("SELECT completed_at FROM tasks WHERE id = ?", (task_id,)).fetchone()
+        conn.close()
+        return row['completed_at']
+
+    def test_completed_at_follows_status(self):
+        task = tasks.add_task("Tracked")
+        self.assertIsNone(self.completed_at(task.id))
+        tasks.update_task_status(task.id, "completed")
+        self.assertIsNotNone(self.completed_at(task.id))
+        tasks.bulk_update_status([task.id], "pending")
+        self.assertIsNone(self.completed_at(task.id))
+        imported = tasks.bulk_add_tasks([{'description': "Imported done", 'status': "completed"}])
+        self.assertIsNotNone(self.completed_at(imported[0].id))
+
+    def test_archive_moves_only_old_completed_chores(self):
+        old = tasks.add_task("Old and done")
+        tasks.add_sub_task(old.id, "Old step")
+        recent = tasks.add_task("Recently done")
+        pending = tasks.add_task("Still to do")
+        self.complete(old, days_ago=60)
+        self.complete(recent, days_ago=1)
+
+        self.assertEqual(archive.archive_completed(), 1) # Default cutoff: 30 days
+        self.assertEqual(sorted(t.id for t in tasks.get_all_tasks()), [recent.id, pending.id])
+        self.assertEqual(tasks.get_sub_tasks_for_task(old.id), [])
+
+        archived = archive.get_archived_tasks()
+        self.assertEqual([(t.id, t.description) for t in archived], [(old.id, "Old and done")])
+        self.assertEqual([st['description'] for st in archived[0].sub_tasks], ["Old step"])
+        self.assertIsNotNone(archived[0].archived_at)
+        self.assertEqual(archive.count_archived(), 1)
+
+    def test_archive_runs_in_batches(self):
+        created = tasks.bulk_add_tasks([{'description': f"Done {i}"} for i in range(7)])
+        for task in created:
+            self.complete(task, days_ago=90)
+        self.assertEqual(archive.archive_completed(batch_size=3), 7)
+        self.assertEqual(tasks.get_all_tasks(), [])
+        self.assertEqual(archive.count_archived(), 7)
+
+    def test_restore_brings_chore_back_with_its_id(self):
+        task = tasks.add_task("Restore me")
+        sub_task = tasks.add_sub_task(task.id, "Restored step")
+        self.complete(task, days_ago=45)
+        archive.archive_completed()
+
+        restored = archive.restore_task(task.id)
+        self.assertEqual((restored.id, restored.description, restored.status), (task.id, "Restore me", "completed"))
+        self.assertEqual([st['id'] for st in tasks.get_sub_tasks_for_task(task.id)], [sub_task['id']])
+        self.assertEqual(archive.count_archived(), 0)
+        self.assertIsNone(archive.restore_task(task.id)) # No longer archived
+        # The original completion time is kept, so the next run archives it again.
+        self.assertEqual(archive.archive_completed(), 1)
+
+    def test_archive_selected_chores_whatever_their_status(self):
+        pending = tasks.add_task("Not done, archived anyway")
+        tasks.add_sub_task(pending.id, "Step")
+        kept = tasks.add_task("Kept")
+
+        self.assertEqual(archive.archive_tasks([pending.id, 9999, pending.id]), {pending.id: True, 9999: False})
+        self.assertIsNone(tasks.get_task_by_id(pending.id))
+        self.assertIsNotNone(tasks.get_task_by_id(kept.id))
+        [archived] = archive.get_archived_tasks()
+        self.assertEqual((archived.id, archived.status, len(archived.sub_tasks)), (pending.id, "pending", 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
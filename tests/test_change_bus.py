@@ -0,0 +1,111 @@
+# Tests for the in-process change bus behind the /events stream.
+
+import threading
+import unittest
+
+from chores import change_bus, database, tasks
+from tests import TransactionalTestCase
+
+
+class TestChangeBus(unittest.TestCase):
+
+    def setUp(self):
+        self.bus = change_bus.ChangeBus(buffer_size=3, history_size=5, max_subscribers=2)
+
+    def test_filters_by_chore_household_and_origin(self):
+        all_chores = self.enterContext(self.bus.subscribe())
+        one_chore = self.enterContext(self.bus.subscribe(task_id=1, exclude_origin='tab-a'))
+        self.bus.publish('task.updated', [1])
+        self.bus.publish('task.updated', [2])
+        with change_bus.using_origin('tab-a'):
+            self.bus.publish('task.updated', [1])
+        with database.using_tenant('smiths'):
+            self.bus.publish('task.updated', [1]) # Another household
+        self.bus.publish('tasks.cleared', None) # Touches every chore
+
+        # Four events for a buffer of three: the oldest was dropped
+        self.assertEqual([(event.kind, event.task_ids) for event in all_chores.get(timeout=0)],
+                         [('task.updated', [2]), ('task.updated', [1]), ('tasks.cleared', None)])
+        self.assertTrue(all_chores.take_overflow())
+        self.assertFalse(all_chores.take_overflow())
+        self.assertEqual([(event.kind, event.task_ids) for event in one_chore.get(timeout=0)],
+                         [('task.updated', [1]), ('tasks.cleared', None)])
+        self.assertFalse(one_chore.take_overflow())
+
+    def test_get_waits_for_a_publish(self):
+        subscription = self.enterContext(self.bus.subscribe())
+        self.assertEqual(subscription.get(timeout=0.01), [])
+        timer = threading.Timer(0.05, self.bus.publish, args=('task.created', [7]))
+        timer.start()
+        self.addCleanup(timer.cancel)
+        self.assertEqual([event.task_ids for event in subscription.get(timeout=5)], [[7]])
+
+    def test_catch_up_from_last_event_id(self):
+        first = self.bus.publish('task.created', [1])
+        self.bus.publish('task.updated', [1])
+        with self.bus.subscribe(last_event_id=first.id) as subscription:
+            self.assertEqual([event.kind for event in subscription.get(timeout=0)], ['task.updated'])
+            self.assertFalse(subscription.take_overflow())
+        for task_id in range(10): # More than the history holds
+            self.bus.publish('task.updated', [task_id])
+        with self.bus.subscribe(last_event_id=first.id) as subscription:
+            self.assertTrue(subscription.take_overflow())
+        with self.bus.subscribe(last_event_id=10_000) as subscription: # From before a restart
+            self.assertTrue(subscription.take_overflow())
+
+    def test_subscriber_limit(self):
+        first = self.bus.subscribe()
+        self.enterContext(self.bus.subscribe())
+        with self.assertRaises(change_bus.TooManySubscribersError):
+            self.bus.subscribe()
+        first.close()
+        last = self.bus.subscribe()
+        self.assertEqual(self.bus.subscriber_count(), 2)
+        self.bus.close_all() # Server shutdown: waiting readers return at once
+        self.assertTrue(last.closed)
+        self.assertEqual(last.get(timeout=5), [])
+        self.assertEqual(self.bus.subscriber_count(), 0)
+
+
+class TestTaskChangesArePublished(TransactionalTestCase):
+
+    def setUp(self):
+        super().setUp()
+        tasks.clear_all_tasks()
+        self.subscription = self.enterContext(change_bus.subscribe())
+
+    def kinds(self):
+        return [(event.kind, event.task_ids) for event in self.subscription.get(timeout=0)]
+
+    def test_writes_publish_events(self):
+        task = tasks.add_task("Watched")
+        sub_task = tasks.add_sub_task(task.id, "Step")
+        tasks.toggle_sub_task(sub_task['id'])
+        tasks.update_task_status(task.id, "completed")
+        tasks.bulk_set_due_date([task.id, 9999], None)
+        tasks.remove_sub_task(sub_task['id'])
+        tasks.delete_task(task.id)
+        self.assertEqual(self.kinds(), [
+            ('task.created', [task.id]), ('sub_task.created', [task.id]), ('sub_task.updated', [task.id]),
+            ('task.updated', [task.id]), ('task.updated', [task.id]), ('sub_task.deleted', [task.id]),
+            ('task.deleted', [task.id]),
+        ])
+
+    def test_event_carries_the_written_row(self):
+        task = tasks.add_task("Row data")
+        self.subscription.get(timeout=0)
+        tasks.update_task_status(task.id, "in progress")
+        [event] = self.subscription.get(timeout=0)
+        self.assertEqual(event.to_dict()['task']['status'], "in progress")
+        self.assertEqual(event.to_dict()['task']['version'], 2)
+
+    def test_failed_writes_publish_nothing(self):
+        task = tasks.add_task("Stale")
+        self.subscription.get(timeout=0)
+        self.assertFalse(tasks.update_task_status(task.id, "completed", expected_version=99))
+        self.assertIsNone(tasks.remove_task(9999))
+        self.assertEqual(tasks.bulk_delete([9999]), {9999: False})
+        self.assertEqual(self.kinds(), [])
+
+if __name__ == '__main__':
+    unittest.main()
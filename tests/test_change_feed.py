@@ -0,0 +1,91 @@
+# Tests for the change log, incremental reads, acknowledgements and compaction.
+
+import unittest
+
+from chores import archive, change_feed, storage, tasks
+from tests import TransactionalTestCase
+
+
+class TestChangeFeed(TransactionalTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.enterContext(storage.using_backend('sqlite')) # The log is written by SQLite triggers
+        self.start = change_feed.latest_seq()
+
+    def ops(self, since=None):
+        result = change_feed.changes_since(self.start if since is None else since)
+        return [(change['op'], change['entity'], change['id']) for change in result['changes']]
+
+    def test_every_write_is_logged_once(self):
+        task = tasks.add_task("Logged")
+        sub_task = tasks.add_sub_task(task.id, "Step")
+        after_inserts = change_feed.latest_seq()
+        tasks.update_task_status(task.id, "completed") # Its completed_at trigger adds no second entry
+        tasks.toggle_sub_task(sub_task['id'])
+        self.assertEqual(self.ops(after_inserts), [('update', 'task', task.id), ('update', 'sub_task', sub_task['id'])])
+
+        tasks.delete_task(task.id) # The sub-task goes with it (cascade)
+        self.assertEqual(self.ops(change_feed.latest_seq() - 2), [('delete', 'sub_task', sub_task['id']), ('delete', 'task', task.id)])
+
+    def test_entries_carry_current_rows_once_per_entity(self):
+        task = tasks.add_task("Current")
+        tasks.update_task_details(task.id, notes="v2")
+        tasks.update_task_details(task.id, notes="v3")
+        gone = tasks.add_task("Gone")
+        tasks.delete_task(gone.id)
+
+        result = change_feed.changes_since(self.start)
+        self.assertEqual([(c['op'], c['id']) for c in result['changes']], [('update', task.id), ('delete', gone.id)])
+        self.assertEqual(result['changes'][0]['task']['notes'], "v3")
+        self.assertEqual(result['changes'][0]['task']['version'], 3)
+        self.assertIsNone(result['changes'][1]['task'])
+        self.assertEqual(result['last_seq'], change_feed.latest_seq())
+        self.assertFalse(result['has_more'] or result['reset'])
+
+        empty = change_feed.changes_since(result['last_seq'])
+        self.assertEqual((empty['changes'], empty['last_seq']), ([], result['last_seq']))
+
+    def test_pages(self):
+        created = tasks.bulk_add_tasks([{'description': f"Chore {n}"} for n in range(5)])
+        first = change_feed.changes_since(self.start, limit=3)
+        self.assertEqual([c['id'] for c in first['changes']], [t.id for t in created[:3]])
+        self.assertTrue(first['has_more'])
+        rest = change_feed.changes_since(first['last_seq'], limit=3)
+        self.assertEqual([c['id'] for c in rest['changes']], [t.id for t in created[3:]])
+        self.assertFalse(rest['has_more'])
+
+    def test_archive_and_restore_are_logged(self):
+        task = tasks.add_task("Archived")
+        seq = change_feed.latest_seq()
+        archive.archive_tasks([task.id])
+        archive.restore_task(task.id)
+        self.assertEqual(self.ops(seq), [('insert', 'task', task.id)]) # Deleted, then back: latest entry wins
+
+    def test_acknowledge_and_compact(self):
+        tasks.add_task("One")
+        tasks.add_task("Two")
+        middle = self.start + 1
+        self.assertEqual(change_feed.compact_changes(), 0) # No consumers: keep everything
+
+        self.assertEqual(change_feed.acknowledge("mirror", middle), middle)
+        self.assertEqual(change_feed.acknowledge("mirror", self.start), middle) # Never moves backwards
+        change_feed.acknowledge("laptop", change_feed.latest_seq())
+        self.assertEqual(change_feed.compact_changes(batch_size=1), middle)
+        self.assertEqual([c['name'] for c in change_feed.get_consumers()], ["laptop", "mirror"])
+
+        self.assertTrue(change_feed.changes_since(0)['reset']) # Entries it needed are gone
+        behind = change_feed.changes_since(middle)
+        self.assertFalse(behind['reset'])
+        self.assertEqual(len(behind['changes']), 1)
+
+        self.assertTrue(change_feed.forget_consumer("mirror"))
+        change_feed.compact_changes()
+        self.assertEqual(change_feed.changes_since(change_feed.latest_seq())['changes'], [])
+        self.assertFalse(change_feed.changes_since(change_feed.latest_seq())['reset'])
+        self.assertTrue(change_feed.changes_since(middle)['reset'])
+        with self.assertRaises(ValueError):
+            change_feed.acknowledge(" ", 1)
+
+if __name__ == '__main__':
+    unittest.main()
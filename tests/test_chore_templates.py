@@ -0,0 +1,86 @@
+# Tests for saving chores as templates and creating chores from them.
+
+import unittest
+from datetime import date
+
+from chores import chore_templates, database, storage, tasks
+from tests import TransactionalTestCase
+
+
+class TestChoreTemplates(TransactionalTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.enterContext(storage.using_backend('sqlite')) # Templates are copied with SQL
+
+    def make_chore(self):
+        task = tasks.add_task("Deep-clean kitchen", notes="Top to bottom", materials_needed_text="Degreaser\nSponges")
+        for step in ("Empty fridge", "Scrub oven", "Mop floor"):
+            tasks.add_sub_task(task.id, step)
+        tasks.toggle_sub_task(tasks.get_sub_tasks_for_task(task.id)[0]['id'])
+        tasks.update_task_status(task.id, "completed")
+        return task
+
+    def test_save_copies_chore_and_sub_tasks_in_order(self):
+        task = self.make_chore()
+        template = chore_templates.save_as_template(task.id, "Kitchen")
+        self.assertEqual(template.name, "Kitchen")
+        self.assertEqual(template.description, "Deep-clean kitchen")
+        self.assertEqual(template.notes, "Top to bottom")
+        self.assertEqual(template.materials_needed, ["Degreaser", "Sponges"])
+        self.assertEqual(template.sub_tasks, ["Empty fridge", "Scrub oven", "Mop floor"])
+        self.assertIsNotNone(template.created_at)
+
+        default_name = chore_templates.save_as_template(task.id)
+        self.assertEqual(default_name.name, "Deep-clean kitchen")
+        self.assertEqual([t.name for t in chore_templates.get_all_templates()], ["Deep-clean kitchen", "Kitchen"])
+        self.assertIsNone(chore_templates.save_as_template(9999, "Nothing"))
+
+    def test_duplicate_name_is_rejected(self):
+        task = self.make_chore()
+        chore_templates.save_as_template(task.id, "Kitchen")
+        with self.assertRaises(ValueError):
+            chore_templates.save_as_template(task.id, "kitchen")
+        self.assertEqual(len(chore_templates.get_all_templates()), 1)
+        self.assertEqual(chore_templates.find_template("KITCHEN").name, "Kitchen")
+
+    def test_instantiate_for_many_dates(self):
+        template = chore_templates.save_as_template(self.make_chore().id, "Kitchen")
+        due_dates = [date(2024, 3, 1), None, date(2024, 9, 1)]
+        created = chore_templates.instantiate_template(template.id, due_dates)
+
+        self.assertEqual([task.due_date for task in created], due_dates)
+        for task in created:
+            self.assertEqual((task.description, task.status, task.notes), ("Deep-clean kitchen", "pending", "Top to bottom"))
+            self.assertEqual(task.materials_needed, ["Degreaser", "Sponges"])
+            sub_tasks = tasks.get_sub_tasks_for_task(task.id)
+            self.assertEqual([st['description'] for st in sub_tasks], ["Empty fridge", "Scrub oven", "Mop floor"])
+            self.assertFalse(any(st['completed'] for st in sub_tasks)) # Fresh chores start unticked
+
+        [single] = chore_templates.instantiate_template(template.id)
+        self.assertIsNone(single.due_date)
+        self.assertIsNone(chore_templates.instantiate_template(9999, due_dates))
+
+    def test_instantiate_more_dates_than_one_statement_holds(self):
+        template = chore_templates.save_as_template(self.make_chore().id, "Kitchen")
+        due_dates = [date.fromordinal(date(2024, 1, 1).toordinal() + day) for day in range(storage._CHUNK_SIZE + 3)]
+        created = chore_templates.instantiate_template(template.id, due_dates)
+        self.assertEqual([task.due_date for task in created], due_dates)
+        conn = database.get_db_connection()
+        sub_task_count = conn.execute("SELECT COUNT(*) FROM sub_tasks WHERE task_id >= ?", (created[0].id,)).fetchone()[0]
+        conn.close()
+        self.assertEqual(sub_task_count, 3 * len(due_dates))
+
+    def test_delete_keeps_created_chores(self):
+        template = chore_templates.save_as_template(self.make_chore().id, "Kitchen")
+        [created] = chore_templates.instantiate_template(template.id)
+        self.assertEqual(chore_templates.delete_template(template.id).name, "Kitchen")
+        self.assertIsNone(chore_templates.get_template(template.id))
+        self.assertIsNone(chore_templates.delete_template(template.id))
+        conn = database.get_db_connection()
+        self.assertEqual(conn.execute("SELECT COUNT(*) FROM chore_template_sub_tasks").fetchone()[0], 0)
+        conn.close()
+        self.assertEqual(len(tasks.get_sub_tasks_for_task(created.id)), 3)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,174 @@
+# Tests for the command-line interface in main.py.
+
+import io
+import json
+import os
+import tempfile
+import unittest
+
+import main
+from chores import ai_assistant, change_feed, database, tasks
+from tests import TransactionalTestCase, sqlite_only
+
+
+class TestCli(TransactionalTestCase):
+
+    def setUp(self):
+        super().setUp()
+        tasks.clear_all_tasks() # The in-memory backend isn't covered by the rollback
+
+    def tearDown(self):
+        tasks.clear_all_tasks()
+
+    def run_cli(self, *argv, stdin=""):
+        stdout = io.StringIO()
+        exit_code = main.main(list(argv), stdin=io.StringIO(stdin), stdout=stdout)
+        return exit_code, stdout.getvalue()
+
+    def test_add_and_list_json(self):
+        exit_code, output = self.run_cli('add', 'Sweep', '-', '--due', '2024-06-01', '--json', stdin="Mop\nDust\n\n")
+        self.assertEqual(exit_code, 0)
+        self.assertEqual([chore['description'] for chore in json.loads(output)], ["Sweep", "Mop", "Dust"])
+
+        exit_code, output = self.run_cli('list', '--json')
+        chores = json.loads(output)
+        self.assertEqual(len(chores), 3)
+        self.assertTrue(all(chore['due_date'] == "2024-06-01" for chore in chores))
+
+    def test_status_reads_ids_from_stdin_and_reports_missing(self):
+        t1 = tasks.add_task("One")
+        t2 = tasks.add_task("Two")
+        exit_code, output = self.run_cli('status', 'completed', str(t1.id), '-', '--json', stdin=f"{t2.id}\n9999\n")
+        self.assertEqual(exit_code, 1) # 9999 does not exist
+        self.assertEqual(json.loads(output)['results'],
+                         [{'id': t1.id, 'ok': True}, {'id': t2.id, 'ok': True}, {'id': 9999, 'ok': False}])
+        self.assertEqual(tasks.get_task_by_id(t2.id).status, "completed")
+
+        exit_code, output = self.run_cli('list', '--status', 'completed')
+        self.assertEqual(exit_code, 0)
+        self.assertIn("One", output)
+
+    def test_delete(self):
+        t1 = tasks.add_task("Doomed")
+        exit_code, output = self.run_cli('delete', str(t1.id))
+        self.assertEqual(exit_code, 0)
+        self.assertIn("1 chore(s) deleted.", output)
+        self.assertIsNone(tasks.get_task_by_id(t1.id))
+
+    def test_export_import_round_trip(self):
+        t1 = tasks.add_task("Exported", notes="Some notes", materials_needed_text="Rag")
+        tasks.add_sub_task(t1.id, "Step one")
+        _, exported = self.run_cli('export')
+        tasks.clear_all_tasks()
+
+        exit_code, output = self.run_cli('import', '-', stdin=exported)
+        self.assertEqual(exit_code, 0)
+        self.assertIn("1 chore(s) imported.", output)
+        imported = tasks.get_all_tasks(include_sub_tasks=True)
+        self.assertEqual(len(imported), 1)
+        self.assertEqual(imported[0].notes, "Some notes")
+        self.assertEqual(imported[0].materials_needed, ["Rag"])
+        self.assertEqual([st['description'] for st in imported[0].sub_tasks], ["Step one"])
+
+
+    def test_bad_import_files_are_rejected(self):
+        bad_files = {
+            '[{"description": "Unfinished"': "Invalid JSON in -",
+            '{"description": "Not a list"}': "Import expects a JSON list of chores",
+            '[{"description": "Chore", "sub_tasks": [{"completed": true}]}]': "Invalid chore: missing 'description'.",
+            '[{"description": "Chore", "due_date": "someday"}]': "Invalid chore: Invalid isoformat string",
+            '[{"description": "Chore"}, {"notes": "No description"}]': "Invalid chore: Every task needs a description.",
+        }
+        for content, message in bad_files.items():
+            with self.subTest(content=content), self.assertRaises(SystemExit) as caught:
+                self.run_cli('import', '-', stdin=content)
+            self.assertIn(message, str(caught.exception.code))
+        self.assertEqual(tasks.get_all_tasks(), [])
+
+    @sqlite_only
+    def test_archive_and_restore(self):
+        t1 = tasks.add_task("Done long ago")
+        tasks.update_task_status(t1.id, "completed")
+        exit_code, output = self.run_cli('archive', '--older-than-days', '-1') # Cutoff in the future
+        self.assertEqual(exit_code, 0)
+        self.assertIn("1 chore(s) archived.", output)
+        self.assertIsNone(tasks.get_task_by_id(t1.id))
+
+        exit_code, output = self.run_cli('restore', str(t1.id), '9999')
+        self.assertEqual(exit_code, 1)
+        self.assertIn("1 chore(s) restored.", output)
+        self.assertIsNotNone(tasks.get_task_by_id(t1.id))
+
+    @sqlite_only
+    def test_maintenance_json(self):
+        tasks.add_task("Keep me")
+        exit_code, output = self.run_cli('maintenance', '--json')
+        self.assertEqual(exit_code, 0)
+        [report] = json.loads(output)
+        self.assertIsNone(report['household'])
+        self.assertEqual(report['orphaned_sub_tasks_deleted'], 0)
+        self.assertEqual(len(tasks.get_all_tasks()), 1)
+
+    @sqlite_only
+    def test_template_save_and_use(self):
+        task = tasks.add_task("Deep-clean kitchen")
+        tasks.add_sub_task(task.id, "Scrub oven")
+        exit_code, output = self.run_cli('template', 'save', str(task.id), '--name', 'Kitchen')
+        self.assertEqual(exit_code, 0)
+        self.assertIn("Template saved: [", output)
+
+        exit_code, output = self.run_cli('template', 'use', 'kitchen', '--due', '2024-06-01', '--due', '2024-07-01', '--json')
+        self.assertEqual(exit_code, 0)
+        self.assertEqual([chore['due_date'] for chore in json.loads(output)], ["2024-06-01", "2024-07-01"])
+        self.assertEqual(len(tasks.get_all_tasks()), 3)
+
+        exit_code, output = self.run_cli('template', 'list', '--json')
+        self.assertEqual([(t['name'], t['sub_tasks']) for t in json.loads(output)], [("Kitchen", ["Scrub oven"])])
+        exit_code, output = self.run_cli('template', 'delete', 'Kitchen')
+        self.assertIn("Template 'Kitchen' deleted.", output)
+        exit_code, output = self.run_cli('template', 'use', 'Kitchen')
+        self.assertEqual(exit_code, 1)
+
+    @sqlite_only
+    def test_changes_follow_the_consumer(self):
+        self.addCleanup(change_feed.forget_consumer, "cli-mirror")
+        change_feed.acknowledge("cli-mirror", change_feed.latest_seq())
+        task = tasks.add_task("Synced")
+        exit_code, output = self.run_cli('changes', '--consumer', 'cli-mirror', '--json')
+        self.assertEqual(exit_code, 0)
+        result = json.loads(output)
+        self.assertEqual([(c['op'], c['id']) for c in result['changes']], [('insert', task.id)])
+
+        exit_code, output = self.run_cli('changes', '--consumer', 'cli-mirror', '--ack', str(result['last_seq']))
+        self.assertIn(f"cli-mirror has acknowledged changes up to {result['last_seq']}.", output)
+        exit_code, output = self.run_cli('changes', '--consumer', 'cli-mirror')
+        self.assertIn(f"0 change(s), last seq {result['last_seq']}.", output)
+
+    def test_suggest_with_offline_provider(self):
+        self.addCleanup(ai_assistant.configure_provider)
+        task = tasks.add_task("Mow the lawn")
+        exit_code, output = self.run_cli('suggest', str(task.id), '--provider', 'heuristic', '--json')
+        self.assertEqual(exit_code, 0)
+        [result] = json.loads(output)
+        self.assertEqual(result['sub_tasks'], ["Clear debris", "Mow or trim", "Bag clippings"])
+        self.assertIn("Rake", result['materials'])
+
+        exit_code, output = self.run_cli('suggest', str(task.id), '--provider', 'oracle')
+        self.assertEqual(exit_code, 1)
+        self.assertIn("Unknown AI provider 'oracle'", output)
+
+
+@sqlite_only
+class TestCliNewDatabase(unittest.TestCase):
+
+    def test_commands_create_the_schema(self):
+        temp_dir = self.enterContext(tempfile.TemporaryDirectory())
+        self.enterContext(database.using_database(os.path.join(temp_dir, 'new.db')))
+        self.addCleanup(database.close_connections)
+        stdout = io.StringIO()
+        self.assertEqual(main.main(['add', 'First chore', '--json'], stdin=io.StringIO(), stdout=stdout), 0)
+        [chore] = json.loads(stdout.getvalue())
+        self.assertEqual(chore['description'], "First chore")
+
+if __name__ == '__main__':
+    unittest.main()
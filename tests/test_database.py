@@ -0,0 +1,307 @@
+# Tests for connection pooling, migrations, per-household shards and in-memory databases in chores.database.
+
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import unittest
+import unittest.mock
+
+from chores import database, storage, tasks
+
+
+class TestConnectionPool(unittest.TestCase):
+
+    def setUp(self):
+        self.enterContext(storage.using_backend('sqlite'))
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.enterContext(database.using_database(os.path.join(directory, 'pool.db')))
+        database.close_connections()
+
+    def tearDown(self):
+        database.close_connections()
+
+    def test_connections_are_reused_and_close_discards_uncommitted_work(self):
+        database.init_db()
+        conn = database.get_db_connection()
+        conn.execute("INSERT INTO tasks (description) VALUES ('Uncommitted')")
+        conn.close()
+        self.assertIs(database.get_db_connection(), conn) # Still open, handed out again
+        self.assertFalse(conn.in_transaction)
+        self.assertEqual(tasks.get_all_tasks(), [])
+
+    def test_least_recently_used_connection_is_closed(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        with unittest.mock.patch.object(database, 'MAX_OPEN_CONNECTIONS', 2):
+            opened = []
+            for name in ('a.db', 'b.db', 'c.db'):
+                with unittest.mock.patch.object(database, 'DATABASE_FILE', os.path.join(directory, name)):
+                    opened.append(database.get_db_connection())
+        with self.assertRaises(sqlite3.ProgrammingError): # a.db was evicted and really closed
+            opened[0].execute("SELECT 1")
+        opened[2].execute("SELECT 1")
+
+    def test_migrations_record_schema_version(self):
+        conn = sqlite3.connect(":memory:")
+        self.assertEqual(database.migrate(conn), (0, database.SCHEMA_VERSION))
+        self.assertEqual(database.schema_version(conn), database.SCHEMA_VERSION)
+        self.assertEqual(database.migrate(conn), (database.SCHEMA_VERSION, database.SCHEMA_VERSION))
+        conn.close()
+
+
+class TestShards(unittest.TestCase):
+
+    def setUp(self):
+        self.enterContext(storage.using_backend('sqlite'))
+        self.shard_directory = tempfile.mkdtemp()
+        patcher = unittest.mock.patch.object(database, 'SHARD_DIRECTORY', self.shard_directory)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(shutil.rmtree, self.shard_directory)
+        self.addCleanup(database.close_connections)
+
+    def test_create_and_list_shards(self):
+        database.create_shard('smiths')
+        database.create_shard('jones')
+        self.assertEqual(database.list_shards(), ['jones', 'smiths'])
+        with self.assertRaises(FileExistsError):
+            database.create_shard('smiths')
+        for invalid_id in ('../escape', 'Upper', '', 'a b'):
+            with self.assertRaises(ValueError):
+                database.create_shard(invalid_id)
+
+    def test_households_are_isolated(self):
+        database.create_shard('smiths')
+        database.create_shard('jones')
+        with database.using_tenant('smiths'):
+            tasks.add_task("Smiths' chore")
+        with database.using_tenant('jones'):
+            self.assertEqual(tasks.get_all_tasks(), [])
+            tasks.add_task("Jones' chore")
+        with database.using_tenant('smiths'):
+            self.assertEqual([t.description for t in tasks.get_all_tasks()], ["Smiths' chore"])
+        self.assertIsNone(database.current_tenant())
+
+    def test_unknown_household_is_not_created(self):
+        with database.using_tenant('nobody'):
+            with self.assertRaises(database.UnknownTenantError):
+                database.get_db_connection()
+        self.assertFalse(os.path.exists(database.shard_path('nobody')))
+
+    def test_migrate_shard_upgrades_old_files(self):
+        path = database.shard_path('legacy')
+        conn = sqlite3.connect(path)
+        conn.execute("CREATE TABLE tasks (id INTEGER PRIMARY KEY AUTOINCREMENT, description TEXT NOT NULL, "
+                     "status TEXT NOT NULL DEFAULT 'pending', notes TEXT, due_date TEXT, materials_needed TEXT)")
+        conn.execute("INSERT INTO tasks (description, status) VALUES ('Done before versioning', 'completed')")
+        conn.commit()
+        conn.close()
+        self.assertEqual(database.migrate_shard('legacy'), (0, database.SCHEMA_VERSION))
+        self.assertEqual(database.migrate_shard('legacy'), (database.SCHEMA_VERSION, database.SCHEMA_VERSION))
+        with database.using_tenant('legacy'):
+            legacy_task = tasks.get_all_tasks()[0]
+        self.assertEqual((legacy_task.description, legacy_task.version), ('Done before versioning', 1))
+        with self.assertRaises(database.UnknownTenantError):
+            database.migrate_shard('missing')
+
+
+class TestWrites(unittest.TestCase):
+
+    def setUp(self):
+        self.enterContext(storage.using_backend('sqlite'))
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.database_file = os.path.join(directory, 'writes.db')
+        for name, value in (('DATABASE_FILE', self.database_file), ('JOURNAL_MODE', 'WAL'),
+                            ('BUSY_TIMEOUT_SECONDS', 0.01)): # Short, so contention goes through run_write's retries
+            patcher = unittest.mock.patch.object(database, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.addCleanup(database.close_connections)
+        database.init_db()
+        database.reset_write_metrics()
+
+    def hammer(self, threads=8, chores_per_thread=25):
+        errors = []
+
+        def worker(n):
+            try:
+                for i in range(chores_per_thread):
+                    task = tasks.add_task(f"Chore {n}-{i}")
+                    tasks.add_sub_task(task.id, "Step")
+                    tasks.update_task_status(task.id, "completed")
+            except Exception as e: # Reported by the main thread
+                errors.append(e)
+            finally:
+                database.close_connections()
+
+        workers = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        self.assertEqual(errors, [])
+
+        all_tasks = tasks.get_all_tasks(include_sub_tasks=True)
+        self.assertEqual(len(all_tasks), threads * chores_per_thread)
+        self.assertTrue(all(task.status == "completed" and len(task.sub_tasks) == 1 for task in all_tasks))
+        metrics = database.write_metrics()
+        self.assertEqual(metrics['writes'], threads * chores_per_thread * 3)
+        self.assertEqual(metrics['timeouts'], 0)
+
+    def test_concurrent_writers_stress(self):
+        self.hammer()
+
+    def test_concurrent_writers_through_writer_thread(self):
+        with unittest.mock.patch.object(database, 'SERIALIZE_WRITES', True):
+            self.hammer()
+        self.assertEqual(database.write_metrics()['retries'], 0) # Only one thread ever asked for the lock
+
+    def test_write_gives_up_after_deadline(self):
+        blocker = sqlite3.connect(self.database_file)
+        blocker.execute("BEGIN IMMEDIATE")
+        try:
+            with self.assertRaises(database.WriteTimeoutError):
+                database.run_write(lambda conn: conn.execute("INSERT INTO tasks (description) VALUES ('x')"),
+                                   deadline_seconds=0.1)
+        finally:
+            blocker.rollback()
+            blocker.close()
+        metrics = database.write_metrics()
+        self.assertEqual(metrics['timeouts'], 1)
+        self.assertGreater(metrics['retries'], 0)
+
+    def test_statements_outside_a_transaction_wait_for_the_lock(self):
+        blocker = sqlite3.connect(self.database_file, check_same_thread=False)
+        self.addCleanup(blocker.close)
+        blocker.execute("BEGIN IMMEDIATE")
+        threading.Timer(0.2, blocker.rollback).start()
+        database.run_outside_transaction(lambda conn: conn.execute("VACUUM"))
+        self.assertGreater(database.write_metrics()['retries'], 0)
+
+    def test_failed_write_is_rolled_back(self):
+        def failing_write(conn):
+            conn.execute("INSERT INTO tasks (description) VALUES ('Never committed')")
+            raise ValueError("boom")
+
+        with self.assertRaises(ValueError):
+            database.run_write(failing_write)
+        self.assertEqual(tasks.get_all_tasks(), [])
+        # Nested writes join the enclosing transaction instead of deadlocking on it.
+        self.assertEqual(database.run_write(lambda conn: database.run_write(lambda inner: inner is conn)), True)
+
+    def test_nested_writes_and_reads_keep_the_enclosing_work(self):
+        def outer(conn):
+            conn.execute("INSERT INTO tasks (description) VALUES ('Before the nested write')")
+            database.run_write(lambda inner: inner.execute("INSERT INTO tasks (description) VALUES ('Nested')"))
+            self.assertEqual(len(tasks.get_all_tasks()), 2) # A read closes its connection too
+            conn.execute("INSERT INTO tasks (description) VALUES ('After the nested write')")
+
+        database.run_write(outer)
+        database.close_connections()
+        self.assertEqual(sorted(t.description for t in tasks.get_all_tasks()),
+                         ["After the nested write", "Before the nested write", "Nested"])
+
+    def test_group_commit_coalesces_concurrent_writes(self):
+        task = tasks.add_task("Checklist")
+        sub_tasks = [tasks.add_sub_task(task.id, f"Item {i}") for i in range(40)]
+        database.reset_write_metrics()
+        results = {}
+
+        def check_off(sub_task):
+            results[sub_task['id']] = tasks.toggle_sub_task(sub_task['id'], task_id=task.id)
+
+        with unittest.mock.patch.object(database, 'GROUP_COMMIT_WINDOW', 0.02):
+            workers = [threading.Thread(target=check_off, args=(st,)) for st in sub_tasks]
+            for thread in workers:
+                thread.start()
+            for thread in workers:
+                thread.join()
+
+        self.assertTrue(all(results[st['id']]['completed'] for st in sub_tasks)) # Each caller got its own row
+        self.assertTrue(all(st['completed'] for st in tasks.get_sub_tasks_for_task(task.id)))
+        metrics = database.write_metrics()
+        self.assertEqual(metrics['writes'], 40)
+        self.assertGreater(metrics['group_commits'], 0)
+
+    def test_group_commit_isolates_failing_writes(self):
+        barrier = threading.Barrier(4)
+        outcomes = {}
+
+        def write(n):
+            def insert(conn):
+                conn.execute("INSERT INTO tasks (description) VALUES (?)", (f"Grouped {n}",))
+                if n == 2:
+                    raise ValueError("bad write")
+                return n
+            barrier.wait()
+            try:
+                outcomes[n] = database.run_write(insert, coalesce=True)
+            except ValueError as e:
+                outcomes[n] = e
+
+        with unittest.mock.patch.object(database, 'GROUP_COMMIT_WINDOW', 0.05):
+            workers = [threading.Thread(target=write, args=(n,)) for n in range(4)]
+            for thread in workers:
+                thread.start()
+            for thread in workers:
+                thread.join()
+
+        self.assertIsInstance(outcomes.pop(2), ValueError)
+        self.assertEqual(outcomes, {0: 0, 1: 1, 3: 3})
+        self.assertEqual(sorted(t.description for t in tasks.get_all_tasks()), ["Grouped 0", "Grouped 1", "Grouped 3"])
+
+
+class TestMemoryDatabase(unittest.TestCase):
+
+    def setUp(self):
+        self.enterContext(storage.using_backend('sqlite'))
+        self.enterContext(database.using_database("file:chores-memory-test?mode=memory&cache=shared"))
+        self.addCleanup(database.discard_memory_database)
+        self.addCleanup(database.close_connections)
+        database.init_db()
+
+    def test_memory_database_is_shared_and_outlives_pooled_connections(self):
+        task = tasks.add_task("In memory")
+        seen = []
+        reader = threading.Thread(target=lambda: (seen.extend(tasks.get_all_tasks()), database.close_connections()))
+        reader.start()
+        reader.join()
+        self.assertEqual([t.id for t in seen], [task.id]) # Other threads' connections see the same database
+
+        database.close_connections()
+        self.assertEqual(tasks.get_task_by_id(task.id).description, "In memory")
+        self.assertFalse(os.path.exists(database.DATABASE_FILE))
+
+    def test_plain_memory_name_means_the_shared_database(self):
+        self.assertTrue(database.is_memory_database(":memory:"))
+        self.assertFalse(database.is_memory_database("chores_app.db"))
+        with database.using_database(":memory:") as path:
+            self.assertEqual(path, "file::memory:?cache=shared")
+
+    def test_rolled_back_transaction_discards_writes(self):
+        kept = tasks.add_task("Committed before")
+        with database.rolled_back_transaction() as conn:
+            inside = tasks.add_task("Rolled back")
+            tasks.add_sub_task(inside.id, "Step")
+            conn.commit() # A no-op: the block owns the transaction
+            self.assertEqual(len(tasks.get_all_tasks()), 2)
+
+            def failing_write(write_conn):
+                write_conn.execute("INSERT INTO tasks (description) VALUES ('Failed')")
+                raise ValueError("boom")
+            with self.assertRaises(ValueError): # Still all or nothing, as a nested savepoint
+                database.run_write(failing_write)
+            self.assertEqual([t.description for t in tasks.get_all_tasks()], ["Committed before", "Rolled back"])
+
+            database.clear_db_for_testing()
+            self.assertEqual(tasks.add_task("After clear").id, 1) # AUTOINCREMENT counters reset too
+        self.assertEqual([t.id for t in tasks.get_all_tasks()], [kept.id])
+        self.assertEqual(tasks.get_sub_tasks_for_task(inside.id), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,115 @@
+# Tests for foreign key enforcement and the maintenance sweep.
+
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from chores import database, maintenance, storage, tasks
+
+
+class TestMaintenance(unittest.TestCase):
+    # Reclaimed space is measured on a real file, so these tests use a temporary database file
+    # rather than the in-memory one of TransactionalTestCase.
+
+    @classmethod
+    def setUpClass(cls):
+        temp_dir = cls.enterClassContext(tempfile.TemporaryDirectory())
+        cls.enterClassContext(database.using_database(os.path.join(temp_dir, 'maintenance.db')))
+        cls.addClassCleanup(database.close_connections)
+        database.init_db()
+
+    def setUp(self):
+        self.enterContext(storage.using_backend('sqlite'))
+        database.clear_db_for_testing()
+
+    def tearDown(self):
+        database.clear_db_for_testing()
+
+    def count_sub_tasks(self, task_id):
+        conn = database.get_db_connection()
+        count = conn.execute("SELECT COUNT(*) FROM sub_tasks WHERE task_id = ?", (task_id,)).fetchone()[0]
+        conn.close()
+        return count
+
+    def insert_orphans(self, count):
+        """Writes sub-tasks for a missing chore the way an old client would: without foreign keys."""
+        database.close_connections()
+        conn = sqlite3.connect(database.DATABASE_FILE)
+        conn.executemany("INSERT INTO sub_tasks (task_id, description, order_index) VALUES (9999, ?, ?)",
+                         [(f"Orphan {n}", n) for n in range(count)])
+        conn.commit()
+        conn.close()
+
+    def test_foreign_keys_enforced(self):
+        conn = database.get_db_connection()
+        self.assertEqual(conn.execute("PRAGMA foreign_keys").fetchone()[0], 1)
+        conn.close()
+        with self.assertRaises(sqlite3.IntegrityError):
+            database.run_write(lambda conn: conn.execute(
+                "INSERT INTO sub_tasks (task_id, description, order_index) VALUES (9999, 'Nope', 0)"))
+
+    def test_deletes_cascade_to_sub_tasks(self):
+        single = tasks.add_task("Single")
+        tasks.add_sub_task(single.id, "Step")
+        deleted = tasks.add_task("Deleted")
+        tasks.add_sub_task(deleted.id, "Step")
+        bulk = [tasks.add_task(f"Bulk {n}") for n in range(2)]
+        for task in bulk:
+            tasks.add_sub_task(task.id, "Step")
+            tasks.add_sub_task(task.id, "Another step")
+
+        self.assertTrue(tasks.remove_task(single.id))
+        self.assertEqual(self.count_sub_tasks(single.id), 0)
+        self.assertTrue(tasks.delete_task(deleted.id))
+        self.assertEqual(self.count_sub_tasks(deleted.id), 0)
+        tasks.bulk_delete([task.id for task in bulk])
+        for task in bulk:
+            self.assertEqual(self.count_sub_tasks(task.id), 0)
+
+    def test_sweep_deletes_orphans_in_batches(self):
+        kept = tasks.add_task("Kept")
+        tasks.add_sub_task(kept.id, "Still has a parent")
+        self.insert_orphans(7)
+
+        self.assertEqual(maintenance.sweep_orphans(batch_size=3), 7)
+        self.assertEqual(self.count_sub_tasks(9999), 0)
+        self.assertEqual(self.count_sub_tasks(kept.id), 1)
+
+    def test_run_maintenance_reports_space(self):
+        self.insert_orphans(50)
+        report = maintenance.run_maintenance()
+        self.assertEqual(report['orphaned_sub_tasks_deleted'], 50)
+        self.assertEqual(report['reclaimed_bytes'], report['bytes_before'] - report['bytes_after'])
+        self.assertTrue(report['incremental_vacuum'])
+
+        self.insert_orphans(500)
+        report = maintenance.run_maintenance()
+        self.assertEqual(report['orphaned_sub_tasks_deleted'], 500)
+        self.assertFalse(report['converted_to_incremental_vacuum'])
+        self.assertGreater(report['reclaimed_bytes'], 0)
+        self.assertEqual(report['free_bytes_after'], 0) # Every free page, not just the first
+
+    def test_older_files_are_converted_only_when_asked(self):
+        temp_dir = self.enterContext(tempfile.TemporaryDirectory())
+        path = os.path.join(temp_dir, 'old.db')
+        conn = sqlite3.connect(path) # A table created before init_db could enable incremental vacuum
+        conn.execute("CREATE TABLE legacy (id INTEGER PRIMARY KEY)")
+        conn.close()
+        self.enterContext(database.using_database(path))
+        self.addCleanup(database.close_connections)
+        database.init_db()
+
+        report = maintenance.run_maintenance()
+        self.assertFalse(report['incremental_vacuum'])
+        self.assertFalse(report['converted_to_incremental_vacuum'])
+
+        report = maintenance.run_maintenance(convert_to_incremental_vacuum=True)
+        self.assertTrue(report['converted_to_incremental_vacuum'])
+        conn = database.get_db_connection()
+        self.assertEqual(conn.execute("PRAGMA auto_vacuum").fetchone()[0], maintenance.INCREMENTAL_VACUUM)
+        conn.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,166 @@
+# Tests for fetching AI suggestions in the background when a chore is created.
+
+import os
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from chores import ai_assistant, database, prefetch, similarity, storage, tasks
+from web_app import create_app
+
+
+class StubProvider:
+    """Returns fixed suggestions and records the chores it was asked about."""
+
+    def __init__(self, sub_tasks=("Gather supplies", "Scrub"), materials=("Sponge",)):
+        self.response = {'sub_tasks': list(sub_tasks), 'materials': list(materials)}
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def __call__(self, description, existing_sub_tasks):
+        with self.lock:
+            self.calls.append(description)
+        return dict(self.response)
+
+
+class TestPrefetch(unittest.TestCase):
+    # Prefetch workers open their own connections, so these tests use a database file rather
+    # than a rolled-back transaction (which belongs to the test's thread).
+
+    @classmethod
+    def setUpClass(cls):
+        temp_dir = cls.enterClassContext(tempfile.TemporaryDirectory())
+        cls.enterClassContext(database.using_database(os.path.join(temp_dir, 'prefetch.db')))
+        cls.enterClassContext(storage.using_backend('sqlite'))
+        database.init_db()
+
+    def setUp(self):
+        database.clear_db_for_testing()
+        similarity.forget_indexes() # Cleared rows would otherwise stay indexed
+        self.addCleanup(prefetch.disable)
+
+    def prefetcher(self, provider, **kwargs):
+        prefetcher = prefetch.SuggestionPrefetcher(provider, **kwargs)
+        self.addCleanup(prefetcher.stop)
+        return prefetcher
+
+    def test_suggestions_are_stored_not_applied(self):
+        provider = StubProvider()
+        prefetcher = self.prefetcher(provider)
+        task = tasks.add_task("Clean bathroom")
+        self.assertTrue(prefetcher.schedule(task.id, task.description))
+        self.assertTrue(prefetcher.wait_idle(5))
+
+        self.assertEqual(provider.calls, ["Clean bathroom"])
+        self.assertEqual(tasks.get_sub_tasks_for_task(task.id), [])
+        pending = prefetch.take_pending(task.id)
+        self.assertEqual((pending['sub_tasks'], pending['materials']), (["Gather supplies", "Scrub"], ["Sponge"]))
+        self.assertIsNone(prefetch.take_pending(task.id)) # Used once
+
+    def test_deleted_chores_are_cancelled(self):
+        release = threading.Event()
+        provider = StubProvider()
+
+        def blocking_provider(description, existing):
+            if description == "Blocks":
+                release.wait(5)
+            if description == "Deleted during the call":
+                tasks.delete_task(during.id)
+            return provider(description, existing)
+
+        prefetcher = self.prefetcher(blocking_provider, workers=1)
+        blocker = tasks.add_task("Blocks")
+        before = tasks.add_task("Deleted before its turn")
+        during = tasks.add_task("Deleted during the call")
+        for task in (blocker, before, during):
+            prefetcher.schedule(task.id, task.description)
+        tasks.delete_task(before.id)
+        release.set()
+        self.assertTrue(prefetcher.wait_idle(5))
+
+        self.assertEqual(provider.calls, ["Blocks", "Deleted during the call"]) # No call for the first deletion
+        self.assertEqual((prefetcher.counts['stored'], prefetcher.counts['cancelled']), (1, 2))
+        self.assertIsNone(prefetch.get_pending(during.id))
+
+    def test_hourly_budget(self):
+        now = [1000.0]
+        provider = StubProvider()
+        prefetcher = self.prefetcher(provider, hourly_budget=2, clock=lambda: now[0])
+        chores = [tasks.add_task(f"Chore {n}") for n in range(3)]
+        for task in chores[:2]:
+            self.assertTrue(prefetcher.schedule(task.id, task.description))
+        prefetcher.wait_idle(5)
+        self.assertFalse(prefetcher.schedule(chores[2].id, chores[2].description))
+
+        now[0] += 3600 # The first calls leave the window
+        self.assertTrue(prefetcher.schedule(chores[2].id, chores[2].description))
+        prefetcher.wait_idle(5)
+        self.assertEqual(len(provider.calls), 3)
+
+    def test_similar_chores_cost_no_budget(self):
+        provider = StubProvider()
+        similarity.remember("Clean the kitchen", {'sub_tasks': ["Wipe counters"], 'materials': ["Sponge"]})
+        prefetcher = self.prefetcher(None, hourly_budget=1)
+        reused, fetched = tasks.add_task("Clean kitchen"), tasks.add_task("Mow the lawn")
+        with mock.patch.object(ai_assistant, 'get_subtask_and_material_suggestions', provider):
+            for task in (reused, fetched):
+                self.assertTrue(prefetcher.schedule(task.id, task.description))
+                self.assertTrue(prefetcher.wait_idle(5))
+
+        self.assertEqual(provider.calls, ["Mow the lawn"]) # The only call, within the budget of one
+        self.assertEqual(prefetcher.counts['stored'], 2)
+        self.assertEqual(prefetch.get_pending(reused.id)['sub_tasks'], ["Wipe counters"])
+
+    def test_concurrency_is_bounded(self):
+        running, peak = [0], [0]
+        lock = threading.Lock()
+
+        def slow_provider(description, existing):
+            with lock:
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+            threading.Event().wait(0.02)
+            with lock:
+                running[0] -= 1
+            return {'sub_tasks': ["Step"], 'materials': []}
+
+        prefetcher = self.prefetcher(slow_provider, workers=2)
+        for n in range(6):
+            task = tasks.add_task(f"Chore {n}")
+            prefetcher.schedule(task.id, task.description)
+        self.assertTrue(prefetcher.wait_idle(5))
+        self.assertEqual(prefetcher.counts['stored'], 6)
+        self.assertLessEqual(peak[0], 2)
+
+    def test_errors_are_not_stored(self):
+        provider = StubProvider(sub_tasks=(), materials=())
+        provider.response['error'] = {'code': 'no_api_key', 'message': "AI features disabled: GOOGLE_API_KEY not set."}
+        prefetcher = self.prefetcher(provider)
+        task = tasks.add_task("No key")
+        prefetcher.schedule(task.id, task.description)
+        prefetcher.wait_idle(5)
+        self.assertEqual(prefetcher.counts['failed'], 1)
+        self.assertIsNone(prefetch.get_pending(task.id))
+
+    def test_new_chores_offer_prefetched_suggestions(self):
+        prefetcher = prefetch.enable(provider=StubProvider())
+        client = create_app({'TESTING': True, 'SECRET_KEY': 'prefetch', 'INIT_DB': False,
+                             'STORAGE_BACKEND': 'sqlite'}).test_client()
+        client.post('/add_chore', data={'description': 'Wash windows'})
+        self.assertTrue(prefetcher.wait_idle(5))
+        [task] = tasks.get_all_tasks()
+
+        response = client.get(f'/chore/{task.id}')
+        self.assertIn(b"AI suggestions are ready.", response.data)
+        self.assertIn(b"Gather supplies", response.data)
+
+        with mock.patch.object(ai_assistant, 'get_subtask_and_material_suggestions',
+                               side_effect=AssertionError("should use the prefetched suggestions")):
+            response = client.post(f'/chore/{task.id}/suggest_subtasks_ai', follow_redirects=True)
+        self.assertIn(b"2 new sub-task(s) added. 1 new material(s) added.", response.data)
+        self.assertNotIn(b"AI suggestions are ready.", response.data)
+        self.assertEqual(tasks.get_task_by_id(task.id).materials_needed, ["Sponge"])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+# Tests for the trigram similarity index and reuse of suggestions across near-duplicate chores.
+
+import unittest
+from unittest import mock
+
+from chores import similarity
+from tests import TransactionalTestCase
+
+CHORES = ["Clean the kitchen", "Mow the lawn", "Fix leaky faucet", "Vacuum living room", "Wash the car",
+          "Clean bathroom", "Organize garage", "Replace air filter"]
+
+
+class TestSimilarityIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.index = similarity.SimilarityIndex()
+        for entry_id, description in enumerate(CHORES, start=1):
+            self.index.add(entry_id, description)
+
+    def test_near_duplicates_score_high(self):
+        for text, expected, at_least in (("clean kitchen", 1, 0.95), ("Clean the kitchen!", 1, 0.95),
+                                         ("Kitchen cleaning", 1, 0.75), ("wash car", 5, 0.95),
+                                         ("Fix the faucet", 3, 0.75)):
+            [(entry_id, score)] = self.index.query(text)
+            self.assertEqual(entry_id, expected, text)
+            self.assertGreaterEqual(score, at_least, text)
+        self.assertLess(self.index.query("Clean the garage")[0][1], similarity.REUSE_THRESHOLD)
+        self.assertLess(self.index.query("Paint the fence")[0][1], 0.2)
+        self.assertEqual(self.index.query("the"), []) # Nothing but stopwords
+
+    def test_incremental_adds_and_ties(self):
+        self.assertEqual(len(self.index), len(CHORES))
+        self.index.add(42, "clean the KITCHEN")
+        self.assertEqual(len(self.index), len(CHORES) + 1)
+        self.assertEqual([entry_id for entry_id, _ in self.index.query("Clean the kitchen", limit=2)], [42, 1])
+
+    @unittest.skipIf(similarity._load_numpy() is None, "numpy is not installed")
+    def test_numpy_and_python_scoring_agree(self):
+        for limit in (1, 3, 20):
+            vectorized = self.index.query("clean the bathroom", limit=limit)
+            with mock.patch.object(similarity, '_load_numpy', return_value=None):
+                plain = self.index.query("clean the bathroom", limit=limit)
+            self.assertEqual([entry_id for entry_id, _ in vectorized], [entry_id for entry_id, _ in plain])
+            for (_, a), (_, b) in zip(vectorized, plain):
+                self.assertAlmostEqual(a, b, places=5)
+
+
+class TestSuggestionMemory(TransactionalTestCase):
+
+    def setUp(self):
+        super().setUp()
+        similarity.forget_indexes()
+        self.addCleanup(similarity.forget_indexes) # The rows are rolled back
+
+    def test_similar_chores_reuse_remembered_suggestions(self):
+        self.assertTrue(similarity.remember("Clean the kitchen", {'sub_tasks': ["Wipe counters"], 'materials': ["Sponge"]}))
+        fetch = mock.Mock(return_value={'sub_tasks': ["From the model"], 'materials': []})
+
+        reused = similarity.suggest("clean kitchen", [], fetch=fetch)
+        fetch.assert_not_called()
+        self.assertEqual((reused['sub_tasks'], reused['materials'], reused['similar_to']),
+                         (["Wipe counters"], ["Sponge"], "Clean the kitchen"))
+
+        self.assertEqual(similarity.suggest("Mow the lawn", ["Edge"], fetch=fetch)['sub_tasks'], ["From the model"])
+        fetch.assert_called_once_with("Mow the lawn", existing_subtask_descriptions=["Edge"])
+
+    def test_index_picks_up_new_rows(self):
+        similarity.remember("Wash the car", {'sub_tasks': ["Rinse"], 'materials': []})
+        self.assertIsNone(similarity.find_similar("Mow the lawn")) # Builds the index
+        similarity.remember("Mow the lawn", {'sub_tasks': ["Edge"], 'materials': []})
+        self.assertEqual(similarity.find_similar("mow lawn")['sub_tasks'], ["Edge"])
+
+    def test_remember_skips_empty_and_duplicate_suggestions(self):
+        suggestions = {'sub_tasks': ["Rinse"], 'materials': ["Bucket"]}
+        self.assertFalse(similarity.remember("Wash the car", {'sub_tasks': [], 'materials': []}))
+        self.assertTrue(similarity.remember("Wash the car", suggestions))
+        self.assertFalse(similarity.remember("wash the car", suggestions))
+        self.assertTrue(similarity.remember("wash the car", {'sub_tasks': ["Rinse", "Dry"], 'materials': []}))
+        self.assertEqual(similarity.find_similar("Wash the car")['sub_tasks'], ["Rinse", "Dry"]) # Newest wins
+
+if __name__ == '__main__':
+    unittest.main()
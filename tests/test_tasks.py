@@ -1,29 +1,22 @@
 # This file will contain tests for the task management functionality.
 
 import unittest
-from chores import tasks # Import the tasks module
+import unittest.mock
+from chores import storage, tasks # Import the tasks module
 
 from datetime import date
 
 from chores import database # Import database module for init_db
+from tests import TransactionalTestCase
 
-class TestTaskManagement(unittest.TestCase):
-
-    @classmethod
-    def setUpClass(cls):
-        """Initialize the database once for all tests in this class."""
-        # Point to a test-specific database if necessary, or ensure main DB is clean.
-        # For simplicity, we'll use the same DB file but ensure it's clean.
-        # If DATABASE_FILE was configured by an env var, tests could override it.
-        database.init_db() # Ensure tables are created
+class TestTaskManagement(TransactionalTestCase):
+    # The schema is created once per class in an in-memory database (see TransactionalTestCase),
+    # and each test's writes are rolled back when it ends.
 
     def setUp(self):
-        """Clear all tasks from DB before each test."""
-        database.clear_db_for_testing() # Clears data from tables
-
-    def tearDown(self):
-        """Clear all tasks from DB after each test to ensure isolation."""
-        database.clear_db_for_testing() # Clears data from tables
+        """Clear all tasks before each test (the in-memory backend isn't covered by the rollback)."""
+        super().setUp()
+        tasks.clear_all_tasks() # Clears data from the storage backend
 
     def test_create_task_object_defaults(self):
         """Test basic Task object creation with defaults."""
@@ -136,6 +129,35 @@ class TestTaskManagement(unittest.TestCase):
         non_existent_task = tasks.get_task_by_id(99999) # Use a clearly non-existent ID
         self.assertIsNone(non_existent_task, "Should return None for non-existent ID.")
 
+    def test_sub_tasks_loaded_lazily(self):
+        """Test that sub-tasks are only queried on first access unless requested."""
+        task = tasks.add_task("Lazy parent")
+        tasks.add_sub_task(task.id, "Lazy child")
+
+        lazy_task = tasks.get_task_by_id(task.id)
+        self.assertFalse(lazy_task.sub_tasks_loaded)
+        self.assertEqual([st['description'] for st in lazy_task.sub_tasks], ["Lazy child"])
+        self.assertTrue(lazy_task.sub_tasks_loaded)
+
+        eager_task = tasks.get_task_by_id(task.id, include_sub_tasks=True)
+        self.assertTrue(eager_task.sub_tasks_loaded)
+        self.assertEqual(len(eager_task.sub_tasks), 1)
+
+    def test_prefetch_sub_tasks_uses_single_query(self):
+        """Test that include_sub_tasks fills every task without per-task lookups."""
+        task_a = tasks.add_task("Task A")
+        task_b = tasks.add_task("Task B")
+        tasks.add_task("Task C without sub-tasks")
+        tasks.add_sub_task(task_a.id, "A1")
+        tasks.add_sub_task(task_a.id, "A2")
+        tasks.add_sub_task(task_b.id, "B1")
+
+        with unittest.mock.patch('chores.tasks.get_sub_tasks_for_task') as mock_get_sub_tasks:
+            all_tasks = tasks.get_all_tasks(include_sub_tasks=True)
+            self.assertEqual([len(t.sub_tasks) for t in all_tasks], [2, 1, 0])
+            self.assertEqual([st['description'] for st in all_tasks[0].sub_tasks], ["A1", "A2"])
+            mock_get_sub_tasks.assert_not_called()
+
     def test_update_task_status(self):
         """Test updating the status of a task."""
         task = tasks.add_task("Original task")
@@ -346,6 +368,54 @@ class TestTaskManagement(unittest.TestCase):
         # delete_from_non_existent_parent = tasks.delete_sub_task(999, sub_task_to_keep['id'])
         # self.assertFalse(delete_from_non_existent_parent) # This variable is not defined
 
+    def test_toggle_sub_task(self):
+        """Test toggling a sub-task's completion in SQL, scoped to its parent task."""
+        parent_task = tasks.add_task("Parent for toggle")
+        other_task = tasks.add_task("Other parent")
+        sub_task = tasks.add_sub_task(parent_task.id, "Toggle me")
+
+        toggled = tasks.toggle_sub_task(sub_task['id'], task_id=parent_task.id)
+        self.assertTrue(toggled['completed'])
+        toggled_back = tasks.toggle_sub_task(sub_task['id'])
+        self.assertFalse(toggled_back['completed'])
+
+        self.assertIsNone(tasks.toggle_sub_task(sub_task['id'], task_id=other_task.id))
+        self.assertIsNone(tasks.toggle_sub_task(9999))
+        self.assertFalse(tasks.get_sub_task_by_id_from_db(sub_task['id'])['completed']) # Unchanged by the misses
+
+    def test_remove_task_and_sub_task_return_deleted_rows(self):
+        """Test that remove_task/remove_sub_task return what they deleted."""
+        task = tasks.add_task("Remove me")
+        sub_task = tasks.add_sub_task(task.id, "Remove me too")
+
+        self.assertIsNone(tasks.remove_sub_task(sub_task['id'], task_id=task.id + 1))
+        removed_sub_task = tasks.remove_sub_task(sub_task['id'], task_id=task.id)
+        self.assertEqual(removed_sub_task['description'], "Remove me too")
+        self.assertIsNone(tasks.get_sub_task_by_id_from_db(sub_task['id']))
+
+        removed_task = tasks.remove_task(task.id)
+        self.assertEqual(removed_task.description, "Remove me")
+        self.assertIsNone(tasks.get_task_by_id(task.id))
+        self.assertIsNone(tasks.remove_task(task.id))
+
+    def test_mutations_without_returning_support(self):
+        """Test the fallback path used on SQLite builds older than 3.35."""
+        with unittest.mock.patch.object(database, 'SUPPORTS_RETURNING', False):
+            task = tasks.add_task("Fallback task")
+            self.assertEqual(tasks.update_task_status(task.id, "completed").status, "completed")
+            self.assertIsNone(tasks.update_task_status(999, "completed"))
+            self.assertEqual(tasks.update_task_details(task.id, notes="n").notes, "n")
+            self.assertIsNone(tasks.update_task_details(999, notes="n"))
+
+            sub_task = tasks.add_sub_task(task.id, "Fallback sub-task")
+            self.assertEqual(sub_task['order_index'], 0)
+            self.assertIsNone(tasks.add_sub_task(999, "Orphan"))
+            self.assertTrue(tasks.toggle_sub_task(sub_task['id'])['completed'])
+            self.assertEqual(tasks.update_sub_task(sub_task['id'], description="Renamed")['description'], "Renamed")
+            self.assertEqual(tasks.remove_sub_task(sub_task['id'])['description'], "Renamed")
+            self.assertIsNone(tasks.remove_sub_task(sub_task['id']))
+            self.assertEqual(tasks.remove_task(task.id).description, "Fallback task")
+
     def test_move_sub_task(self):
         """Test moving a sub-task up and down within a parent task's list."""
         parent_task = tasks.add_task("Parent for Sub-task Reordering")
@@ -408,5 +478,131 @@ class TestTaskManagement(unittest.TestCase):
         self.assertFalse(result_down)
 
 
+    def test_bulk_update_status_and_delete(self):
+        t1 = tasks.add_task("Bulk one")
+        t2 = tasks.add_task("Bulk two")
+        tasks.add_sub_task(t2.id, "Sub of two")
+
+        results = tasks.bulk_update_status([t1.id, t2.id, 9999, t1.id], "completed")
+        self.assertEqual(results, {t1.id: True, t2.id: True, 9999: False}) # Duplicates collapsed, order kept
+        self.assertEqual(tasks.get_task_by_id(t1.id).status, "completed")
+        self.assertEqual(tasks.get_task_by_id(t2.id).status, "completed")
+
+        results = tasks.bulk_delete([t2.id, 9999])
+        self.assertEqual(results, {t2.id: True, 9999: False})
+        self.assertIsNone(tasks.get_task_by_id(t2.id))
+        self.assertEqual(tasks.get_sub_tasks_for_task(t2.id), [])
+        self.assertIsNotNone(tasks.get_task_by_id(t1.id))
+
+    def test_bulk_set_due_date(self):
+        t1 = tasks.add_task("Due soon")
+        t2 = tasks.add_task("Due later", due_date=date(2024, 1, 1))
+        results = tasks.bulk_set_due_date([t1.id, t2.id, 9999], date(2024, 6, 1))
+        self.assertEqual(results, {t1.id: True, t2.id: True, 9999: False})
+        self.assertEqual({task.due_date for task in tasks.get_all_tasks()}, {date(2024, 6, 1)})
+        self.assertEqual(tasks.get_task_by_id(t1.id).version, 2)
+
+        tasks.bulk_set_due_date([t2.id], None)
+        self.assertIsNone(tasks.get_task_by_id(t2.id).due_date)
+
+    def test_bulk_operations_span_multiple_chunks(self):
+        created = tasks.bulk_add_tasks([{'description': f"Chore {i}"} for i in range(storage._CHUNK_SIZE + 5)])
+        ids = [task.id for task in created]
+        results = tasks.bulk_update_status(ids, "in progress")
+        self.assertTrue(all(results.values()))
+        self.assertEqual({task.status for task in tasks.get_all_tasks()}, {"in progress"})
+
+    def test_bulk_update_status_without_returning(self):
+        t1 = tasks.add_task("Fallback bulk")
+        with unittest.mock.patch.object(database, 'SUPPORTS_RETURNING', False):
+            results = tasks.bulk_update_status([t1.id, 9999], "completed")
+        self.assertEqual(results, {t1.id: True, 9999: False})
+        self.assertEqual(tasks.get_task_by_id(t1.id).status, "completed")
+
+    def test_bulk_add_tasks_round_trips_task_to_dict(self):
+        created = tasks.bulk_add_tasks([
+            {'description': "Paint fence", 'notes': "Two coats", 'due_date': "2024-05-01",
+             'materials_needed': ["Paint", "Brush"], 'sub_tasks': ["Sand", {'description': "Prime", 'completed': True}]},
+            {'description': "Water plants", 'status': "completed"},
+        ])
+        self.assertEqual(len(created), 2)
+
+        fence = tasks.get_task_by_id(created[0].id, include_sub_tasks=True)
+        data = tasks.task_to_dict(fence)
+        self.assertEqual(data['due_date'], "2024-05-01")
+        self.assertEqual(data['materials_needed'], ["Paint", "Brush"])
+        self.assertEqual([(st['description'], st['completed']) for st in data['sub_tasks']], [("Sand", False), ("Prime", True)])
+        self.assertEqual(tasks.get_task_by_id(created[1].id).status, "completed")
+
+        # Re-importing an export produces equivalent chores
+        reimported = tasks.bulk_add_tasks([data])
+        copy = tasks.task_to_dict(tasks.get_task_by_id(reimported[0].id, include_sub_tasks=True))
+        self.assertEqual(
+            {k: v for k, v in copy.items() if k not in ('id', 'sub_tasks')},
+            {k: v for k, v in data.items() if k not in ('id', 'sub_tasks')}
+        )
+        self.assertEqual([st['description'] for st in copy['sub_tasks']], ["Sand", "Prime"])
+
+    def test_bulk_add_tasks_is_all_or_nothing(self):
+        with self.assertRaises(ValueError):
+            tasks.bulk_add_tasks([{'description': "Valid"}, {'notes': "No description"}])
+        self.assertEqual(tasks.get_all_tasks(), [])
+
+    def test_versions_bump_on_every_write(self):
+        task = tasks.add_task("Versioned")
+        self.assertEqual(task.version, 1)
+        self.assertEqual(tasks.update_task_status(task.id, "in progress").version, 2)
+        self.assertEqual(tasks.update_task_details(task.id, notes="n").version, 3)
+        tasks.bulk_update_status([task.id], "completed")
+        self.assertEqual(tasks.get_task_by_id(task.id).version, 4)
+
+        sub_task = tasks.add_sub_task(task.id, "Versioned sub")
+        self.assertEqual(sub_task['version'], 1)
+        self.assertEqual(tasks.toggle_sub_task(sub_task['id'])['version'], 2)
+        self.assertEqual(tasks.update_sub_task(sub_task['id'], description="Renamed")['version'], 3)
+
+    def test_update_with_stale_version_returns_conflict(self):
+        task = tasks.add_task("Contended")
+        tasks.update_task_details(task.id, description="First writer", expected_version=1)
+
+        result = tasks.update_task_details(task.id, description="Second writer", expected_version=1)
+        self.assertIsInstance(result, tasks.Conflict)
+        self.assertFalse(result)
+        self.assertEqual(result.current.description, "First writer")
+        self.assertEqual(result.current.version, 2)
+        self.assertEqual(tasks.get_task_by_id(task.id).description, "First writer")
+
+        self.assertIsInstance(tasks.update_task_status(task.id, "completed", expected_version=1), tasks.Conflict)
+        self.assertEqual(tasks.update_task_status(task.id, "completed", expected_version=2).status, "completed")
+        self.assertIsNone(tasks.update_task_details(9999, notes="x", expected_version=1)) # Missing, not a conflict
+
+        sub_task = tasks.add_sub_task(task.id, "Contended sub")
+        tasks.update_sub_task(sub_task['id'], completed=True, expected_version=1)
+        result = tasks.update_sub_task(sub_task['id'], completed=False, expected_version=1)
+        self.assertIsInstance(result, tasks.Conflict)
+        self.assertTrue(result.current['completed'])
+
+    def test_stale_version_conflict_without_returning(self):
+        task = tasks.add_task("Fallback versioned")
+        with unittest.mock.patch.object(database, 'SUPPORTS_RETURNING', False):
+            self.assertEqual(tasks.update_task_details(task.id, notes="a", expected_version=1).version, 2)
+            self.assertIsInstance(tasks.update_task_details(task.id, notes="b", expected_version=1), tasks.Conflict)
+
+    def test_incomplete_backends_fail_when_created(self):
+        class ListOnlyRepository(storage.TaskRepository):
+            def list_tasks(self):
+                return []
+
+        with self.assertRaises(TypeError):
+            ListOnlyRepository()
+
+
+class TestTaskManagementInMemory(TestTaskManagement):
+    """The same tests against the in-memory storage backend."""
+
+    def setUp(self):
+        self.enterContext(storage.using_backend('memory'))
+        super().setUp()
+
 if __name__ == '__main__':
     unittest.main()
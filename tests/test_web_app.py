@@ -1,33 +1,39 @@
+import gzip
+import os
+import re
+import sqlite3
+import subprocess
+import sys
+import tempfile
 import unittest
 from unittest import mock # Import mock
-from web_app import app # Import the Flask app instance
-from chores import tasks, planning
+import web_app
+from web_app import create_app # Application factory
+from chores.cache import BoundedCache
+from chores import tasks, planning, ai_assistant, archive, chore_templates, change_bus, change_feed, similarity
+from datetime import date, datetime, timedelta, timezone
 
 from chores import database # Import database module
+from tests import TransactionalTestCase, sqlite_only
 
-class WebAppTests(unittest.TestCase):
+class WebAppTests(TransactionalTestCase):
 
     @classmethod
     def setUpClass(cls):
-        """Initialize the database once for all tests in this class."""
-        # Ensure Flask app is configured for testing before DB init if DB relies on app context
-        app.config['TESTING'] = True
-        app.config['WTF_CSRF_ENABLED'] = False
-        app.secret_key = 'test_secret_key'
-        # It's important that init_db() is called after app context might be needed,
-        # or if it creates the db file path based on app.instance_path, etc.
-        # For our simple setup, direct call is okay.
-        database.init_db()
+        """Create the app once for all tests in this class, on the in-memory test database."""
+        super().setUpClass()
+        cls.app = create_app({
+            'TESTING': True,
+            'WTF_CSRF_ENABLED': False,
+            'SECRET_KEY': 'test_secret_key',
+        })
 
     def setUp(self):
-        """Set up a test client and clear DB before each test."""
-        # App config is set in setUpClass or here if preferred per test
-        self.client = app.test_client()
-        database.clear_db_for_testing() # Clear data from tables
-
-    def tearDown(self):
-        """Clear DB after each test."""
-        database.clear_db_for_testing() # Clear data from tables
+        """Set up a test client; each test's database writes are rolled back when it ends."""
+        super().setUp()
+        self.client = self.app.test_client()
+        tasks.clear_all_tasks() # The in-memory storage backend isn't covered by the rollback
+        similarity.forget_indexes() # Rolled-back rows would otherwise stay indexed
 
     def test_home_page_loads(self):
         """Test if the home page loads correctly."""
@@ -242,6 +248,278 @@ class WebAppTests(unittest.TestCase):
         original_task = tasks.get_task_by_id(task.id)
         self.assertIsNone(original_task.due_date) # Should not change or be set
 
+    def test_edit_chore_details_stale_version_is_rejected(self):
+        """Test that saving a form rendered from an older version reports a conflict instead of overwriting."""
+        task = tasks.add_task("Shared Chore")
+        form_page = self.client.get(f'/chore/{task.id}/edit')
+        self.assertIn(b'name="version" value="1"', form_page.data)
+
+        tasks.update_task_details(task.id, notes="Changed by someone else") # Now version 2
+        response = self.client.post(f'/chore/{task.id}/edit', data={
+            'description': 'My Edit', 'notes': 'My notes', 'due_date': '', 'version': '1'
+        })
+        self.assertEqual(response.status_code, 409)
+        self.assertIn(b"Someone else changed this chore", response.data)
+        self.assertIn(b"Changed by someone else", response.data) # Form shows the current chore
+        self.assertIn(b'name="version" value="2"', response.data)
+        self.assertIn(b"My Edit", response.data) # The unsaved changes are listed
+        self.assertEqual(tasks.get_task_by_id(task.id).description, "Shared Chore")
+
+        response = self.client.post(f'/chore/{task.id}/edit', data={
+            'description': 'My Edit', 'notes': 'My notes', 'due_date': '', 'version': '2'
+        }, follow_redirects=True)
+        self.assertIn(b"Chore &#39;My Edit&#39; updated successfully!", response.data)
+
+    def test_locked_database_returns_503(self):
+        """Test that a write that gave up on a locked database is reported as a retryable 503."""
+        with mock.patch.object(tasks, 'add_task', side_effect=database.WriteTimeoutError("database is locked")):
+            response = self.client.post('/add_chore', data={'description': 'Busy'})
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.headers['Retry-After'], '1')
+
+# --- Tests for bulk actions ---
+
+    def test_bulk_set_status_and_due_date(self):
+        """Test that one post updates every selected chore and reports missing ones."""
+        t1 = tasks.add_task("Bulk A")
+        t2 = tasks.add_task("Bulk B")
+        t3 = tasks.add_task("Not selected")
+
+        response = self.client.post('/chores/bulk', data={
+            'action': 'set_status', 'status': 'completed', 'ids': [str(t1.id), str(t2.id), '9999']
+        }, follow_redirects=True)
+        self.assertIn(b"2 chore(s) set to &#39;completed&#39;.", response.data)
+        self.assertIn(b"Chores not found: 9999.", response.data)
+        self.assertEqual([tasks.get_task_by_id(t.id).status for t in (t1, t2, t3)], ["completed", "completed", "pending"])
+
+        response = self.client.post('/chores/bulk', data={
+            'action': 'set_due_date', 'due_date': '2024-09-01', 'ids': [str(t1.id), str(t3.id)]
+        }, follow_redirects=True)
+        self.assertIn(b"2 chore(s) due 2024-09-01.", response.data)
+        self.assertEqual(tasks.get_task_by_id(t3.id).due_date, date(2024, 9, 1))
+        self.assertIsNone(tasks.get_task_by_id(t2.id).due_date)
+
+    def test_bulk_delete(self):
+        t1 = tasks.add_task("Bulk delete A")
+        tasks.add_sub_task(t1.id, "Step")
+        t2 = tasks.add_task("Bulk delete B")
+        response = self.client.post('/chores/bulk', data={'action': 'delete', 'ids': [str(t1.id), str(t2.id)]},
+                                    follow_redirects=True)
+        self.assertIn(b"2 chore(s) deleted.", response.data)
+        self.assertEqual(tasks.get_all_tasks(), [])
+
+    @sqlite_only
+    def test_bulk_archive(self):
+        task = tasks.add_task("Bulk archive")
+        response = self.client.post('/chores/bulk', data={'action': 'archive', 'ids': [str(task.id)]},
+                                    follow_redirects=True)
+        self.assertIn(b"1 chore(s) archived.", response.data)
+        self.assertEqual(archive.count_archived(), 1)
+
+    @sqlite_only
+    def test_stats_page(self):
+        task = tasks.add_task("Counted")
+        tasks.update_task_status(task.id, "completed")
+        response = self.client.get('/stats?weeks=4')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b"Statistics (last 4 weeks)", response.data)
+        self.assertIn(b"Completed: <strong>1</strong>", response.data)
+
+    @sqlite_only
+    def test_changes_api(self):
+        start = change_feed.latest_seq()
+        task = tasks.add_task("Mirrored")
+        response = self.client.get(f'/api/changes?since={start}')
+        self.assertEqual(response.status_code, 200)
+        body = response.get_json()
+        self.assertEqual([(c['op'], c['id'], c['task']['description']) for c in body['changes']],
+                         [('insert', task.id, "Mirrored")])
+
+        response = self.client.post('/api/changes/ack', json={'consumer': 'mirror', 'seq': body['last_seq']})
+        self.assertEqual(response.get_json()['acked_seq'], body['last_seq'])
+        self.assertEqual(self.client.post('/api/changes/ack', json={'consumer': 'mirror'}).status_code, 400)
+
+    @sqlite_only
+    def test_save_template_and_create_chores_from_it(self):
+        task = tasks.add_task("Seasonal HVAC")
+        tasks.add_sub_task(task.id, "Replace filter")
+        response = self.client.post(f'/chore/{task.id}/save_as_template', data={'template_name': "HVAC"},
+                                    follow_redirects=True)
+        self.assertIn(b"Template &#39;HVAC&#39; saved with 1 sub-task(s).", response.data)
+        self.assertIn(b"Seasonal HVAC", response.data)
+        response = self.client.post(f'/chore/{task.id}/save_as_template', data={'template_name': "hvac"},
+                                    follow_redirects=True)
+        self.assertIn(b"already exists", response.data)
+
+        template = chore_templates.find_template("HVAC")
+        response = self.client.post(f'/templates/{template.id}/instantiate',
+                                    data={'due_dates': "2024-04-01, 2024-10-01"}, follow_redirects=True)
+        self.assertIn(b"2 chore(s) created from template.", response.data)
+        created = [t for t in tasks.get_all_tasks(include_sub_tasks=True) if t.id != task.id]
+        self.assertEqual(sorted(t.due_date for t in created), [date(2024, 4, 1), date(2024, 10, 1)])
+        self.assertTrue(all([st['description'] for st in t.sub_tasks] == ["Replace filter"] for t in created))
+
+        response = self.client.post(f'/templates/{template.id}/instantiate', data={'due_dates': "spring"},
+                                    follow_redirects=True)
+        self.assertIn(b"Invalid due date format", response.data)
+        response = self.client.post(f'/templates/{template.id}/delete', follow_redirects=True)
+        self.assertIn(b"Template &#39;HVAC&#39; deleted.", response.data)
+        self.assertIn(b"No templates yet", response.data)
+
+    def test_bulk_rejects_bad_requests(self):
+        task = tasks.add_task("Untouched")
+        response = self.client.post('/chores/bulk', data={'action': 'set_status', 'status': 'completed'},
+                                    follow_redirects=True)
+        self.assertIn(b"Select at least one chore first.", response.data)
+        response = self.client.post('/chores/bulk', data={'action': 'explode', 'ids': [str(task.id)]},
+                                    follow_redirects=True)
+        self.assertIn(b"Invalid bulk action", response.data)
+        response = self.client.post('/chores/bulk', data={'action': 'set_due_date', 'due_date': 'soon', 'ids': [str(task.id)]},
+                                    follow_redirects=True)
+        self.assertIn(b"Invalid due date format", response.data)
+        self.assertEqual(tasks.get_task_by_id(task.id).version, 1)
+
+    def test_chores_page_has_bulk_form(self):
+        task = tasks.add_task("Selectable")
+        response = self.client.get('/chores')
+        self.assertIn(b'id="bulk-actions"', response.data)
+        self.assertIn(f'name="ids" value="{task.id}" form="bulk-actions"'.encode(), response.data)
+
+# --- Tests for the archive ---
+
+    @sqlite_only
+    def test_archive_page_and_restore(self):
+        """Test browsing archived chores and restoring one."""
+        task = tasks.add_task("Archived Web Chore")
+        tasks.update_task_status(task.id, "completed")
+        archive.archive_completed(before=datetime.now(timezone.utc) + timedelta(seconds=5))
+
+        response = self.client.get('/archive')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b"Archived Web Chore", response.data)
+        self.assertNotIn(b"Archived Web Chore", self.client.get('/chores').data)
+
+        response = self.client.post(f'/archive/{task.id}/restore', follow_redirects=True)
+        self.assertIn(b"Chore &#39;Archived Web Chore&#39; restored from the archive.", response.data)
+        self.assertIn(b"Archived Web Chore", self.client.get('/chores').data)
+
+        response = self.client.post(f'/archive/{task.id}/restore', follow_redirects=True)
+        self.assertIn(b"Archived chore with ID", response.data)
+
+# --- Tests for the JSON API ---
+
+    def test_api_update_chore_with_version(self):
+        """Test that PATCH applies with the current version and returns 409 with the current chore otherwise."""
+        task = tasks.add_task("API Chore")
+        response = self.client.get(f'/api/chores/{task.id}')
+        self.assertEqual(response.get_json()['version'], 1)
+
+        response = self.client.patch(f'/api/chores/{task.id}', json={
+            'version': 1, 'status': 'in progress', 'due_date': '2024-03-01', 'materials_needed': ['Gloves']
+        })
+        self.assertEqual(response.status_code, 200)
+        data = response.get_json()
+        self.assertEqual((data['version'], data['status'], data['due_date'], data['materials_needed']),
+                         (2, 'in progress', '2024-03-01', ['Gloves']))
+
+        response = self.client.patch(f'/api/chores/{task.id}', json={'version': 1, 'description': 'Stale'})
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.get_json()['error'], 'conflict')
+        self.assertEqual(response.get_json()['current']['version'], 2)
+        self.assertEqual(tasks.get_task_by_id(task.id).description, "API Chore")
+
+        self.assertEqual(self.client.patch(f'/api/chores/{task.id}', json={'description': 'x'}).status_code, 400)
+        self.assertEqual(self.client.patch('/api/chores/9999', json={'version': 1, 'notes': 'x'}).status_code, 404)
+        self.assertEqual(len(self.client.get('/api/chores').get_json()), 1)
+
+    def test_api_update_sub_task_with_version(self):
+        """Test optimistic concurrency on sub-task updates through the API."""
+        task = tasks.add_task("API Parent")
+        sub_task = tasks.add_sub_task(task.id, "API Sub")
+        url = f'/api/chores/{task.id}/sub_tasks/{sub_task["id"]}'
+
+        response = self.client.patch(url, json={'version': sub_task['version'], 'completed': True})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.get_json()['completed'])
+
+        response = self.client.patch(url, json={'version': sub_task['version'], 'completed': False})
+        self.assertEqual(response.status_code, 409)
+        self.assertTrue(response.get_json()['current']['completed'])
+
+        other_task = tasks.add_task("Other Parent")
+        response = self.client.patch(f'/api/chores/{other_task.id}/sub_tasks/{sub_task["id"]}',
+                                     json={'version': 2, 'completed': False})
+        self.assertEqual(response.status_code, 404)
+
+# --- Tests for Fragment Caching ---
+
+    def test_chore_row_fragment_cached_until_chore_changes(self):
+        """Test that list rows are reused from the fragment cache and re-rendered after a change."""
+        fragment_cache = self.app.extensions['fragment_cache']
+        fragment_cache.clear()
+        task = tasks.add_task("Cached Chore")
+
+        self.client.get('/chores')
+        hits_before = fragment_cache.hits
+        response = self.client.get('/chores')
+        self.assertGreater(fragment_cache.hits, hits_before)
+        self.assertIn(b"Cached Chore", response.data)
+
+        tasks.update_task_details(task.id, description="Renamed Chore")
+        response = self.client.get('/chores')
+        self.assertIn(b"Renamed Chore", response.data)
+        self.assertNotIn(b"Cached Chore", response.data)
+
+        tasks.add_sub_task(task.id, "Fresh sub-task")
+        response = self.client.get(f'/chore/{task.id}')
+        self.assertIn(b"Fresh sub-task", response.data)
+
+    def test_fragment_cache_respects_memory_budget(self):
+        """Test that the bounded cache evicts least recently used entries to stay within budget."""
+        cache = BoundedCache(max_bytes=100)
+        cache.put('a', 'A', size=40)
+        cache.put('b', 'B', size=40)
+        cache.get('a') # 'a' is now most recently used
+        cache.put('c', 'C', size=40)
+        self.assertEqual(cache.get('a'), 'A')
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('c'), 'C')
+        self.assertLessEqual(cache.stats()['bytes'], 100)
+        self.assertFalse(cache.put('huge', 'X', size=101))
+
+# --- Tests for Static Assets and Compression ---
+
+    def test_pages_link_versioned_stylesheet_with_long_cache(self):
+        """Test that pages reference the shared stylesheet by a versioned URL cached for a year."""
+        response = self.client.get('/')
+        self.assertNotIn(b"<style>", response.data)
+        match = re.search(rb'href="(/static/css/style\.css\?v=[0-9a-f]+)"', response.data)
+        self.assertIsNotNone(match)
+
+        css_response = self.client.get(match.group(1).decode('utf-8'))
+        self.assertEqual(css_response.status_code, 200)
+        self.assertIn('immutable', css_response.headers['Cache-Control'])
+        self.assertIn(f"max-age={self.app.config['STATIC_MAX_AGE']}", css_response.headers['Cache-Control'])
+
+    def test_html_compressed_when_accepted_and_large_enough(self):
+        """Test gzip compression of HTML pages, honoring Accept-Encoding and the size threshold."""
+        for i in range(10):
+            tasks.add_task(f"Compressible chore {i}")
+
+        plain = self.client.get('/chores')
+        self.assertNotIn('Content-Encoding', plain.headers)
+
+        with mock.patch.object(web_app, 'brotli', None):
+            compressed = self.client.get('/chores', headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(compressed.headers['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', compressed.headers['Vary'])
+        self.assertEqual(gzip.decompress(compressed.data), plain.data)
+        self.assertLess(len(compressed.data), len(plain.data))
+
+        with mock.patch.dict(self.app.config, {'COMPRESS_MIN_SIZE': len(plain.data) + 1}):
+            below_threshold = self.client.get('/chores', headers={'Accept-Encoding': 'gzip'})
+        self.assertNotIn('Content-Encoding', below_threshold.headers)
+
 # --- Tests for Sub-task Management ---
 
     def test_add_sub_task(self):
@@ -369,6 +647,90 @@ class WebAppTests(unittest.TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertIn(b"Could not move sub-task &#39;SubTask Web One&#39;. It might be at the limit or an error occurred.", response.data)
 
+    def test_sub_task_fragments_json(self):
+        """Script requests get only the changed rows, with the new order, instead of a redirect."""
+        headers = {'X-Requested-With': 'XMLHttpRequest', 'Accept': 'application/json'}
+        task = tasks.add_task("Parent for fragments")
+        st1 = tasks.add_sub_task(task.id, "Fragment one")
+        st2 = tasks.add_sub_task(task.id, "Fragment two")
+
+        response = self.client.post(f'/chore/{task.id}/sub_task/{st1["id"]}/toggle', headers=headers)
+        self.assertEqual(response.status_code, 200)
+        data = response.get_json()
+        self.assertEqual([row['id'] for row in data['sub_tasks']], [st1['id']])
+        self.assertTrue(data['sub_tasks'][0]['completed'])
+        self.assertIn("Mark Pending", data['sub_tasks'][0]['html'])
+        self.assertEqual(data['order'], [st1['id'], st2['id']])
+        self.assertEqual(data['message'], "Sub-task 'Fragment one' marked as completed.")
+
+        response = self.client.post(f'/chore/{task.id}/add_sub_task', data={'sub_task_description': "Fragment three"},
+                                    headers=headers)
+        data = response.get_json()
+        st3_id = data['order'][-1]
+        # The new last row, and the old last row whose Down button is enabled now
+        self.assertEqual({row['id'] for row in data['sub_tasks']} - {st1['id']}, {st2['id'], st3_id})
+
+        response = self.client.post(f'/chore/{task.id}/sub_task/{st3_id}/move/up', headers=headers)
+        self.assertEqual(response.get_json()['order'], [st1['id'], st3_id, st2['id']])
+
+        response = self.client.post(f'/chore/{task.id}/sub_task/{st1["id"]}/delete', headers=headers)
+        data = response.get_json()
+        self.assertEqual(data['removed'], [st1['id']])
+        self.assertEqual(data['order'], [st3_id, st2['id']])
+        first_row = next(row for row in data['sub_tasks'] if row['id'] == st3_id)
+        self.assertRegex(first_row['html'], r'(?s)move/up.*?disabled') # Now first: Up is disabled
+
+        response = self.client.post(f'/chore/{task.id}/sub_task/{st1["id"]}/toggle', headers=headers)
+        self.assertEqual(response.status_code, 404)
+        self.assertIn("not found", response.get_json()['error'])
+        response = self.client.post(f'/chore/{task.id}/add_sub_task', data={'sub_task_description': ""}, headers=headers)
+        self.assertEqual(response.status_code, 400)
+
+    def test_sub_task_fragment_html(self):
+        task = tasks.add_task("Parent for HTML fragment")
+        sub_task = tasks.add_sub_task(task.id, "Only row")
+        response = self.client.post(f'/chore/{task.id}/sub_task/{sub_task["id"]}/toggle',
+                                    headers={'X-Requested-With': 'XMLHttpRequest', 'Accept': 'text/html'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data.strip().startswith(b'<li class="subtask-completed"'))
+        self.assertNotIn(b"<html", response.data)
+        self.assertEqual(response.headers['X-Sub-Task-Order'], str(sub_task['id']))
+
+        page = self.client.get(f'/chore/{task.id}')
+        self.assertIn(b"js/sub_tasks.js", page.data)
+        self.assertIn(b"data-sub-task-action", page.data)
+
+    def test_change_events_stream(self):
+        """/events streams this chore's changes, skips the page's own, and sends heartbeats."""
+        task = tasks.add_task("Live chore")
+        subscribers_before = change_bus.get_bus().subscriber_count()
+        self.enterContext(mock.patch.dict(self.app.config, {'EVENTS_HEARTBEAT_SECONDS': 0.01}))
+        response = self.client.get(f'/events?task_id={task.id}&client_id=tab-1')
+        self.addCleanup(response.close)
+        self.assertEqual(response.mimetype, 'text/event-stream')
+        chunks = iter(response.response)
+        self.assertEqual(next(chunks), b"retry: 3000\n\n")
+
+        self.client.post(f'/chore/{task.id}/add_sub_task', data={'sub_task_description': "Mine"},
+                         headers={'X-Client-Id': 'tab-1'}) # Made by the same page: not streamed back
+        tasks.add_task("Another chore") # Not this chore
+        tasks.update_task_status(task.id, "completed")
+        event = next(chunks).decode()
+        self.assertIn("event: change\n", event)
+        self.assertIn('"kind": "task.updated"', event)
+        self.assertIn('"status": "completed"', event)
+        self.assertEqual(next(chunks), b": heartbeat\n\n")
+
+        response.close()
+        self.assertEqual(change_bus.get_bus().subscriber_count(), subscribers_before)
+
+    def test_list_rows_carry_live_update_hooks(self):
+        task = tasks.add_task("Hooked")
+        response = self.client.get('/chores')
+        self.assertIn(f'data-task-id="{task.id}"'.encode(), response.data)
+        self.assertIn(b'data-field="status"', response.data)
+        self.assertIn(b"js/live_updates.js", response.data)
+
 # --- Tests for AI Sub-task Suggestions ---
     def test_suggest_ai_subtasks(self):
         """Test AI sub-task suggestion feature (sub-tasks and materials)."""
@@ -453,6 +815,18 @@ class WebAppTests(unittest.TestCase):
             updated_task = tasks.get_task_by_id(task.id)
             self.assertEqual(len(updated_task.sub_tasks), 0) # No sub-tasks should be added
 
+    def test_suggest_ai_subtasks_unavailable(self):
+        """A refused or timed-out AI call is reported, and nothing is added or remembered."""
+        task = tasks.add_task("Chore while AI is down")
+        message = "Error getting AI suggestions: AI service unavailable after repeated errors; retrying in 30 s."
+        with mock.patch('chores.ai_assistant.get_subtask_and_material_suggestions') as mock_get_ai_response:
+            mock_get_ai_response.return_value = {'sub_tasks': [], 'materials': [],
+                                                 'error': {'code': 'circuit_open', 'message': message}}
+            response = self.client.post(f'/chore/{task.id}/suggest_subtasks_ai', follow_redirects=True)
+        self.assertIn(message.encode(), response.data)
+        self.assertEqual(tasks.get_task_by_id(task.id).sub_tasks, [])
+        self.assertIsNone(similarity.find_similar("Chore while AI is down"))
+
     def test_suggest_ai_subtasks_with_duplicates(self):
         """Test AI suggestion with some duplicates and case variations."""
         task = tasks.add_task("Maintain the garden")
@@ -522,6 +896,102 @@ class WebAppTests(unittest.TestCase):
             updated_task = tasks.get_task_by_id(task.id)
             self.assertEqual(len(updated_task.sub_tasks), 2) # Should remain 2
 
+    def test_suggest_ai_subtasks_reuses_similar_chore(self):
+        """Accepted suggestions are reused for a near-duplicate chore without calling the model."""
+        first = tasks.add_task("Clean the kitchen")
+        with mock.patch('chores.ai_assistant.get_subtask_and_material_suggestions') as mock_get_ai_response:
+            mock_get_ai_response.return_value = {'sub_tasks': ["Wipe counters", "Mop floor"], 'materials': ["Sponge"]}
+            self.client.post(f'/chore/{first.id}/suggest_subtasks_ai', follow_redirects=True)
+
+            second = tasks.add_task("clean kitchen")
+            response = self.client.post(f'/chore/{second.id}/suggest_subtasks_ai', follow_redirects=True)
+            mock_get_ai_response.assert_called_once() # Only for the first chore
+
+        self.assertIn(b"Reused suggestions from a similar chore", response.data)
+        self.assertEqual([st['description'] for st in tasks.get_task_by_id(second.id).sub_tasks],
+                         ["Wipe counters", "Mop floor"])
+
+
+
+class AppFactoryTests(unittest.TestCase):
+
+    def setUp(self):
+        self.original_database_file = database.DATABASE_FILE
+        self.temp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        database.configure(database_file=self.original_database_file)
+        self.temp_dir.cleanup()
+
+    @sqlite_only
+    def test_create_app_uses_configured_database(self):
+        """Test that create_app points the app at the configured database file and creates its tables."""
+        db_path = os.path.join(self.temp_dir.name, 'factory.db')
+        app = create_app({'TESTING': True, 'SECRET_KEY': 'factory', 'DATABASE': db_path})
+        self.assertEqual(app.secret_key, 'factory')
+
+        response = app.test_client().post('/add_chore', data={'description': 'Factory Chore'})
+        self.assertEqual(response.status_code, 302)
+
+        conn = sqlite3.connect(db_path)
+        rows = conn.execute("SELECT description FROM tasks").fetchall()
+        conn.close()
+        self.assertEqual(rows, [('Factory Chore',)])
+
+    @sqlite_only
+    def test_households_use_their_own_database(self):
+        """Test that ?household= selects a shard for the session and unknown households are rejected."""
+        shard_dir = os.path.join(self.temp_dir.name, 'shards')
+        self.addCleanup(database.close_connections)
+        with mock.patch.object(database, 'SHARD_DIRECTORY', None): # Restored after create_app sets it
+            app = create_app({'TESTING': True, 'SECRET_KEY': 'households', 'SHARD_DIRECTORY': shard_dir,
+                              'DATABASE': os.path.join(self.temp_dir.name, 'default.db')})
+            database.create_shard('smiths')
+            database.create_shard('jones')
+            smiths = app.test_client()
+            jones = app.test_client()
+
+            smiths.post('/add_chore?household=smiths', data={'description': 'Smiths Chore'})
+            jones.get('/households/jones', follow_redirects=True)
+            response = jones.post('/add_chore', data={'description': 'Jones Chore'}, follow_redirects=True)
+            self.assertIn(b'Jones Chore', response.data)
+            self.assertIn(b'Household: jones', response.data)
+            self.assertNotIn(b'Smiths Chore', response.data)
+
+            response = smiths.get('/chores') # Household remembered in the session
+            self.assertIn(b'Smiths Chore', response.data)
+            self.assertNotIn(b'Jones Chore', response.data)
+
+            self.assertEqual(smiths.get('/chores?household=nobody').status_code, 404)
+            self.assertEqual(smiths.get('/chores?household=../etc').status_code, 404)
+            self.assertIsNone(database.current_tenant())
+
+    def test_create_app_generates_secret_key_when_missing(self):
+        """Test that no hardcoded secret key is used."""
+        db_path = os.path.join(self.temp_dir.name, 'factory.db')
+        with mock.patch.dict(os.environ, {}, clear=False):
+            os.environ.pop('CHORES_SECRET_KEY', None)
+            first = create_app({'DATABASE': db_path})
+            second = create_app({'DATABASE': db_path})
+        self.assertTrue(first.secret_key)
+        self.assertNotEqual(first.secret_key, second.secret_key)
+
+    def test_importing_web_app_defers_ai_sdk(self):
+        """Test that importing the app and the chores package doesn't load the Google SDK."""
+        result = subprocess.run(
+            [sys.executable, '-c',
+             "import sys, chores, web_app; print('google.generativeai' in sys.modules)"],
+            cwd=os.path.join(os.path.dirname(__file__), '..'), capture_output=True, text=True, check=True,
+        )
+        self.assertEqual(result.stdout.strip(), 'False')
+
+    def test_ai_calls_tracked_for_graceful_shutdown(self):
+        """Test that shutdown can wait for in-flight AI calls to drain."""
+        self.assertTrue(ai_assistant.wait_for_in_flight_calls(timeout=0))
+        with ai_assistant._track_in_flight():
+            self.assertEqual(ai_assistant.in_flight_calls(), 1)
+            self.assertFalse(ai_assistant.wait_for_in_flight_calls(timeout=0.01))
+        self.assertTrue(ai_assistant.wait_for_in_flight_calls(timeout=0))
 
 if __name__ == '__main__':
     unittest.main()
@@ -1,50 +1,296 @@
-from flask import Flask, render_template, url_for, request, redirect, flash
-from chores import tasks, planning, ai_assistant, database # Import modules
+from flask import Flask, Response, abort, current_app, g, jsonify, render_template, url_for, request, redirect, flash, session
+from markupsafe import Markup
+from jinja2 import FileSystemBytecodeCache
+from chores import tasks, planning, ai_assistant, database, archive, storage, chore_templates, change_bus, change_feed, analytics, prefetch, similarity # Import modules
+from chores.cache import BoundedCache
+from datetime import date
+import functools
+import gzip
+import hashlib
+import json
+import os
+import re
+import secrets
+import tempfile
 import urllib.parse # For URL encoding
 
-app = Flask(__name__)
-app.secret_key = 'your secret key' # Needed for flashing messages
-
-# Initialize the database (create tables if they don't exist)
-# This should ideally be run once. For simple apps, doing it here is okay.
-# For more complex apps, consider Flask CLI commands or app factory pattern.
-with app.app_context(): # Ensures DB operations have app context if needed by extensions (not strictly for sqlite3)
-    database.init_db()
-
-@app.context_processor
-def utility_processor():
-    def generate_amazon_search_url(material_name):
-        encoded_material = urllib.parse.quote_plus(material_name)
-        return f"https://www.amazon.com/s?k={encoded_material}"
-
-    def generate_home_depot_search_url(material_name):
-        encoded_material = urllib.parse.quote_plus(material_name)
-        return f"https://www.homedepot.com/s/{encoded_material}"
-
-    return dict(
-        amazon_search_url=generate_amazon_search_url,
-        home_depot_search_url=generate_home_depot_search_url
+try: # Optional: brotli is preferred over gzip when the client accepts it
+    import brotli
+except ImportError:
+    brotli = None
+
+# Settings understood by create_app(). Each can also be set through a CHORES_-prefixed
+# environment variable (e.g. CHORES_SECRET_KEY, CHORES_DATABASE); the config argument wins.
+DEFAULT_CONFIG = {
+    'SECRET_KEY': None, # Required in production; a random per-process key is generated otherwise
+    'DATABASE': None, # SQLite file path; None keeps database.DATABASE_FILE
+    'DATABASE_JOURNAL_MODE': None, # e.g. 'WAL' when several workers share the file
+    'DATABASE_BUSY_TIMEOUT': None, # Seconds to wait on another writer's lock
+    'DATABASE_WRITE_DEADLINE': None, # Seconds a write keeps retrying "database is locked" before giving up
+    'DATABASE_SERIALIZE_WRITES': None, # True: one writer thread per process performs all writes
+    'DATABASE_GROUP_COMMIT_WINDOW': None, # Seconds (e.g. 0.002) to gather status/sub-task writes into one commit
+    'SHARD_DIRECTORY': None, # One database per household in this directory; None disables households
+    'STORAGE_BACKEND': None, # 'sqlite' (default) or 'memory' (nothing persists; for demos and tests)
+    'INIT_DB': True, # Create missing tables when the app is created
+    'FRAGMENT_CACHE_BYTES': 4 * 1024 * 1024, # Memory budget for cached HTML fragments
+    'JINJA_BYTECODE_CACHE_DIR': os.path.join(tempfile.gettempdir(), 'chores-jinja-bytecode'),
+    'STATIC_MAX_AGE': 365 * 24 * 3600, # Versioned static URLs never change content
+    'COMPRESS_MIN_SIZE': 500, # Smaller bodies aren't worth the CPU or the header overhead
+    'COMPRESS_MIMETYPES': {'text/html', 'text/css', 'application/json', 'text/javascript'},
+    'COMPRESS_GZIP_LEVEL': 6,
+    'COMPRESS_BROTLI_QUALITY': 5,
+    'EVENTS_HEARTBEAT_SECONDS': 15, # Comment lines on idle /events streams, so proxies keep them open
+    'EVENTS_RETRY_MILLISECONDS': 3000, # How soon a browser reconnects a dropped /events stream
+    'EVENTS_MAX_STREAMS': None, # Open /events streams per process; None keeps change_bus.MAX_SUBSCRIBERS
+    'AI_PREFETCH': False, # True: fetch AI suggestions for new chores in the background (SQLite backend)
+    'AI_PREFETCH_WORKERS': prefetch.WORKERS, # Concurrent prefetch calls per process
+    'AI_PREFETCH_HOURLY_BUDGET': prefetch.HOURLY_BUDGET, # Prefetch calls per hour per process
+    'AI_PROVIDER': ai_assistant.DEFAULT_PROVIDER, # Suggestion provider or fallback chain, e.g. 'gemini,heuristic'
+    'AI_TIMEOUT': ai_assistant.DEFAULT_TIMEOUT, # Seconds a request waits for Gemini before giving up
+    'AI_MAX_CONCURRENT': ai_assistant.MAX_CONCURRENT, # Gemini calls in progress at once per process
+    'AI_BREAKER_THRESHOLD': ai_assistant.FAILURE_THRESHOLD, # Consecutive failures that stop calls to Gemini
+    'AI_BREAKER_RESET_SECONDS': ai_assistant.RESET_TIMEOUT, # How long calls stay stopped before a probe
+}
+
+# View functions are collected here by @route and registered on every app that
+# create_app() builds, so endpoint names stay the plain function names used by url_for.
+_routes = []
+
+def route(rule, **options):
+    """Records a view function for create_app(); used like app.route."""
+    def decorator(view_func):
+        _routes.append((rule, view_func, options))
+        return view_func
+    return decorator
+
+
+def create_app(config=None):
+    """
+    Builds and configures the Flask application.
+    config is a mapping of settings (see DEFAULT_CONFIG) applied over the defaults and
+    CHORES_* environment variables. Importing this module has no side effects; the
+    database is initialized here (unless INIT_DB is False).
+    """
+    app = Flask(__name__)
+    app.config.update(DEFAULT_CONFIG)
+    app.config.from_prefixed_env('CHORES')
+    if config:
+        app.config.update(config)
+
+    if not app.config['SECRET_KEY']:
+        # Flash messages still work, but sessions won't survive a restart or be shared across workers.
+        print("[web_app] SECRET_KEY not set; using a random key for this process.")
+        app.config['SECRET_KEY'] = secrets.token_hex(32)
+
+    database.configure(
+        database_file=app.config['DATABASE'],
+        busy_timeout=app.config['DATABASE_BUSY_TIMEOUT'],
+        journal_mode=app.config['DATABASE_JOURNAL_MODE'],
+        shard_directory=app.config['SHARD_DIRECTORY'],
+        write_deadline=app.config['DATABASE_WRITE_DEADLINE'],
+        serialize_writes=app.config['DATABASE_SERIALIZE_WRITES'],
+        group_commit_window=app.config['DATABASE_GROUP_COMMIT_WINDOW'],
     )
+    storage.configure(backend=app.config['STORAGE_BACKEND'])
+    if app.config['EVENTS_MAX_STREAMS'] is not None:
+        change_bus.get_bus().max_subscribers = app.config['EVENTS_MAX_STREAMS']
+    ai_assistant.configure_provider(app.config['AI_PROVIDER'])
+    ai_assistant.configure_guard(timeout=app.config['AI_TIMEOUT'], max_concurrent=app.config['AI_MAX_CONCURRENT'],
+                                 failure_threshold=app.config['AI_BREAKER_THRESHOLD'],
+                                 reset_timeout=app.config['AI_BREAKER_RESET_SECONDS'])
+    if app.config['AI_PREFETCH']: # Worker threads start with the first new chore, i.e. after serve.py forks
+        prefetch.enable(workers=app.config['AI_PREFETCH_WORKERS'],
+                        hourly_budget=app.config['AI_PREFETCH_HOURLY_BUDGET'])
+
+    # Compiled templates are kept on disk so new workers skip recompiling them.
+    # This must be configured before app.jinja_env is first accessed.
+    os.makedirs(app.config['JINJA_BYTECODE_CACHE_DIR'], exist_ok=True)
+    app.jinja_options = {**app.jinja_options,
+                         'bytecode_cache': FileSystemBytecodeCache(app.config['JINJA_BYTECODE_CACHE_DIR'])}
+    app.extensions['fragment_cache'] = BoundedCache(app.config['FRAGMENT_CACHE_BYTES'])
+
+    app.add_template_global(generate_amazon_search_url, 'amazon_search_url')
+    app.add_template_global(generate_home_depot_search_url, 'home_depot_search_url')
+    app.add_template_global(static_url)
+    app.add_template_global(cached_fragment)
+    app.add_template_global(database.current_tenant, 'current_household')
+    app.before_request(_select_household)
+    app.before_request(_tag_change_origin)
+    app.teardown_request(_release_household)
+    app.register_error_handler(database.WriteTimeoutError, _database_busy)
+    app.after_request(_set_static_cache_headers)
+    app.after_request(_compress_response)
+    for rule, view_func, options in _routes:
+        app.add_url_rule(rule, view_func=view_func, **options)
+
+    if app.config['INIT_DB']:
+        database.init_db() # Create tables if they don't exist
+    return app
+
+
+def __getattr__(name):
+    # `from web_app import app` keeps working: a default app is built on first access
+    # rather than at import time.
+    if name == 'app':
+        globals()['app'] = create_app()
+        return globals()['app']
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+# Shopping links depend only on the material name, so they are computed once per name.
+@functools.lru_cache(maxsize=4096)
+def generate_amazon_search_url(material_name):
+    encoded_material = urllib.parse.quote_plus(material_name)
+    return f"https://www.amazon.com/s?k={encoded_material}"
+
+@functools.lru_cache(maxsize=4096)
+def generate_home_depot_search_url(material_name):
+    encoded_material = urllib.parse.quote_plus(material_name)
+    return f"https://www.homedepot.com/s/{encoded_material}"
+
+@functools.lru_cache(maxsize=None)
+def _static_file_version(static_folder, filename):
+    """Short content hash of a static file; part of its URL so a new deploy busts caches."""
+    with open(os.path.join(static_folder, filename), 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()[:10]
+
+def static_url(filename):
+    """URL of a static file with a content version, safe to cache for a year."""
+    return url_for('static', filename=filename, v=_static_file_version(current_app.static_folder, filename))
+
+def _select_household():
+    """
+    Routes this request's database connections to the household's shard. The household
+    comes from ?household=<id> (which is remembered in the session) or from the session.
+    """
+    if not database.SHARD_DIRECTORY or request.endpoint == 'static':
+        return
+    household_id = request.args.get('household') or session.get('household')
+    if household_id is None:
+        return # No household selected: the default database
+    try:
+        known = database.shard_exists(household_id)
+    except ValueError: # Not a valid household id
+        known = False
+    if not known:
+        session.pop('household', None) # Don't keep failing on a household that's gone
+        abort(404)
+    session['household'] = household_id
+    g.household_token = database.set_current_tenant(household_id)
+
+def _release_household(exc):
+    token = g.pop('household_token', None)
+    if token is not None:
+        database.reset_current_tenant(token)
+    origin_token = g.pop('change_origin_token', None)
+    if origin_token is not None:
+        change_bus.reset_origin(origin_token)
+
+_CLIENT_ID_RE = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+def _tag_change_origin():
+    """
+    Tags this request's change events with the page's client id (X-Client-Id, sent by the page
+    scripts), so that page's own /events stream skips the changes it has already applied.
+    """
+    client_id = request.headers.get('X-Client-Id')
+    if client_id and _CLIENT_ID_RE.match(client_id):
+        g.change_origin_token = change_bus.set_origin(client_id)
+
+def _database_busy(error):
+    # Writes already retried until their deadline; tell the client to come back shortly.
+    print(f"[web_app] Write gave up on a locked database: {error}")
+    headers = {'Retry-After': '1'}
+    if request.path.startswith('/api/'):
+        return jsonify({'error': 'database busy, try again'}), 503, headers
+    return "The chores database is busy right now. Please try again in a moment.", 503, headers
+
+def _set_static_cache_headers(response):
+    if request.endpoint == 'static' and request.args.get('v') and response.status_code == 200:
+        response.cache_control.public = True
+        response.cache_control.max_age = current_app.config['STATIC_MAX_AGE']
+        response.cache_control.immutable = True
+        response.cache_control.no_cache = None
+    return response
+
+def _compress_response(response):
+    """Compresses HTML, CSS and JSON bodies with brotli or gzip, as the client accepts."""
+    config = current_app.config
+    # File responses (direct_passthrough) count as streamed but are small static files here;
+    # genuinely streamed bodies such as event streams are never buffered.
+    if (response.status_code != 200 or (response.is_streamed and not response.direct_passthrough)
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in config['COMPRESS_MIMETYPES']):
+        return response
+    if brotli is not None and request.accept_encodings['br']:
+        encoding = 'br'
+    elif request.accept_encodings['gzip']:
+        encoding = 'gzip'
+    else:
+        return response
 
-# Sample data for initial testing if tasks module is not fully populated
-# tasks.clear_all_tasks() # Clear previous tasks if any from prior runs
-# tasks.add_task("Clean the kitchen")
-# tasks.add_task("Take out the trash")
-# tasks.update_task_status(tasks.get_all_tasks()[0].id, "in progress")
-
+    response.vary.add('Accept-Encoding')
+    response.direct_passthrough = False # Static files are sent as file wrappers; read them into memory
+    data = response.get_data()
+    if len(data) < config['COMPRESS_MIN_SIZE']:
+        return response
 
-@app.route('/')
+    if encoding == 'br':
+        compressed = brotli.compress(data, quality=config['COMPRESS_BROTLI_QUALITY'])
+    else:
+        compressed = gzip.compress(data, compresslevel=config['COMPRESS_GZIP_LEVEL'], mtime=0)
+    response.set_data(compressed)
+    response.headers['Content-Encoding'] = encoding
+    etag, weak = response.get_etag()
+    if etag: # The compressed variant is a different representation
+        response.set_etag(f"{etag}-{encoding}", weak)
+    return response
+
+# Fragment templates and the chore fields each one renders. A fragment's cache key
+# includes these values, so any change to them produces a new key (the chore's change
+# version) and stale entries simply age out of the LRU.
+_FRAGMENT_VERSIONS = {
+    '_chore_row.html': lambda chore: (chore.description, chore.status, chore.due_date, len(chore.sub_tasks)),
+    '_chore_materials.html': lambda chore: tuple(chore.materials_needed),
+    '_sub_task_list.html': lambda chore: tuple(
+        (st['id'], st['description'], st['completed']) for st in chore.sub_tasks
+    ),
+}
+
+def cached_fragment(template_name, chore):
+    """Renders a per-chore fragment template, reusing the cached HTML for unchanged chores."""
+    fragment_cache = current_app.extensions['fragment_cache']
+    template = current_app.jinja_env.get_template(template_name)
+    if current_app.jinja_env.auto_reload or not fragment_cache.max_bytes:
+        # Template edits must show up immediately while developing.
+        return Markup(template.render(chore=chore))
+
+    # Chore ids are only unique within a household's database.
+    key = (database.current_tenant(), template_name, chore.id, _FRAGMENT_VERSIONS[template_name](chore))
+    html = fragment_cache.get(key)
+    if html is None:
+        html = template.render(chore=chore)
+        fragment_cache.put(key, html)
+    return Markup(html)
+
+
+@route('/')
 def home():
     """Serves the homepage."""
     return render_template('index.html', title='Welcome')
 
-@app.route('/chores')
+@route('/households/<household_id>')
+def select_household_route(household_id):
+    """Switches the session to another household (?household=<id> works on any page too)."""
+    return redirect(url_for('view_chores_route', household=household_id))
+
+@route('/chores')
 def view_chores_route():
     """Serves the page that displays all chores."""
-    all_chores = tasks.get_all_tasks()
+    all_chores = tasks.get_all_tasks(include_sub_tasks=True) # The list shows sub-task counts
     return render_template('chores.html', chores=all_chores, title="View All Chores")
 
-@app.route('/add_chore', methods=['GET', 'POST'])
+@route('/add_chore', methods=['GET', 'POST'])
 def add_chore_route():
     """Handles adding a new chore. Shows form on GET, processes form on POST."""
     if request.method == 'POST':
@@ -76,6 +322,7 @@ def add_chore_route():
             due_date=due_date_obj,
             materials_needed_text=materials_needed_text # Pass to tasks.add_task
         )
+        prefetch.schedule(new_task) # Suggestions are ready by the time someone asks (if prefetching is on)
         flash(f"Chore '{new_task.description}' added successfully!", 'success')
         return redirect(url_for('view_chores_route'))
 
@@ -83,54 +330,95 @@ def add_chore_route():
     return render_template('add_chore.html', title="Add New Chore",
                            description="", notes="", due_date="", materials_needed="") # Pass empty for GET
 
-@app.route('/update_chore_status/<int:task_id>', methods=['POST'])
+@route('/update_chore_status/<int:task_id>', methods=['POST'])
 def update_chore_status_route(task_id):
     """Handles updating the status of a chore."""
     new_status = request.form.get('status')
-    task = tasks.get_task_by_id(task_id)
 
-    if not task:
-        flash(f"Chore with ID {task_id} not found.", 'error')
-    elif new_status not in ['pending', 'in progress', 'completed']:
+    if new_status not in ['pending', 'in progress', 'completed']:
         flash(f"Invalid status '{new_status}'.", 'error')
     else:
+        # A single UPDATE ... RETURNING: None means the chore does not exist.
         updated_task = tasks.update_task_status(task_id, new_status)
         if updated_task:
             flash(f"Status for chore '{updated_task.description}' updated to '{new_status}'.", 'success')
         else:
-            # This case should ideally not be hit if task was found initially
-            flash(f"Failed to update status for chore ID {task_id}.", 'error')
+            flash(f"Chore with ID {task_id} not found.", 'error')
 
     return redirect(url_for('view_chores_route'))
 
-@app.route('/delete_chore/<int:task_id>', methods=['POST'])
+@route('/delete_chore/<int:task_id>', methods=['POST'])
 def delete_chore_route(task_id):
     """Handles deleting a chore."""
-    task = tasks.get_task_by_id(task_id)
-    if task:
-        task_description = task.description # Save before deletion
-        # Attempt to delete the task
-        if tasks.delete_task(task_id):
-            # planning.remove_plan(task_id) # This is no longer needed as details are part of the task
-            flash(f"Chore '{task_description}' and its details deleted successfully.", 'success')
-        else:
-            # This case should ideally not be hit if task was found by get_task_by_id
-            flash(f"Failed to delete chore '{task.description}'.", 'error')
+    # remove_task returns the deleted row, so no lookup is needed for the flash message.
+    removed_task = tasks.remove_task(task_id)
+    if removed_task:
+        flash(f"Chore '{removed_task.description}' and its details deleted successfully.", 'success')
     else:
         flash(f"Chore with ID {task_id} not found.", 'error')
 
     return redirect(url_for('view_chores_route'))
 
-@app.route('/chore/<int:task_id>')
+_BULK_ACTIONS = ('set_status', 'set_due_date', 'archive', 'delete')
+
+@route('/chores/bulk', methods=['POST'])
+def bulk_chores_route():
+    """
+    Applies one action to every chore ticked on the list page, in a single transaction:
+    set status, set (or clear) due date, archive or delete. One post and one redirect,
+    however many chores are selected.
+    """
+    action = request.form.get('action')
+    try:
+        task_ids = [int(task_id) for task_id in request.form.getlist('ids')]
+    except ValueError:
+        task_ids = None
+    if action not in _BULK_ACTIONS:
+        flash(f"Invalid bulk action '{action}'.", 'error')
+        return redirect(url_for('view_chores_route'))
+    if not task_ids:
+        flash("Select at least one chore first.", 'error')
+        return redirect(url_for('view_chores_route'))
+
+    if action == 'set_status':
+        new_status = request.form.get('status')
+        if new_status not in ['pending', 'in progress', 'completed']:
+            flash(f"Invalid status '{new_status}'.", 'error')
+            return redirect(url_for('view_chores_route'))
+        results, done = tasks.bulk_update_status(task_ids, new_status), f"set to '{new_status}'"
+    elif action == 'set_due_date':
+        due_date_str = request.form.get('due_date') or ''
+        try:
+            due_date_obj = date.fromisoformat(due_date_str) if due_date_str else None
+        except ValueError:
+            flash("Invalid due date format. Please use YYYY-MM-DD.", 'error')
+            return redirect(url_for('view_chores_route'))
+        results = tasks.bulk_set_due_date(task_ids, due_date_obj)
+        done = f"due {due_date_obj.isoformat()}" if due_date_obj else "without a due date now"
+    elif action == 'archive':
+        results, done = archive.archive_tasks(task_ids), "archived"
+    else:
+        results, done = tasks.bulk_delete(task_ids), "deleted"
+
+    changed = sum(1 for ok in results.values() if ok)
+    flash(f"{changed} chore(s) {done}.", 'success')
+    missing = [str(task_id) for task_id, ok in results.items() if not ok]
+    if missing:
+        flash(f"Chores not found: {', '.join(missing)}.", 'error')
+    return redirect(url_for('view_chores_route'))
+
+@route('/chore/<int:task_id>')
 def chore_detail_route(task_id):
     """Serves the page displaying details for a specific chore."""
-    chore = tasks.get_task_by_id(task_id)
+    chore = tasks.get_task_by_id(task_id, include_sub_tasks=True)
     if not chore:
         flash(f"Chore with ID {task_id} not found.", 'error')
         return redirect(url_for('view_chores_route'))
-    return render_template('chore_detail.html', chore=chore, title=chore.description)
+    pending_suggestions = prefetch.get_pending(task_id) if prefetch.enabled() else None
+    return render_template('chore_detail.html', chore=chore, pending_suggestions=pending_suggestions,
+                           title=chore.description)
 
-@app.route('/chore/<int:task_id>/edit', methods=['GET', 'POST'])
+@route('/chore/<int:task_id>/edit', methods=['GET', 'POST'])
 def edit_chore_details_route(task_id):
     """Handles editing the main details of a chore."""
     chore = tasks.get_task_by_id(task_id)
@@ -161,13 +449,24 @@ def edit_chore_details_route(task_id):
                                        description=description, notes=notes, due_date=due_date_str,
                                        form_materials_text=materials_text) # Use consistent var name
 
+        # The form carries the version it was rendered from; the update only applies if the
+        # chore hasn't been changed by someone else in the meantime.
+        expected_version = request.form.get('version', type=int)
         updated_chore = tasks.update_task_details(
             task_id,
             description=description,
             notes=notes,
             due_date=due_date_obj,
-            materials_needed_text=materials_text # Pass as raw text
+            materials_needed_text=materials_text, # Pass as raw text
+            expected_version=expected_version
         )
+        if isinstance(updated_chore, tasks.Conflict):
+            flash("Someone else changed this chore while you were editing it. Your changes were not saved: "
+                  "review the current version below and save again.", 'error')
+            # The form now shows (and carries the version of) the latest chore; the submitted values are listed for reference.
+            return render_template('edit_chore.html', chore=updated_chore.current, title=f"Edit {chore.description}",
+                                   conflict={'description': description, 'notes': notes, 'due_date': due_date_str,
+                                             'materials_needed': materials_text}), 409
         if updated_chore:
             flash(f"Chore '{updated_chore.description}' updated successfully!", 'success')
             return redirect(url_for('chore_detail_route', task_id=task_id))
@@ -177,90 +476,126 @@ def edit_chore_details_route(task_id):
     return render_template('edit_chore.html', chore=chore, title=f"Edit {chore.description}")
 
 
-@app.route('/chore/<int:task_id>/add_sub_task', methods=['POST'])
+def _fragment_format():
+    """
+    'json' or 'html' when the chore page's script sent the request (X-Requested-With:
+    XMLHttpRequest; Accept picks the format), None for a plain form post.
+    """
+    if request.headers.get('X-Requested-With') != 'XMLHttpRequest':
+        return None
+    best = request.accept_mimetypes.best_match(['text/html', 'application/json'])
+    return 'json' if best == 'application/json' else 'html'
+
+def _sub_task_result(task_id, message, category='success', changed=(), removed=(), reordered=False,
+                     status=200, redirect_to=None):
+    """
+    Finishes a sub-task action. A plain form post flashes the message and redirects to the chore
+    page (or redirect_to), the path that works without JavaScript. A request from the page's script
+    gets only the rows to swap in place: the `changed` sub-tasks, plus, if positions changed
+    (`reordered`), their neighbours and the rows at either end, whose Up/Down buttons may differ now.
+    JSON carries the rows' data and HTML, the ids `removed` and the new order; the HTML format
+    returns the rows with the order and removed ids in X-Sub-Task-Order / X-Removed-Sub-Tasks headers.
+    """
+    fragment_format = _fragment_format()
+    if fragment_format is None:
+        flash(message, category)
+        return redirect(redirect_to or url_for('chore_detail_route', task_id=task_id))
+    if status >= 400:
+        if fragment_format == 'json':
+            return _api_error(message, status)
+        return message, status, {'Content-Type': 'text/plain; charset=utf-8'}
+
+    sub_tasks = tasks.get_sub_tasks_for_task(task_id)
+    order = [st['id'] for st in sub_tasks]
+    wanted = set(changed)
+    if reordered and order:
+        for position, sub_task_id in enumerate(order):
+            if sub_task_id in changed:
+                wanted.update(order[max(position - 1, 0):position + 2])
+        wanted.update((order[0], order[-1]))
+    rows = []
+    for position, sub_task in enumerate(sub_tasks):
+        if sub_task['id'] in wanted:
+            html = render_template('_sub_task_row.html', chore_id=task_id, subtask=sub_task,
+                                   first=position == 0, last=position == len(sub_tasks) - 1)
+            rows.append({**sub_task, 'html': html})
+
+    if fragment_format == 'json':
+        return jsonify({'task_id': task_id, 'message': message, 'category': category,
+                        'sub_tasks': rows, 'removed': list(removed), 'order': order})
+    return "".join(row['html'] for row in rows), 200, {
+        'X-Sub-Task-Order': ",".join(str(sub_task_id) for sub_task_id in order),
+        'X-Removed-Sub-Tasks': ",".join(str(sub_task_id) for sub_task_id in removed),
+    }
+
+def _chore_not_found(task_id):
+    return _sub_task_result(task_id, f"Chore with ID {task_id} not found.", 'error', status=404,
+                            redirect_to=url_for('view_chores_route'))
+
+@route('/chore/<int:task_id>/add_sub_task', methods=['POST'])
 def add_sub_task_route(task_id):
     chore = tasks.get_task_by_id(task_id)
     if not chore:
-        flash(f"Chore with ID {task_id} not found.", 'error')
-        return redirect(url_for('view_chores_route'))
+        return _chore_not_found(task_id)
 
     sub_task_description = request.form.get('sub_task_description')
     if not sub_task_description:
-        flash("Sub-task description cannot be empty.", 'error')
-    else:
-        if tasks.add_sub_task(task_id, sub_task_description):
-            flash("Sub-task added successfully.", 'success')
-        else:
-            flash("Failed to add sub-task.", 'error') # Should not happen if chore exists
-    return redirect(url_for('chore_detail_route', task_id=task_id))
+        return _sub_task_result(task_id, "Sub-task description cannot be empty.", 'error', status=400)
+    new_sub_task = tasks.add_sub_task(task_id, sub_task_description)
+    if not new_sub_task:
+        return _sub_task_result(task_id, "Failed to add sub-task.", 'error', status=404) # Should not happen if chore exists
+    return _sub_task_result(task_id, "Sub-task added successfully.", changed=[new_sub_task['id']], reordered=True)
 
-@app.route('/chore/<int:task_id>/sub_task/<int:sub_task_id>/toggle', methods=['POST'])
+@route('/chore/<int:task_id>/sub_task/<int:sub_task_id>/toggle', methods=['POST'])
 def toggle_sub_task_route(task_id, sub_task_id):
     chore = tasks.get_task_by_id(task_id)
     if not chore:
-        flash(f"Chore with ID {task_id} not found.", 'error')
-        return redirect(url_for('view_chores_route')) # Parent chore must exist
+        return _chore_not_found(task_id) # Parent chore must exist
 
-    # With DB, sub_task_id is globally unique, so we don't need parent chore object to find it.
-    sub_task = tasks.get_sub_task_by_id_from_db(sub_task_id)
-    if not sub_task or sub_task['task_id'] != task_id: # Also ensure it belongs to the correct task
-        flash(f"Sub-task with ID {sub_task_id} not found for chore {task_id}.", 'error')
-    else:
-        # tasks.update_sub_task now takes only sub_task_id and new values
-        updated_sub_task = tasks.update_sub_task(sub_task_id, completed=not sub_task['completed'])
-        if updated_sub_task:
-            status_text = "completed" if updated_sub_task['completed'] else "pending"
-            flash(f"Sub-task '{updated_sub_task['description']}' marked as {status_text}.", 'success')
-        else:
-            flash("Failed to update sub-task status.", 'error')
-    return redirect(url_for('chore_detail_route', task_id=task_id))
+    # Toggled atomically in SQL; None means the sub-task doesn't exist or belongs to another chore.
+    updated_sub_task = tasks.toggle_sub_task(sub_task_id, task_id=task_id)
+    if not updated_sub_task:
+        return _sub_task_result(task_id, f"Sub-task with ID {sub_task_id} not found for chore {task_id}.", 'error', status=404)
+    status_text = "completed" if updated_sub_task['completed'] else "pending"
+    return _sub_task_result(task_id, f"Sub-task '{updated_sub_task['description']}' marked as {status_text}.",
+                            changed=[sub_task_id])
 
-@app.route('/chore/<int:task_id>/sub_task/<int:sub_task_id>/delete', methods=['POST'])
+@route('/chore/<int:task_id>/sub_task/<int:sub_task_id>/delete', methods=['POST'])
 def delete_sub_task_route(task_id, sub_task_id):
     chore = tasks.get_task_by_id(task_id)
     if not chore:
-        flash(f"Chore with ID {task_id} not found.", 'error')
-        return redirect(url_for('view_chores_route'))
+        return _chore_not_found(task_id)
 
-    # Need to get sub-task description for flash message before deleting
-    sub_task = tasks.get_sub_task_by_id_from_db(sub_task_id)
-    if not sub_task or sub_task['task_id'] != task_id: # Ensure it belongs to the correct task
-         flash(f"Sub-task with ID {sub_task_id} not found for chore {task_id}.", 'error')
-    # tasks.delete_sub_task now only takes sub_task_id
-    elif tasks.delete_sub_task(sub_task_id):
-        flash(f"Sub-task '{sub_task['description']}' deleted successfully.", 'success')
-    else:
-        # This case should be rare if sub_task was found, implies DB error during delete
-        flash(f"Failed to delete sub-task '{sub_task['description']}'.", 'error')
-    return redirect(url_for('chore_detail_route', task_id=task_id))
+    # remove_sub_task returns the deleted row (for the flash message) and checks ownership in the same statement.
+    removed_sub_task = tasks.remove_sub_task(sub_task_id, task_id=task_id)
+    if not removed_sub_task:
+        return _sub_task_result(task_id, f"Sub-task with ID {sub_task_id} not found for chore {task_id}.", 'error', status=404)
+    return _sub_task_result(task_id, f"Sub-task '{removed_sub_task['description']}' deleted successfully.",
+                            removed=[sub_task_id], reordered=True)
 
-@app.route('/chore/<int:task_id>/sub_task/<int:sub_task_id>/move/<direction>', methods=['POST'])
+@route('/chore/<int:task_id>/sub_task/<int:sub_task_id>/move/<direction>', methods=['POST'])
 def move_sub_task_route(task_id, sub_task_id, direction):
     """Handles moving a sub-task up or down."""
     if direction not in ['up', 'down']:
-        flash("Invalid move direction specified.", 'error')
-        return redirect(url_for('chore_detail_route', task_id=task_id))
+        return _sub_task_result(task_id, "Invalid move direction specified.", 'error', status=400)
 
     chore = tasks.get_task_by_id(task_id)
     if not chore:
-        flash(f"Chore with ID {task_id} not found.", 'error')
-        return redirect(url_for('view_chores_route'))
+        return _chore_not_found(task_id)
 
     # Fetch sub-task by its own ID to ensure it exists before attempting to move.
     # The tasks.move_sub_task function will also verify it belongs to task_id.
     sub_task = tasks.get_sub_task_by_id_from_db(sub_task_id)
     if not sub_task or sub_task['task_id'] != task_id: # Ensure it belongs to the correct task
-        flash(f"Sub-task with ID {sub_task_id} not found for chore {task_id}.", 'error')
-        return redirect(url_for('chore_detail_route', task_id=task_id))
+        return _sub_task_result(task_id, f"Sub-task with ID {sub_task_id} not found for chore {task_id}.", 'error', status=404)
 
     if tasks.move_sub_task(task_id, sub_task_id, direction): # move_sub_task itself checks parent task_id implicitly
-        flash(f"Sub-task '{sub_task['description']}' moved {direction}.", 'success')
-    else:
-        flash(f"Could not move sub-task '{sub_task['description']}'. It might be at the limit or an error occurred.", 'warning')
-
-    return redirect(url_for('chore_detail_route', task_id=task_id))
+        return _sub_task_result(task_id, f"Sub-task '{sub_task['description']}' moved {direction}.",
+                                changed=[sub_task_id], reordered=True)
+    return _sub_task_result(task_id, f"Could not move sub-task '{sub_task['description']}'. It might be at the limit or an error occurred.",
+                            'warning')
 
-@app.route('/chore/<int:task_id>/suggest_subtasks_ai', methods=['POST'])
+@route('/chore/<int:task_id>/suggest_subtasks_ai', methods=['POST'])
 def suggest_ai_subtasks_route(task_id):
     """Handles AI suggestion for sub-tasks."""
     chore = tasks.get_task_by_id(task_id)
@@ -272,26 +607,25 @@ def suggest_ai_subtasks_route(task_id):
         existing_sub_tasks_objects = tasks.get_sub_tasks_for_task(task_id) # List of dicts
         existing_sub_task_descriptions = [st['description'] for st in existing_sub_tasks_objects]
 
-        ai_response = ai_assistant.get_subtask_and_material_suggestions( # Renamed function
-            chore.description,
-            existing_subtask_descriptions=existing_sub_task_descriptions
-        )
+        # Suggestions prefetched when the chore was created are used at once, and only once.
+        ai_response = prefetch.take_pending(task_id) if prefetch.enabled() else None
+        if ai_response is None: # A near-duplicate chore's accepted suggestions, or else the model's
+            ai_response = similarity.suggest(chore.description, existing_sub_task_descriptions)
 
         suggested_sub_task_descs = ai_response.get('sub_tasks', [])
         suggested_material_names = ai_response.get('materials', [])
 
-        # Check for specific API key error message or other errors from the assistant (now in sub_tasks list)
-        api_key_error_msg = "AI features disabled: GOOGLE_API_KEY not set."
-        error_getting_suggestions_prefix = "Error getting AI suggestions:"
+        # Missing API key, failed or timed-out call, or the circuit breaker refusing to try
+        ai_error = ai_response.get('error')
 
         flash_messages_parts = []
         overall_status_is_error = False
 
-        if suggested_sub_task_descs and suggested_sub_task_descs[0] == api_key_error_msg:
-            flash(api_key_error_msg + " Please set the environment variable.", 'error')
+        if ai_error and ai_error['code'] == 'no_api_key':
+            flash(ai_error['message'] + " Please set the environment variable.", 'error')
             overall_status_is_error = True
-        elif suggested_sub_task_descs and suggested_sub_task_descs[0].startswith(error_getting_suggestions_prefix):
-            flash(suggested_sub_task_descs[0], 'error') # Show the specific error from AI module
+        elif ai_error:
+            flash(ai_error['message'], 'error') # Show the specific error from AI module
             overall_status_is_error = True
 
         if not overall_status_is_error:
@@ -301,6 +635,8 @@ def suggest_ai_subtasks_route(task_id):
             skipped_st_count = 0
             added_mat_count = 0
             skipped_mat_count = 0
+            if 'similar_to' in ai_response:
+                flash_messages_parts.append(f"Reused suggestions from a similar chore ('{ai_response['similar_to']}').")
 
             # Process Sub-tasks
             if suggested_sub_task_descs:
@@ -365,6 +701,8 @@ def suggest_ai_subtasks_route(task_id):
                  flash("AI processing complete. No new sub-tasks or materials were added.", 'info')
             else:
                  flash(" ".join(flash_messages_parts), 'success' if (added_st_count > 0 or added_mat_count > 0) else 'info')
+            if 'similar_to' not in ai_response: # Remembered so near-duplicate chores can skip the model
+                similarity.remember(chore.description, ai_response)
 
     except Exception as e:
         # In a real scenario, log the error `e`
@@ -373,6 +711,260 @@ def suggest_ai_subtasks_route(task_id):
 
     return redirect(url_for('chore_detail_route', task_id=task_id))
 
+@route('/chore/<int:task_id>/pending_suggestions/discard', methods=['POST'])
+def discard_pending_suggestions_route(task_id):
+    """Throws away prefetched AI suggestions; "Suggest with AI" then asks again."""
+    if prefetch.discard_pending(task_id):
+        flash("Prefetched suggestions discarded.", 'info')
+    return redirect(url_for('chore_detail_route', task_id=task_id))
+
+@route('/archive')
+def view_archive_route():
+    """Browses archived (completed and moved to the cold store) chores, a page at a time."""
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = 50
+    archived_chores = archive.get_archived_tasks(limit=per_page, offset=(page - 1) * per_page)
+    total = archive.count_archived()
+    return render_template('archive.html', chores=archived_chores, page=page,
+                           has_next=page * per_page < total, total=total, title="Archived Chores")
+
+@route('/archive/<int:task_id>/restore', methods=['POST'])
+def restore_archived_chore_route(task_id):
+    """Moves an archived chore back to the active list."""
+    restored_task = archive.restore_task(task_id)
+    if restored_task:
+        flash(f"Chore '{restored_task.description}' restored from the archive.", 'success')
+        return redirect(url_for('chore_detail_route', task_id=task_id))
+    flash(f"Archived chore with ID {task_id} not found.", 'error')
+    return redirect(url_for('view_archive_route'))
+
+
+@route('/stats')
+def view_stats_route():
+    """Completion statistics: lead time, completions per week and overdue rates (?weeks=, default 12)."""
+    weeks = request.args.get('weeks', analytics.DEFAULT_WEEKS, type=int)
+    stats = analytics.completion_stats(weeks=weeks)
+    busiest = max((week['completed'] for week in stats['weeks']), default=0)
+    return render_template('stats.html', stats=stats, busiest=busiest, title="Statistics")
+
+@route('/chore/<int:task_id>/save_as_template', methods=['POST'])
+def save_chore_as_template_route(task_id):
+    """Saves a chore and its sub-tasks as a reusable template."""
+    name = request.form.get('template_name', '').strip() or None
+    try:
+        template = chore_templates.save_as_template(task_id, name)
+    except ValueError as e:
+        flash(str(e), 'error')
+        return redirect(url_for('chore_detail_route', task_id=task_id))
+    if not template:
+        flash(f"Chore with ID {task_id} not found.", 'error')
+        return redirect(url_for('view_chores_route'))
+    flash(f"Template '{template.name}' saved with {len(template.sub_tasks)} sub-task(s).", 'success')
+    return redirect(url_for('view_templates_route'))
+
+@route('/templates')
+def view_templates_route():
+    """Lists chore templates, each with a form to create chores from it."""
+    return render_template('chore_templates.html', templates=chore_templates.get_all_templates(),
+                           title="Chore Templates")
+
+def _parse_due_dates(text):
+    """Due dates separated by commas or whitespace; none at all means one chore without a due date."""
+    values = text.replace(',', ' ').split()
+    return [date.fromisoformat(value) for value in values] or [None]
+
+@route('/templates/<int:template_id>/instantiate', methods=['POST'])
+def instantiate_template_route(template_id):
+    """Creates a chore from a template for each given due date, all in one transaction."""
+    try:
+        due_dates = _parse_due_dates(request.form.get('due_dates', ''))
+    except ValueError:
+        flash("Invalid due date format. Please use YYYY-MM-DD.", 'error')
+        return redirect(url_for('view_templates_route'))
+    created = chore_templates.instantiate_template(template_id, due_dates)
+    if created is None:
+        flash(f"Template with ID {template_id} not found.", 'error')
+        return redirect(url_for('view_templates_route'))
+    flash(f"{len(created)} chore(s) created from template.", 'success')
+    return redirect(url_for('view_chores_route'))
+
+@route('/templates/<int:template_id>/delete', methods=['POST'])
+def delete_template_route(template_id):
+    """Deletes a template; chores already created from it are kept."""
+    removed = chore_templates.delete_template(template_id)
+    if removed:
+        flash(f"Template '{removed.name}' deleted.", 'success')
+    else:
+        flash(f"Template with ID {template_id} not found.", 'error')
+    return redirect(url_for('view_templates_route'))
+
+
+# --- Live updates ---
+
+def _sse(event_name, data, event_id=None):
+    lines = [f"id: {event_id}"] if event_id is not None else []
+    lines += [f"event: {event_name}", f"data: {json.dumps(data)}"]
+    return "\n".join(lines) + "\n\n"
+
+@route('/events')
+def change_events_route():
+    """
+    Streams chore changes in the current household as Server-Sent Events: a `change` event per
+    write (?task_id=N: only those touching that chore; ?client_id=...: not the ones that page made
+    itself), a comment line every EVENTS_HEARTBEAT_SECONDS while idle, and a `resync` event when
+    this stream fell too far behind and the page should reload. Reconnecting browsers send
+    Last-Event-ID and get the events they missed.
+    """
+    client_id = request.args.get('client_id', '')
+    try:
+        subscription = change_bus.subscribe(
+            task_id=request.args.get('task_id', type=int),
+            exclude_origin=client_id if _CLIENT_ID_RE.match(client_id) else None,
+            last_event_id=request.headers.get('Last-Event-ID', type=int),
+        )
+    except change_bus.TooManySubscribersError:
+        return "Too many live update streams are open; please reload later.", 503, {'Retry-After': '30'}
+    heartbeat = current_app.config['EVENTS_HEARTBEAT_SECONDS']
+    retry = current_app.config['EVENTS_RETRY_MILLISECONDS']
+
+    def stream():
+        # Runs after the request has ended; closing the subscription (also when the client
+        # disconnects and the generator is closed) frees its slot.
+        with subscription:
+            yield f"retry: {retry}\n\n"
+            while True:
+                events = subscription.get(timeout=heartbeat)
+                if subscription.closed: # Server shutting down (change_bus.close_all)
+                    return
+                if subscription.take_overflow():
+                    yield _sse('resync', {'reason': 'too many changes'})
+                    return # The page reloads and opens a new stream
+                if not events:
+                    yield ": heartbeat\n\n"
+                for event in events:
+                    yield _sse('change', event.to_dict(), event_id=event.id)
+
+    return Response(stream(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+# --- JSON API ---
+# Updates require the version the client last read ("version" in the body). A stale version
+# gets 409 Conflict with the current chore, so the client can merge and retry.
+
+def _api_error(message, status, **extra):
+    return jsonify({'error': message, **extra}), status
+
+def _api_version(payload):
+    version = payload.get('version')
+    if isinstance(version, bool) or not isinstance(version, int):
+        return None
+    return version
+
+@route('/api/chores')
+def api_list_chores_route():
+    all_chores = tasks.get_all_tasks(include_sub_tasks=True)
+    return jsonify([tasks.task_to_dict(chore) for chore in all_chores])
+
+@route('/api/chores/<int:task_id>')
+def api_get_chore_route(task_id):
+    chore = tasks.get_task_by_id(task_id, include_sub_tasks=True)
+    if not chore:
+        return _api_error("not found", 404)
+    return jsonify(tasks.task_to_dict(chore))
+
+@route('/api/chores/<int:task_id>', methods=['PATCH'])
+def api_update_chore_route(task_id):
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict):
+        return _api_error("expected a JSON object", 400)
+    expected_version = _api_version(payload)
+    if expected_version is None:
+        return _api_error("'version' (integer) is required", 400)
+
+    changes = {}
+    if 'description' in payload:
+        if not isinstance(payload['description'], str) or not payload['description'].strip():
+            return _api_error("description cannot be empty", 400)
+        changes['description'] = payload['description']
+    if 'notes' in payload:
+        changes['notes'] = payload['notes'] or ""
+    if 'status' in payload:
+        if payload['status'] not in ['pending', 'in progress', 'completed']:
+            return _api_error(f"invalid status {payload['status']!r}", 400)
+        changes['status'] = payload['status']
+    if 'due_date' in payload:
+        try:
+            changes['due_date'] = date.fromisoformat(payload['due_date']) if payload['due_date'] else None
+        except (TypeError, ValueError):
+            return _api_error("due_date must be YYYY-MM-DD or null", 400)
+    if 'materials_needed' in payload:
+        materials = payload['materials_needed'] or []
+        changes['materials_needed_text'] = "\n".join(materials) if isinstance(materials, list) else str(materials)
+    if not changes:
+        return _api_error("nothing to update", 400)
+
+    result = tasks.update_task_details(task_id, expected_version=expected_version, **changes)
+    if isinstance(result, tasks.Conflict):
+        return _api_error("conflict", 409, current=tasks.task_to_dict(result.current))
+    if not result:
+        return _api_error("not found", 404)
+    return jsonify(tasks.task_to_dict(result))
+
+@route('/api/chores/<int:task_id>/sub_tasks/<int:sub_task_id>', methods=['PATCH'])
+def api_update_sub_task_route(task_id, sub_task_id):
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict):
+        return _api_error("expected a JSON object", 400)
+    expected_version = _api_version(payload)
+    if expected_version is None:
+        return _api_error("'version' (integer) is required", 400)
+
+    sub_task = tasks.get_sub_task_by_id_from_db(sub_task_id)
+    if not sub_task or sub_task['task_id'] != task_id:
+        return _api_error("not found", 404)
+    changes = {}
+    if 'description' in payload:
+        if not isinstance(payload['description'], str) or not payload['description'].strip():
+            return _api_error("description cannot be empty", 400)
+        changes['description'] = payload['description']
+    if 'completed' in payload:
+        changes['completed'] = bool(payload['completed'])
+    if not changes:
+        return _api_error("nothing to update", 400)
+
+    result = tasks.update_sub_task(sub_task_id, expected_version=expected_version, **changes)
+    if isinstance(result, tasks.Conflict):
+        return _api_error("conflict", 409, current=result.current)
+    if not result:
+        return _api_error("not found", 404)
+    return jsonify(result)
+
+
+# Incremental sync for mirrors (SQLite backend): the change log written by triggers.
+
+@route('/api/changes')
+def api_changes_route():
+    """
+    Incremental sync: what changed after ?since=<seq> (default 0), up to ?limit= log entries.
+    See change_feed.changes_since for the response; clients store 'last_seq' and ask again.
+    """
+    since = request.args.get('since', 0, type=int)
+    limit = request.args.get('limit', change_feed.DEFAULT_LIMIT, type=int)
+    return jsonify(change_feed.changes_since(since, limit))
+
+@route('/api/changes/ack', methods=['POST'])
+def api_ack_changes_route():
+    """Records how far a sync client has applied the log ({"consumer": name, "seq": n}), allowing compaction."""
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict):
+        return _api_error("expected a JSON object", 400)
+    consumer, seq = payload.get('consumer'), payload.get('seq')
+    if not isinstance(consumer, str) or not consumer.strip() or isinstance(seq, bool) or not isinstance(seq, int):
+        return _api_error("a consumer name and an integer seq are required", 400)
+    return jsonify({'consumer': consumer.strip(), 'acked_seq': change_feed.acknowledge(consumer, seq)})
+
 
 if __name__ == '__main__':
-    app.run(debug=True)
+    # Development server. For production use `python serve.py` (multiple workers).
+    create_app().run(debug=True)